@@ -1,18 +1,18 @@
 import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
-import openai
-from openai import OpenAI
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import logging
-from ..config import settings
+from ..services.anomaly_engine import detect_monthly_shifts
+from ..services.executor import ExecutorSaturated, cpu_executor
+from ..services.llm_client import LLMUnavailable, llm_client
+from ..services.rollups import build_monthly_rollup
+from ..services.response_cache import estimate_tokens, response_cache
 
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+SYSTEM_PROMPT = "You are a friendly, encouraging financial advisor who provides concise, actionable advice."
 
-def generate_budget_advice(df: pd.DataFrame) -> str:
+async def generate_budget_advice(df: pd.DataFrame) -> str:
     """
     Analyze spending patterns and generate personalized financial advice.
     
@@ -21,38 +21,68 @@ def generate_budget_advice(df: pd.DataFrame) -> str:
         
     Returns:
         str: Personalized financial advice
+        
+    Raises:
+        ExecutorSaturated: If the analysis could not be scheduled
     """
     try:
-        # Ensure required columns
-        required_cols = ['date', 'amount', 'category']
-        if not all(col in df.columns for col in required_cols):
-            raise ValueError(f"DataFrame must contain columns: {required_cols}")
-        
-        # Convert date to datetime if not already
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Get spending analysis
-        spending_summary = _analyze_spending(df)
-        anomalies = _detect_spending_anomalies(df)
+        # Get spending analysis off the event loop
+        spending_summary, anomalies = await cpu_executor.run("advice", analyze_budget, df)
         
         # Generate advice using OpenAI
-        advice = _generate_advice(spending_summary, anomalies)
+        advice = await generate_advice(spending_summary, anomalies)
         
         return advice
         
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         logger.error(f"Error generating budget advice: {str(e)}")
         return "I apologize, but I'm having trouble analyzing your spending patterns right now. Please try again later."
 
-def _analyze_spending(df: pd.DataFrame) -> Dict:
-    """Analyze spending patterns by category and time period."""
+def analyze_budget(df: pd.DataFrame) -> Tuple[Dict, List[Dict]]:
+    """
+    Compute the spending summary and anomalies the advice is based on.
+    
+    Args:
+        df: DataFrame with columns [date, amount, category]
+        
+    Returns:
+        Tuple of (spending summary, anomalies)
+    """
+    # Ensure required columns
+    required_cols = ['date', 'amount', 'category']
+    if not all(col in df.columns for col in required_cols):
+        raise ValueError(f"DataFrame must contain columns: {required_cols}")
+    
+    # Aggregate once; the analysis below only touches months x categories
+    return analyze_rollup(build_monthly_rollup(df))
+
+def analyze_rollup(rollup: pd.DataFrame, shifts: Optional[pd.DataFrame] = None) -> Tuple[Dict, List[Dict]]:
+    """
+    Compute the spending summary and latest-month anomalies from one user's rollups.
+    
+    Args:
+        rollup: Monthly rollups with columns [month, category, total]
+        shifts: This user's rows of a batched ``detect_monthly_shifts`` pass;
+            computed from rollup when None
+        
+    Returns:
+        Tuple of (spending summary, anomalies)
+    """
+    if shifts is None:
+        shifts = detect_monthly_shifts(rollup)
+    return _analyze_spending(rollup), _latest_anomalies(shifts)
+
+def _analyze_spending(rollup: pd.DataFrame) -> Dict:
+    """Analyze spending patterns by category and time period from monthly rollups."""
     # Get current month's data
-    current_month = df['date'].max().replace(day=1)
+    current_month = rollup['month'].max()
     last_month = (current_month - timedelta(days=1)).replace(day=1)
     
-    # Calculate monthly totals by category
-    current_month_spending = df[df['date'] >= current_month].groupby('category')['amount'].sum()
-    last_month_spending = df[(df['date'] >= last_month) & (df['date'] < current_month)].groupby('category')['amount'].sum()
+    # Monthly totals by category
+    current_month_spending = rollup[rollup['month'] == current_month].groupby('category')['total'].sum()
+    last_month_spending = rollup[rollup['month'] == last_month].groupby('category')['total'].sum()
     
     # Calculate overall totals
     total_current = current_month_spending.sum()
@@ -73,49 +103,60 @@ def _analyze_spending(df: pd.DataFrame) -> Dict:
         'total_last': total_last
     }
 
-def _detect_spending_anomalies(df: pd.DataFrame) -> List[Dict]:
-    """Detect significant spending changes between months."""
-    anomalies = []
-    
-    # Get monthly data
-    df['month'] = df['date'].dt.to_period('M')
-    monthly_by_category = df.groupby(['month', 'category'])['amount'].sum().unstack()
+def _latest_anomalies(shifts: pd.DataFrame) -> List[Dict]:
+    """Significant spending shifts in the user's latest month."""
+    if shifts.empty:
+        return []
     
-    # Calculate month-over-month changes
-    monthly_changes = monthly_by_category.pct_change() * 100
-    
-    # Get the most recent month's changes
-    latest_changes = monthly_changes.iloc[-1]
-    
-    # Detect significant changes (>25% increase or decrease)
-    for category, change in latest_changes.items():
-        if abs(change) > 25:
-            anomalies.append({
-                'category': category,
-                'change': round(change, 1),
-                'direction': 'increase' if change > 0 else 'decrease'
-            })
-    
-    return anomalies
+    latest = shifts[(shifts['month'] == shifts['month'].max()) & shifts['is_anomaly']]
+    return [
+        {
+            'category': row.category,
+            'change': round(row.change, 1),
+            'direction': row.direction
+        }
+        for row in latest.itertuples(index=False)
+    ]
 
-def _generate_advice(spending_summary: Dict, anomalies: List[Dict]) -> str:
-    """Generate personalized financial advice using OpenAI."""
+def _summarize_for_prompt(spending_summary: Dict, anomalies: List[Dict]) -> Dict:
+    """Reduce the analysis to the figures quoted in the advice."""
+    total_current = spending_summary['total_current']
+    total_last = spending_summary['total_last']
     
-    # Prepare the analysis for the prompt
-    analysis = {
+    return {
         'current_month': spending_summary['current_month'],
         'last_month': spending_summary['last_month'],
         'total_spending': {
-            'current': round(spending_summary['total_current'], 2),
-            'last': round(spending_summary['total_last'], 2),
-            'change': round((spending_summary['total_current'] - spending_summary['total_last']) / spending_summary['total_last'] * 100, 1)
+            'current': round(total_current, 2),
+            'last': round(total_last, 2),
+            'change': round((total_current - total_last) / total_last * 100, 1) if total_last else 0.0
         },
         'top_categories': dict(sorted(spending_summary['current_percentages'].items(), key=lambda x: x[1], reverse=True)[:3]),
-        'anomalies': anomalies
+        'anomalies': anomalies,
+        # Only the advice batch scores individual transactions
+        'unusual_transactions': spending_summary.get('unusual_transactions', [])
     }
-    
-    # Create the prompt
-    prompt = f"""As a friendly Certified Financial Planner (CFP), analyze this spending data and provide personalized advice:
+
+def _describe_transaction(txn: Dict) -> str:
+    """One-line description of an unusual transaction for the advice text."""
+    return (
+        f"${abs(txn['amount']):,.2f} at {txn['description'] or txn['category']} on {txn['date']} "
+        f"({txn['category']}, usually ${abs(txn['typical_amount']):,.2f})"
+    )
+
+def _unusual_section(unusual: List[Dict]) -> str:
+    # Omitted when empty so prompts without it keep their cache keys
+    if not unusual:
+        return ""
+    lines = chr(10).join(f'- {_describe_transaction(txn)}' for txn in unusual)
+    return f"""
+Unusual Transactions This Month:
+{lines}
+"""
+
+def _build_prompt(analysis: Dict) -> str:
+    """Create the advice prompt from ``_summarize_for_prompt`` output."""
+    return f"""As a friendly Certified Financial Planner (CFP), analyze this spending data and provide personalized advice:
 
 Current Month: {analysis['current_month']}
 Last Month: {analysis['last_month']}
@@ -130,7 +171,7 @@ Top Spending Categories:
 
 Notable Changes:
 {chr(10).join(f'- {a["category"]}: {a["direction"]} of {abs(a["change"])}%' for a in analysis['anomalies'])}
-
+{_unusual_section(analysis['unusual_transactions'])}
 Please provide:
 1. A brief analysis of their spending patterns
 2. One specific, actionable piece of advice
@@ -139,20 +180,131 @@ Please provide:
 
 Format the response as a friendly, conversational message."""
 
+def template_advice(spending_summary: Dict, anomalies: List[Dict]) -> str:
+    """
+    Deterministic advice used when the LLM is unavailable.
+    
+    Built from the same figures as the prompt, so it is always consistent
+    with the numbers shown alongside it.
+    """
+    analysis = _summarize_for_prompt(spending_summary, anomalies)
+    total = analysis['total_spending']
+    
+    sentences = [f"In {analysis['current_month']} you spent ${total['current']:,.2f}"]
+    if total['last']:
+        direction = 'up' if total['change'] >= 0 else 'down'
+        sentences[0] += f", {direction} {abs(total['change'])}% from {analysis['last_month']}."
+    else:
+        sentences[0] += "."
+    
+    if analysis['top_categories']:
+        category, pct = next(iter(analysis['top_categories'].items()))
+        sentences.append(f"{category} was your largest category at {pct}% of spending.")
+    
+    if anomalies:
+        increases = [a for a in anomalies if a['direction'] == 'increase']
+        if increases:
+            biggest = max(increases, key=lambda a: a['change'])
+            sentences.append(
+                f"{biggest['category']} spending rose {biggest['change']}% from last month, "
+                f"so it is a good place to look for savings."
+            )
+        else:
+            biggest = min(anomalies, key=lambda a: a['change'])
+            sentences.append(f"Nice work cutting {biggest['category']} spending by {abs(biggest['change'])}%!")
+    else:
+        sentences.append("Your spending is steady; setting a budget for your top category is a great next step.")
+    
+    if analysis['unusual_transactions']:
+        sentences.append(f"One charge stood out: {_describe_transaction(analysis['unusual_transactions'][0])}.")
+    
+    return " ".join(sentences)
+
+def _advice_messages(prompt: str) -> List[Dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+async def generate_advice(spending_summary: Dict, anomalies: List[Dict]) -> str:
+    """
+    Generate personalized financial advice for an analysis using OpenAI.
+    
+    Served from the response cache when the same analysis was seen before,
+    and from ``template_advice`` when the LLM is unavailable.
+    """
+    
+    # Prepare the analysis for the prompt
+    prompt = _build_prompt(_summarize_for_prompt(spending_summary, anomalies))
+    
+    # Identical summaries produce identical prompts, whoever uploaded them
+    cached = response_cache.get_advice(prompt)
+    if cached is not None:
+        return cached
+    
     try:
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=[
-                {"role": "system", "content": "You are a friendly, encouraging financial advisor who provides concise, actionable advice."},
-                {"role": "user", "content": prompt}
-            ],
+        response = await llm_client.complete(
+            messages=_advice_messages(prompt),
             temperature=0.7,
             max_tokens=150
         )
         
-        return response.choices[0].message.content.strip()
+        advice = response.choices[0].message.content.strip()
+        response_cache.set_advice(prompt, advice, response.usage.total_tokens if response.usage else 0)
+        
+        return advice
         
+    except LLMUnavailable as e:
+        logger.warning(f"Falling back to template advice: {str(e)}")
+        return template_advice(spending_summary, anomalies)
     except Exception as e:
         logger.error(f"Error calling OpenAI API: {str(e)}")
-        return "I apologize, but I'm having trouble generating personalized advice right now. Please try again later."
+        return template_advice(spending_summary, anomalies)
+
+async def stream_budget_advice(spending_summary: Dict, anomalies: List[Dict]) -> AsyncIterator[str]:
+    """
+    Stream advice for an analysis as the completion is generated.
+    
+    The chunks join to the same text ``generate_advice`` would return:
+    cached advice and the template fallback are yielded whole, and
+    completed streams are cached like regular completions.
+    
+    Args:
+        spending_summary: Spending summary from ``analyze_rollup``
+        anomalies: Anomalies from ``analyze_rollup``
+        
+    Yields:
+        str: Pieces of the advice text
+    """
+    prompt = _build_prompt(_summarize_for_prompt(spending_summary, anomalies))
+    
+    cached = response_cache.get_advice(prompt)
+    if cached is not None:
+        yield cached
+        return
+    
+    pieces = []
+    whitespace = ""
+    try:
+        async for token in llm_client.stream(_advice_messages(prompt), temperature=0.7, max_tokens=150):
+            # Match the stripped non-streaming answer: drop leading whitespace
+            # and hold back trailing whitespace until more text follows
+            text = whitespace + token if pieces else token.lstrip()
+            body = text.rstrip()
+            whitespace = text[len(body):]
+            if body:
+                pieces.append(body)
+                yield body
+    except Exception as e:
+        if pieces:
+            # Text already sent cannot be taken back; end the answer here
+            logger.error(f"Advice stream interrupted: {str(e)}")
+            return
+        logger.warning(f"Falling back to template advice: {str(e)}")
+        yield template_advice(spending_summary, anomalies)
+        return
+    
+    advice = "".join(pieces)
+    # Streams do not report usage; estimate what a cache hit saves
+    response_cache.set_advice(prompt, advice, estimate_tokens(SYSTEM_PROMPT, prompt, advice))
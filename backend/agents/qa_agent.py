@@ -1,26 +1,44 @@
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from datetime import date, datetime, timedelta
 import pandas as pd
 from langchain.agents import Tool, AgentExecutor, LLMSingleActionAgent
 from langchain.prompts import StringPromptTemplate
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
 from langchain_openai import ChatOpenAI
 from langchain.tools import BaseTool
+from langchain.callbacks.base import AsyncCallbackHandler
 from pydantic import BaseModel, Field
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 import json
 import logging
 from ..config import settings
+from ..database import SyncSessionLocal, current_session, session_scope
+from ..models import MonthlyCategorySpend
+from ..services.chat_memory import chat_memory
+from ..services.llm_client import LLMUnavailable, llm_client
+from ..services.response_cache import estimate_tokens, response_cache
 
 logger = logging.getLogger(__name__)
 
 # Initialize OpenAI
+# Timeouts, retries and concurrency are enforced by llm_client around each run
 llm = ChatOpenAI(
     model_name="gpt-4-turbo-preview",
     temperature=0,
-    openai_api_key=settings.OPENAI_API_KEY
+    openai_api_key=settings.OPENAI_API_KEY.get_secret_value(),
+    openai_api_base=settings.OPENAI_BASE_URL,
+    max_retries=0,
+    streaming=True
 )
 
+# Categories counted as existing debt payments by the affordability check
+DEBT_CATEGORIES = ['Mortgage', 'Car Payment', 'Credit Card', 'Loan']
+
+# Monthly income is averaged over this many complete months of Income rollups
+INCOME_LOOKBACK_MONTHS = 3
+
 class SpendSummaryInput(BaseModel):
     user_id: str = Field(..., description="User ID to get spending summary for")
 
@@ -28,6 +46,90 @@ class AffordabilityInput(BaseModel):
     monthly_payment: float = Field(..., description="Monthly payment amount to check")
     user_id: str = Field(..., description="User ID to check income against")
 
+def _month_start(months_back: int = 0) -> date:
+    """First day of the current month, shifted back by months_back months."""
+    return (pd.Timestamp.now().replace(day=1) - pd.DateOffset(months=months_back)).date()
+
+def _spend_summary_query(user_id: str) -> Select:
+    """Rollup rows for this month and the two before it."""
+    return select(
+        MonthlyCategorySpend.month,
+        MonthlyCategorySpend.category,
+        MonthlyCategorySpend.total,
+        MonthlyCategorySpend.count
+    ).where(
+        MonthlyCategorySpend.user_id == int(user_id),
+        MonthlyCategorySpend.month >= _month_start(2)
+    )
+
+def _summarize_spend(rows: List) -> str:
+    """Build the spend_summary tool output from rollup rows."""
+    rollup = pd.DataFrame(rows, columns=['month', 'category', 'total', 'count'])
+    if rollup.empty:
+        return json.dumps({"error": "No transactions found"})
+    
+    # Calculate monthly summaries
+    rollup['month'] = pd.to_datetime(rollup['month']).dt.strftime('%Y-%m')
+    monthly_summary = rollup.pivot_table(index='month', columns='category', values='total', aggfunc='sum')
+    
+    # Average transaction amount per category over the period
+    by_category = rollup.groupby('category')[['total', 'count']].sum()
+    avg_by_category = by_category['total'] / by_category['count']
+    
+    summary = {
+        "monthly_breakdown": monthly_summary.to_dict(),
+        "category_averages": avg_by_category.to_dict(),
+        "total_spending": float(rollup['total'].sum()),
+        "period": "last_3_months"
+    }
+    
+    return json.dumps(summary)
+
+def _monthly_debt_query(user_id: str) -> Select:
+    """Debt payments recorded so far this month."""
+    return select(func.coalesce(func.sum(MonthlyCategorySpend.total), 0.0)).where(
+        MonthlyCategorySpend.user_id == int(user_id),
+        MonthlyCategorySpend.month == _month_start(),
+        MonthlyCategorySpend.category.in_(DEBT_CATEGORIES)
+    )
+
+def _monthly_income_query(user_id: str) -> Select:
+    """Income totals of the last complete months."""
+    return select(MonthlyCategorySpend.total).where(
+        MonthlyCategorySpend.user_id == int(user_id),
+        MonthlyCategorySpend.category == 'Income',
+        MonthlyCategorySpend.month >= _month_start(INCOME_LOOKBACK_MONTHS),
+        MonthlyCategorySpend.month < _month_start()
+    )
+
+def _affordability(monthly_payment: float, monthly_debt: float, income_totals: List[float]) -> str:
+    """Build the affordability_calc tool output."""
+    if not income_totals:
+        return json.dumps({"error": "No income found in the last few months"})
+    
+    # Statements may record deposits with either sign
+    monthly_income = abs(sum(income_totals)) / len(income_totals)
+    if monthly_income == 0:
+        return json.dumps({"error": "No income found in the last few months"})
+    
+    # Calculate debt-to-income ratio
+    total_monthly_debt = monthly_debt + monthly_payment
+    dti_ratio = (total_monthly_debt / monthly_income) * 100
+    
+    # Standard DTI thresholds
+    is_affordable = dti_ratio <= 43  # Standard mortgage DTI limit
+    
+    result = {
+        "current_monthly_debt": monthly_debt,
+        "proposed_payment": monthly_payment,
+        "total_monthly_debt": total_monthly_debt,
+        "dti_ratio": round(dti_ratio, 2),
+        "is_affordable": is_affordable,
+        "monthly_income": round(monthly_income, 2)
+    }
+    
+    return json.dumps(result)
+
 class SpendSummaryTool(BaseTool):
     name = "spend_summary"
     description = "Get spending summary for the last 3 months by category"
@@ -35,45 +137,19 @@ class SpendSummaryTool(BaseTool):
 
     def _run(self, user_id: str) -> str:
         try:
-            # TODO: Replace with actual database query
-            # This is a placeholder that should be replaced with actual data retrieval
-            from ..models import Transaction
-            from ..database import SessionLocal
-            
-            db = SessionLocal()
-            three_months_ago = datetime.now() - timedelta(days=90)
-            
-            # Get transactions for last 3 months
-            transactions = db.query(Transaction).filter(
-                Transaction.user_id == user_id,
-                Transaction.date >= three_months_ago
-            ).all()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame([{
-                'date': t.date,
-                'amount': t.amount,
-                'category': t.category
-            } for t in transactions])
-            
-            if df.empty:
-                return json.dumps({"error": "No transactions found"})
-            
-            # Calculate monthly summaries
-            df['month'] = pd.to_datetime(df['date']).dt.to_period('M')
-            monthly_summary = df.groupby(['month', 'category'])['amount'].sum().unstack()
-            
-            # Calculate 3-month averages
-            avg_by_category = df.groupby('category')['amount'].mean()
-            
-            summary = {
-                "monthly_breakdown": monthly_summary.to_dict(),
-                "category_averages": avg_by_category.to_dict(),
-                "total_spending": df['amount'].sum(),
-                "period": "last_3_months"
-            }
+            with SyncSessionLocal() as db:
+                rows = db.execute(_spend_summary_query(user_id)).all()
+            return _summarize_spend(rows)
             
-            return json.dumps(summary)
+        except Exception as e:
+            logger.error(f"Error in spend_summary tool: {str(e)}")
+            return json.dumps({"error": str(e)})
+
+    async def _arun(self, user_id: str) -> str:
+        try:
+            async with session_scope() as db:
+                rows = (await db.execute(_spend_summary_query(user_id))).all()
+            return _summarize_spend(rows)
             
         except Exception as e:
             logger.error(f"Error in spend_summary tool: {str(e)}")
@@ -86,43 +162,21 @@ class AffordabilityTool(BaseTool):
 
     def _run(self, monthly_payment: float, user_id: str) -> str:
         try:
-            # TODO: Replace with actual database query
-            # This is a placeholder that should be replaced with actual data retrieval
-            from ..models import Transaction, User
-            from ..database import SessionLocal
-            
-            db = SessionLocal()
-            
-            # Get user's monthly income
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user:
-                return json.dumps({"error": "User not found"})
-            
-            # Get current monthly debt payments
-            current_month = datetime.now().replace(day=1)
-            monthly_debt = db.query(Transaction).filter(
-                Transaction.user_id == user_id,
-                Transaction.date >= current_month,
-                Transaction.category.in_(['Mortgage', 'Car Payment', 'Credit Card', 'Loan'])
-            ).with_entities(func.sum(Transaction.amount)).scalar() or 0
+            with SyncSessionLocal() as db:
+                monthly_debt = db.execute(_monthly_debt_query(user_id)).scalar()
+                income_totals = db.execute(_monthly_income_query(user_id)).scalars().all()
+            return _affordability(monthly_payment, monthly_debt, income_totals)
             
-            # Calculate debt-to-income ratio
-            total_monthly_debt = monthly_debt + monthly_payment
-            dti_ratio = (total_monthly_debt / user.monthly_income) * 100
-            
-            # Standard DTI thresholds
-            is_affordable = dti_ratio <= 43  # Standard mortgage DTI limit
-            
-            result = {
-                "current_monthly_debt": monthly_debt,
-                "proposed_payment": monthly_payment,
-                "total_monthly_debt": total_monthly_debt,
-                "dti_ratio": round(dti_ratio, 2),
-                "is_affordable": is_affordable,
-                "monthly_income": user.monthly_income
-            }
-            
-            return json.dumps(result)
+        except Exception as e:
+            logger.error(f"Error in affordability_calc tool: {str(e)}")
+            return json.dumps({"error": str(e)})
+
+    async def _arun(self, monthly_payment: float, user_id: str) -> str:
+        try:
+            async with session_scope() as db:
+                monthly_debt = (await db.execute(_monthly_debt_query(user_id))).scalar()
+                income_totals = (await db.execute(_monthly_income_query(user_id))).scalars().all()
+            return _affordability(monthly_payment, monthly_debt, income_totals)
             
         except Exception as e:
             logger.error(f"Error in affordability_calc tool: {str(e)}")
@@ -162,12 +216,6 @@ prompt = StringPromptTemplate(
     input_variables=["tools", "tool_names", "chat_history", "question", "agent_scratchpad"]
 )
 
-# Initialize memory
-memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    return_messages=True
-)
-
 # Initialize agent
 agent = LLMSingleActionAgent(
     llm_chain=llm,
@@ -180,30 +228,146 @@ agent = LLMSingleActionAgent(
 agent_executor = AgentExecutor.from_agent_and_tools(
     agent=agent,
     tools=tools,
-    memory=memory,
     verbose=True
 )
 
-def answer_question(question: str, user_id: str) -> str:
+class AnswerInterrupted(Exception):
+    """Raised instead of re-running the agent after part of its answer was streamed."""
+
+class FinalAnswerStreamHandler(AsyncCallbackHandler):
+    """Forwards the LLM tokens that follow the agent's "Final Answer:" marker."""
+
+    MARKER = "Final Answer:"
+
+    def __init__(self, on_token: Callable[[str], None]):
+        self.on_token = on_token
+        self._buffer = ""
+        self._emitted = 0
+        # Everything passed to on_token so far, across agent runs
+        self.streamed = ""
+
+    async def on_llm_start(self, *args, **kwargs) -> None:
+        # Every agent step is a new completion; only the last one has the answer
+        self._buffer = ""
+        self._emitted = 0
+
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self._buffer += token
+        index = self._buffer.find(self.MARKER)
+        if index < 0:
+            return
+        # The agent strips the final answer, so surrounding whitespace is held back
+        answer = self._buffer[index + len(self.MARKER):].strip()
+        if len(answer) > self._emitted:
+            piece = answer[self._emitted:]
+            self.on_token(piece)
+            self.streamed += piece
+            self._emitted = len(answer)
+
+async def answer_question(
+    question: str,
+    user_id: str,
+    db: Optional[AsyncSession] = None,
+    on_token: Optional[Callable[[str], None]] = None
+) -> str:
     """
     Answer a financial question using the QA agent.
     
     Args:
         question: The user's question
         user_id: The ID of the user asking the question
+        db: The request's database session; tools run their queries on it
+        on_token: Called with pieces of the final answer as they are generated
         
     Returns:
         str: The agent's answer
     """
+    token = current_session.set(db)
     try:
         # Add user_id to the question context
         context = f"User ID: {user_id}\nQuestion: {question}"
         
-        # Get response from agent
-        response = agent_executor.run(context)
+        # Only this user's recent exchanges go into the prompt
+        history = chat_memory.render(await chat_memory.load(int(user_id), db))
+        
+        # A question repeated after the same history is answered from the
+        # cache until the user's transactions change. The key is taken
+        # before the agent runs, so a change during the call orphans it
+        cache_key = response_cache.chat_key(int(user_id), question, history)
+        response = response_cache.get_chat(cache_key)
+        if response is None:
+            # Get response from agent
+            handler = FinalAnswerStreamHandler(on_token) if on_token else None
+            
+            async def run_agent(remaining: float) -> str:
+                # A retry would stream the answer a second time after the
+                # part the client already has
+                if handler is not None and handler.streamed:
+                    raise AnswerInterrupted("agent failed after streaming part of its answer")
+                return await agent_executor.arun(
+                    question=context, chat_history=history, callbacks=[handler] if handler else None
+                )
+            
+            try:
+                response = await llm_client.call(run_agent)
+            except AnswerInterrupted as e:
+                # Text already sent cannot be taken back; end the answer there
+                logger.error(f"QA answer stream interrupted: {str(e)}")
+                return handler.streamed
+            response_cache.set_chat(cache_key, response, estimate_tokens(template, history, context, response))
+        
+        await chat_memory.append(int(user_id), question, response)
         
         return response
         
+    except LLMUnavailable as e:
+        logger.warning(f"QA agent unavailable: {str(e)}")
+        return "I'm getting a lot of questions right now. Please try again in a minute."
     except Exception as e:
         logger.error(f"Error in answer_question: {str(e)}")
-        return "I apologize, but I'm having trouble processing your question right now. Please try again later." 
\ No newline at end of file
+        return "I apologize, but I'm having trouble processing your question right now. Please try again later."
+    finally:
+        current_session.reset(token)
+
+async def stream_answer(question: str, user_id: str) -> AsyncIterator[str]:
+    """
+    Stream the QA agent's answer as the final step is generated.
+    
+    The agent runs in a background task. Final-answer tokens are yielded as
+    they arrive, and whatever the streamed text is missing from the returned
+    answer (cached answers, fallbacks, trailing text) is yielded at the end,
+    so the chunks join to the same text ``answer_question`` returns. Opens
+    its own sessions because it outlives the request handler.
+    
+    Args:
+        question: The user's question
+        user_id: The ID of the user asking the question
+        
+    Yields:
+        str: Pieces of the answer text
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(answer_question(question, user_id, on_token=queue.put_nowait))
+    streamed = ""
+    try:
+        while not task.done() or not queue.empty():
+            if queue.empty():
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                token = getter.result()
+            else:
+                token = queue.get_nowait()
+            streamed += token
+            yield token
+        
+        answer = task.result()
+        if answer.startswith(streamed) and len(answer) > len(streamed):
+            yield answer[len(streamed):]
+    finally:
+        if not task.done():
+            # Client went away; don't leave the agent running
+            task.cancel()
+
@@ -30,15 +30,66 @@ class Settings(BaseSettings):
     # OpenAI
     OPENAI_API_KEY: SecretStr
     OPENAI_MODEL: str = "gpt-4-turbo-preview"
+    OPENAI_BASE_URL: Optional[str] = None  # e.g. a local stub server
+    OPENAI_MAX_CONCURRENCY: int = 8
+    OPENAI_TIMEOUT_SECONDS: float = 20.0  # per call, including retries
+    OPENAI_STREAM_TIMEOUT_SECONDS: float = 120.0  # per stream, from queueing to the last chunk
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_BREAKER_THRESHOLD: int = 5  # consecutive failures that open the breaker
+    OPENAI_BREAKER_RESET_SECONDS: float = 30.0
+    
+    # QA agent conversation memory
+    CHAT_MEMORY_WINDOW: int = 6  # exchanges sent with each question
+    CHAT_MEMORY_MAX_USERS: int = 1000
+    CHAT_MEMORY_IDLE_SECONDS: float = 30 * 60
+    CHAT_MEMORY_FLUSH_SECONDS: float = 1.0
+    
+    # LLM response cache
+    RESPONSE_CACHE_BACKEND: str = "memory"  # memory (single worker only), sqlite
+    RESPONSE_CACHE_SQLITE_PATH: str = "response_cache.sqlite3"
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10_000
+    RESPONSE_CACHE_TTL_SECONDS: int = 60 * 60
     
     # Plaid
     PLAID_CLIENT_ID: SecretStr
     PLAID_SECRET: SecretStr
     PLAID_ENV: str = "sandbox"  # sandbox, development, production
+    PLAID_BASE_URL: Optional[str] = None  # e.g. a local stub server; derived from PLAID_ENV when unset
+    PLAID_SYNC_PAGE_SIZE: int = 500  # transactions per /transactions/sync page (Plaid maximum)
+    PLAID_MAX_CONCURRENCY: int = 8  # requests in flight across the process
+    PLAID_TIMEOUT_SECONDS: float = 30.0
+    PLAID_ITEM_RATE_PER_MINUTE: float = 50.0  # per-item request budget
+    PLAID_ITEM_BURST: int = 10
+    PLAID_SYNC_CONCURRENCY: int = 4  # items synced at once by bulk sync
+    PLAID_WEBHOOK_URL: Optional[str] = None  # public URL of /plaid/webhook registered with new items
+    PLAID_WEBHOOK_WORKERS: int = 2  # background sync jobs per process
+    PLAID_WEBHOOK_DEBOUNCE_SECONDS: float = 5.0  # webhooks for an item within this window share one sync
+    PLAID_WEBHOOK_RETRY_SECONDS: float = 60.0
+    PLAID_WEBHOOK_MAX_ATTEMPTS: int = 3
+    PLAID_WEBHOOK_MAX_AGE_SECONDS: float = 300.0  # older Plaid-Verification tokens are rejected as replays
+    PLAID_WEBHOOK_KEY_CACHE_SECONDS: float = 3600.0  # verification keys are refetched after this, to see rotations
+    PLAID_WEBHOOK_REFUSED_KEY_SECONDS: float = 60.0  # unknown or expired key ids are not looked up again for this long
+    PLAID_WEBHOOK_KEY_FETCHES_PER_MINUTE: float = 10.0  # caps Plaid key lookups triggered by forged key ids
     
     # Redis (for caching and rate limiting)
     REDIS_URL: Optional[str] = None
     
+    # Parsed statement cache
+    PARSE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # in-process LRU
+    PARSE_CACHE_REDIS_MAX_BYTES: int = 1024 * 1024 * 1024
+    PARSE_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    
+    # Merchant key -> category memo in front of the categorizer
+    MERCHANT_MEMO_MAX_ENTRIES: int = 100_000  # in-process LRU
+    MERCHANT_MEMO_PERSIST: bool = True  # share entries through the merchant_categories table
+    
+    # Per-user Parquet snapshots of closed months for historical analytics (needs pyarrow)
+    TRANSACTION_SNAPSHOT_DIR: Optional[str] = None
+    
+    # GET /transactions pagination
+    TRANSACTIONS_PAGE_SIZE: int = 100
+    TRANSACTIONS_MAX_PAGE_SIZE: int = 1000
+    
     # Email
     SMTP_TLS: bool = True
     SMTP_PORT: Optional[int] = None
@@ -54,10 +105,22 @@ class Settings(BaseSettings):
     # File Upload
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: set[str] = {"pdf", "csv", "xlsx", "xls"}
+    UPLOAD_CHUNK_ROWS: int = 50_000  # rows per chunk for streaming CSV ingestion
+    
+    # PDF parsing
+    PDF_MAX_PAGES: Optional[int] = None
+    PDF_TIME_BUDGET_SECONDS: Optional[float] = None
+    PDF_PAGE_WORKERS: Optional[int] = None  # defaults to CPU count
     
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
     
+    # CPU-bound request stages (parsing, classification, advice)
+    EXECUTOR_KIND: str = "thread"  # thread, process
+    EXECUTOR_MAX_WORKERS: int = 4
+    EXECUTOR_MAX_QUEUE: int = 32
+    EXECUTOR_ACQUIRE_TIMEOUT_SECONDS: float = 5.0
+    
     # CORS Configuration
     @validator("BACKEND_CORS_ORIGINS", pre=True)
     def assemble_cors_origins(cls, v: str | list[str]) -> list[str] | str:
@@ -90,6 +153,22 @@ class Settings(BaseSettings):
             raise ValueError(f"PLAID_ENV must be one of {allowed}")
         return v
     
+    # Executor kind validation
+    @validator("EXECUTOR_KIND")
+    def validate_executor_kind(cls, v: str) -> str:
+        allowed = {"thread", "process"}
+        if v not in allowed:
+            raise ValueError(f"EXECUTOR_KIND must be one of {allowed}")
+        return v
+    
+    # Response cache backend validation
+    @validator("RESPONSE_CACHE_BACKEND")
+    def validate_response_cache_backend(cls, v: str) -> str:
+        allowed = {"memory", "sqlite"}
+        if v not in allowed:
+            raise ValueError(f"RESPONSE_CACHE_BACKEND must be one of {allowed}")
+        return v
+    
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
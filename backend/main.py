@@ -1,19 +1,36 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 import os
-from typing import Optional
+from datetime import date
+from typing import AsyncIterator, Dict, List, Optional
 from pydantic import BaseModel
-from datetime import datetime
+import orjson
+import pandas as pd
 
 from services.ocr_parser import parse_statement
-from services.categorizer import classify_transactions
-from agents.advisor_agent import generate_budget_advice
-from agents.qa_agent import answer_question
+from services.merchant_memo import merchant_memo
+from agents.advisor_agent import generate_budget_advice, analyze_budget, stream_budget_advice
+from agents.qa_agent import answer_question, stream_answer
 from services.plaid_service import plaid_service
-from database import get_db, engine
+from services.plaid_sync import register_item, load_item, sync_item, sync_items
+from services.plaid_webhooks import sync_jobs, webhook_verifier, WebhookVerificationError, SYNC_WEBHOOK_CODES
+from services.model_registry import model_registry
+from services.executor import cpu_executor, ExecutorSaturated
+from services.ingestion import ingest_csv_stream
+from services.parse_cache import parse_cache
+from services.transaction_store import bulk_insert_transactions
+from services.chat_memory import chat_memory
+from services.response_cache import response_cache
+from services.llm_client import llm_client
+from services.advice_batch import load_advice_snapshot
+from services.response_format import encode_columns, transactions_response
+from services.transaction_query import query_transactions, DEFAULT_FIELDS
+from config import settings
+from database import get_db, engine, pool_stats
 from models import Base
 
 # Create database tables
@@ -45,16 +62,107 @@ class PlaidLinkTokenRequest(BaseModel):
 
 class PlaidCallbackRequest(BaseModel):
     public_token: str
+    user_id: Optional[int] = None  # registers the item for incremental sync when set
 
 class PlaidSyncRequest(BaseModel):
     access_token: str
-    start_date: Optional[datetime] = None
-    end_date: Optional[datetime] = None
+
+class PlaidBulkSyncRequest(BaseModel):
+    access_tokens: List[str]
+
+async def _parse_and_classify(contents: bytes, filename: str) -> pd.DataFrame:
+    """
+    Parse and categorize an uploaded statement, reusing cached results for
+    files that were already processed with the same parser and model.
+
+    The merchant memo's counters for the statement are in
+    ``attrs['categorization']``; they are absent when the whole statement
+    came from the parse cache.
+    """
+    key = await run_in_threadpool(
+        parse_cache.key, contents, filename, model_registry.current_version(), settings.PDF_MAX_PAGES
+    )
+    categorized = await parse_cache.get(key)
+    if categorized is not None:
+        return categorized
+    
+    df = await cpu_executor.run(
+        "parse", parse_statement, contents, filename,
+        max_pages=settings.PDF_MAX_PAGES,
+        time_budget=settings.PDF_TIME_BUDGET_SECONDS,
+        pdf_workers=settings.PDF_PAGE_WORKERS
+    )
+    categorized = await merchant_memo.classify(df)
+    
+    # Partial parses depend on timing, so only complete results are cached
+    if not df.attrs.get("truncated"):
+        await parse_cache.set(key, categorized)
+    return categorized
+
+async def _store_transactions(db: AsyncSession, user_id: Optional[int], categorized: pd.DataFrame) -> int:
+    """Persist categorized transactions for a known user; duplicates are skipped."""
+    if user_id is None:
+        return 0
+    stored = await bulk_insert_transactions(db, user_id, categorized)
+    await db.commit()
+    return stored
+
+def _sse(event: str, data) -> str:
+    """Format one server-sent event with a JSON payload."""
+    payload = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY, default=str).decode()
+    return f"event: {event}\ndata: {payload}\n\n"
+
+async def _stream_text(events: List[str], tokens: AsyncIterator[str], result_key: str) -> AsyncIterator[str]:
+    """
+    Send the prepared events, then one ``token`` event per text piece and a
+    final ``done`` event carrying the complete text under result_key.
+    """
+    for event in events:
+        yield event
+    pieces = []
+    try:
+        async for token in tokens:
+            pieces.append(token)
+            yield _sse("token", token)
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+        return
+    yield _sse("done", {result_key: "".join(pieces)})
+
+@app.on_event("startup")
+async def start_background_workers():
+    sync_jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    await sync_jobs.close()
+    cpu_executor.shutdown()
+    await chat_memory.close()
+    await plaid_service.close()
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Expose in-process cache and performance counters.
+    """
+    return {
+        "model_registry": model_registry.stats(),
+        "executor": cpu_executor.stats(),
+        "parse_cache": parse_cache.stats(),
+        "merchant_memo": merchant_memo.stats(),
+        "database": pool_stats(),
+        "chat_memory": chat_memory.stats(),
+        "response_cache": response_cache.stats(),
+        "llm": llm_client.stats(),
+        "plaid": plaid_service.stats(),
+        "plaid_webhooks": sync_jobs.stats(),
+        "plaid_webhook_verification": webhook_verifier.stats()
+    }
+
 @app.post("/auth/google")
 async def google_auth(request: GoogleAuthRequest):
     # TODO: Implement OAuth2 code exchange
@@ -62,51 +170,185 @@ async def google_auth(request: GoogleAuthRequest):
 
 @app.post("/upload")
 async def upload_statement(
+    request: Request,
     file: UploadFile = File(...),
+    user_id: Optional[int] = Form(None),
     db: AsyncSession = Depends(get_db)
 ):
+    """
+    Parse, categorize and optionally store a statement.
+
+    Transactions are returned column-oriented with dictionary-encoded
+    categories, as JSON by default or as Arrow IPC or MessagePack when the
+    Accept header asks for them. ``categorization`` reports how many
+    merchants the merchant memo answered, or is null when the statement
+    came from the parse cache.
+    """
     try:
         contents = await file.read()
-        df = parse_statement(contents, file.filename)
-        categorized = classify_transactions(df)
-        # TODO: Store transactions in database using async db
-        # Example: await db.execute(...)
+        categorized = await _parse_and_classify(contents, file.filename)
+        stored = await _store_transactions(db, user_id, categorized)
+        return transactions_response(
+            request.headers.get("accept"), categorized,
+            message="Statement processed successfully",
+            stored=stored,
+            categorization=categorized.attrs.get("categorization")
+        )
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/upload/stream")
+async def upload_statement_stream(
+    file: UploadFile = File(...),
+    user_id: int = Form(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Ingest a large CSV statement in chunks, persisting as it goes.
+    Returns counts instead of the transactions so memory stays flat.
+    """
+    try:
+        if not file.filename.lower().endswith(".csv"):
+            raise ValueError("Streaming ingestion only supports CSV files")
+        summary = await ingest_csv_stream(file.file, user_id, db, settings.UPLOAD_CHUNK_ROWS)
         return {
-            "message": "Statement processed successfully",
-            "transactions": categorized.to_dict(orient="records")
+            "message": "Statement ingested successfully",
+            **summary
         }
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/analyze")
 async def analyze_transactions(
+    request: Request,
     file: UploadFile = File(...),
+    user_id: Optional[int] = Form(None),
     db: AsyncSession = Depends(get_db)
 ):
+    """Same as /upload, with budget advice for the statement."""
     try:
         contents = await file.read()
-        df = parse_statement(contents, file.filename)
-        categorized = classify_transactions(df)
-        advice = generate_budget_advice(categorized)
-        # TODO: Store transactions in database using async db
-        return {
-            "transactions": categorized.to_dict(orient="records"),
-            "advice": advice
-        }
+        categorized = await _parse_and_classify(contents, file.filename)
+        stored = await _store_transactions(db, user_id, categorized)
+        advice = await generate_budget_advice(categorized)
+        return transactions_response(
+            request.headers.get("accept"), categorized,
+            advice=advice,
+            stored=stored,
+            categorization=categorized.attrs.get("categorization")
+        )
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/analyze/stream")
+async def analyze_transactions_stream(
+    file: UploadFile = File(...),
+    user_id: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Same as /analyze, as server-sent events: ``transactions`` and
+    ``summary`` are sent as soon as the statement is analyzed, followed by
+    the advice as ``token`` events and a final ``done`` event.
+    """
+    try:
+        contents = await file.read()
+        categorized = await _parse_and_classify(contents, file.filename)
+        stored = await _store_transactions(db, user_id, categorized)
+        spending_summary, anomalies = await cpu_executor.run("advice", analyze_budget, categorized)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    events = [
+        _sse("transactions", encode_columns(categorized)),
+        _sse("summary", {
+            "spending": spending_summary,
+            "anomalies": anomalies,
+            "stored": stored,
+            "categorization": categorized.attrs.get("categorization")
+        })
+    ]
+    return StreamingResponse(
+        _stream_text(events, stream_budget_advice(spending_summary, anomalies), "advice"),
+        media_type="text/event-stream"
+    )
+
+@app.get("/advice/{user_id}")
+async def get_advice(user_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Return the advice precomputed for a user by the batch advice job.
+    """
+    snapshot = await load_advice_snapshot(db, user_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No precomputed advice for this user yet")
+    return snapshot
+
+@app.get("/transactions")
+async def list_transactions(
+    request: Request,
+    user_id: int,
+    fields: str = ",".join(DEFAULT_FIELDS),
+    category: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    limit: int = Query(settings.TRANSACTIONS_PAGE_SIZE, ge=1, le=settings.TRANSACTIONS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Page through a user's stored transactions, newest first by default.
+
+    ``fields`` is a comma-separated projection. Pass the returned
+    ``next_cursor`` as ``cursor`` to get the following page; it is null on
+    the last page. The page is encoded like /upload, negotiated by Accept.
+    """
+    try:
+        page, next_cursor = await query_transactions(
+            db, user_id,
+            fields=[field.strip() for field in fields.split(",") if field.strip()],
+            category=category,
+            start_date=start_date,
+            end_date=end_date,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            limit=limit,
+            cursor=cursor,
+            newest_first=order == "desc"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return transactions_response(request.headers.get("accept"), page, next_cursor=next_cursor)
+
 @app.post("/chat")
 async def chat(
     request: ChatRequest,
     db: AsyncSession = Depends(get_db)
 ):
     try:
-        answer = answer_question(request.question, request.user_id, db)
+        answer = await answer_question(request.question, request.user_id, db)
         return {"answer": answer}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Same as /chat, streaming the answer as ``token`` events and a final ``done`` event."""
+    return StreamingResponse(
+        _stream_text([], stream_answer(request.question, request.user_id), "answer"),
+        media_type="text/event-stream"
+    )
+
 @app.post("/plaid/link-token")
 async def create_link_token(request: PlaidLinkTokenRequest):
     """
@@ -119,27 +361,67 @@ async def create_link_token(request: PlaidLinkTokenRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/plaid/callback")
-async def handle_plaid_callback(request: PlaidCallbackRequest):
+async def handle_plaid_callback(request: PlaidCallbackRequest, db: AsyncSession = Depends(get_db)):
     """
     Handle the callback from Plaid Link after successful connection.
     """
     try:
         response = await plaid_service.exchange_public_token(request.public_token)
+        if request.user_id is not None:
+            await register_item(db, request.user_id, response['item_id'], response['access_token'])
+            await db.commit()
         return response
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/plaid/sync")
-async def sync_transactions(request: PlaidSyncRequest):
+async def sync_transactions(request: PlaidSyncRequest, db: AsyncSession = Depends(get_db)):
     """
-    Sync transactions from Plaid for a given date range.
+    Apply the transactions added, modified and removed since the item's last sync.
     """
-    try:
-        transactions = await plaid_service.fetch_transactions(
-            request.access_token,
-            request.start_date,
-            request.end_date
+    item = await load_item(db, request.access_token)
+    if item is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Unknown Plaid item. Link it through /plaid/callback with a user_id first."
         )
-        return {"transactions": transactions}
+    try:
+        return await sync_item(db, item)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/plaid/sync/bulk")
+async def sync_transactions_bulk(request: PlaidBulkSyncRequest):
+    """
+    Sync many linked items concurrently; failures are reported per item.
+    """
+    return {"items": await sync_items(request.access_tokens)}
+
+@app.post("/plaid/webhook")
+async def handle_plaid_webhook(request: Request):
+    """
+    Receive Plaid webhooks. The Plaid-Verification JWT must vouch for the
+    body before it is read. Transaction updates are queued for a background
+    sync and acknowledged immediately; other webhooks are ignored.
+    """
+    body = await request.body()
+    try:
+        await webhook_verifier.verify(body, request.headers.get("Plaid-Verification"))
+    except WebhookVerificationError:
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Webhook body is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Webhook body must be a JSON object")
+    if payload.get("webhook_type") != "TRANSACTIONS" or payload.get("webhook_code") not in SYNC_WEBHOOK_CODES:
+        return {"status": "ignored"}
+    if not payload.get("item_id"):
+        raise HTTPException(status_code=400, detail="Webhook has no item_id")
+    
+    scheduled = await sync_jobs.enqueue(payload["item_id"])
+    return {"status": "queued" if scheduled else "debounced"}
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Enum, JSON
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Enum, JSON, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
@@ -26,17 +26,95 @@ class Transaction(Base):
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    account_id = Column(Integer, ForeignKey('accounts.id'))
     date = Column(DateTime, nullable=False)
     description = Column(String)
     amount = Column(Float, nullable=False)
     category = Column(String)
+    description_hash = Column(String(64))  # sha256 of description, part of the natural key
+    plaid_transaction_id = Column(String)  # set for transactions ingested through Plaid sync
     meta = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Natural key that makes statement re-uploads idempotent; Plaid rows
+        # are keyed on their Plaid id instead, since distinct Plaid
+        # transactions can share a date, amount and name
+        Index('uq_transactions_statement_key', 'user_id', 'date', 'amount', 'description_hash', unique=True,
+              postgresql_where=text('plaid_transaction_id IS NULL')),
+        # Also finds modified and removed Plaid transactions. Unique indexes on
+        # a partitioned table must contain the partition key, hence the date
+        Index('uq_transactions_user_plaid_id', 'user_id', 'plaid_transaction_id', 'date', unique=True,
+              postgresql_where=text('plaid_transaction_id IS NOT NULL')),
+        # Access paths used by the QA agent tools: per-user date ranges and
+        # per-user category sums, covering the columns they read. The trailing
+        # id serves the (date, id) keyset pagination of GET /transactions
+        Index('ix_transactions_user_date_id', 'user_id', 'date', 'id', postgresql_include=['amount', 'category']),
+        Index('ix_transactions_user_category_date_id', 'user_id', 'category', 'date', 'id', postgresql_include=['amount']),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="transactions")
     account = relationship("Account", back_populates="transactions")
 
+class MonthlyCategorySpend(Base):
+    """Per-user monthly spend rollup, maintained on insert and backfillable."""
+    __tablename__ = 'monthly_category_spend'
+    
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    category = Column(String, primary_key=True)  # 'Uncategorized' when the transaction has none
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+    min_amount = Column(Float)
+    max_amount = Column(Float)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AdviceSnapshot(Base):
+    """Latest precomputed budget advice per user, written by the batch advice job."""
+    __tablename__ = 'advice_snapshots'
+    
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    advice = Column(Text, nullable=False)
+    summary = Column(JSON)
+    anomalies = Column(JSON)
+    run_id = Column(String, nullable=False)
+    generated_at = Column(DateTime, default=datetime.utcnow)
+
+class AdviceJobShard(Base):
+    """Progress checkpoint of one shard of a batch advice run."""
+    __tablename__ = 'advice_job_shards'
+    
+    run_id = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    num_shards = Column(Integer, nullable=False)
+    last_user_id = Column(Integer, nullable=False, default=0)  # keyset position to resume after
+    users_done = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default='running')  # running, done
+    elapsed_seconds = Column(Float, nullable=False, default=0.0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PlaidItem(Base):
+    """A linked Plaid item and the cursor of its last applied transactions sync."""
+    __tablename__ = 'plaid_items'
+    
+    item_id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    access_token = Column(String, nullable=False, unique=True)
+    cursor = Column(Text)  # NULL until the first sync page is applied
+    last_synced_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class MerchantCategory(Base):
+    """Memoized category of a normalized merchant key, valid for one classifier version."""
+    __tablename__ = 'merchant_categories'
+    
+    merchant_key = Column(String, primary_key=True)
+    category = Column(String, nullable=False)
+    classifier_version = Column(String, nullable=False)  # rules and model versions that produced the category
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Account(Base):
     __tablename__ = 'accounts'
     
@@ -74,4 +152,9 @@ class ChatHistory(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     question = Column(Text)
     answer = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow) 
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Serves the per-user "last N exchanges" read of the chat memory
+        Index('ix_chat_history_user_id_id', 'user_id', 'id'),
+    )
@@ -0,0 +1,220 @@
+import asyncio
+import math
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import logging
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import AsyncSessionLocal
+from ..models import AdviceJobShard, AdviceSnapshot, User
+from ..agents.advisor_agent import analyze_rollup, generate_advice
+from .anomaly_engine import SEASONAL_YEARS, detect_monthly_shifts, detect_transaction_outliers
+from .rollups import load_monthly_rollups
+from .transaction_columns import transaction_snapshots
+
+logger = logging.getLogger(__name__)
+
+# Rollup history loaded per user: enough for the seasonal baseline
+HISTORY_MONTHS = 12 * SEASONAL_YEARS + 1
+
+# Transaction history used as each category's baseline for unusual transactions
+OUTLIER_HISTORY_MONTHS = 12
+
+# Unusual transactions of the latest month kept in each summary
+MAX_UNUSUAL_TRANSACTIONS = 3
+
+def _jsonable(value):
+    """Convert an analysis to JSON-safe values; Postgres json rejects NaN."""
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else float(value)
+    if hasattr(value, 'item'):
+        # numpy scalars
+        return _jsonable(value.item())
+    return value
+
+def _unusual_transactions(outliers: Optional[pd.DataFrame], month: pd.Timestamp) -> List[Dict]:
+    """The latest month's transactions furthest from their category's typical amount."""
+    if outliers is None:
+        return []
+    latest = outliers[outliers['date'] >= month]
+    latest = latest.loc[latest['z_score'].abs().sort_values(ascending=False).index[:MAX_UNUSUAL_TRANSACTIONS]]
+    return [
+        {
+            'date': row.date.date().isoformat(),
+            'description': row.description if isinstance(row.description, str) else None,
+            'category': row.category,
+            'amount': round(row.amount, 2),
+            'typical_amount': round(row.median, 2)
+        }
+        for row in latest.itertuples(index=False)
+    ]
+
+async def _next_users(db: AsyncSession, shard: int, num_shards: int, after: int, limit: int) -> List[int]:
+    """Next user ids of a shard in keyset order."""
+    result = await db.execute(
+        select(User.id)
+        .where(User.id % num_shards == shard, User.id > after)
+        .order_by(User.id)
+        .limit(limit)
+    )
+    return list(result.scalars())
+
+async def _advise_batch(db: AsyncSession, user_ids: List[int], concurrency: int) -> List[Dict]:
+    """Analyze a batch of users together and generate their advice concurrently."""
+    since = (pd.Timestamp.now().replace(day=1) - pd.DateOffset(months=HISTORY_MONTHS)).date()
+    rollups = await load_monthly_rollups(db, user_ids, since=since)
+    if rollups.empty:
+        return []
+
+    # One vectorized anomaly pass for the whole batch
+    shifts = detect_monthly_shifts(rollups)
+    shifts_by_user = dict(tuple(shifts.groupby('user_id')))
+
+    # Transaction-level history comes from the columnar layer, with closed
+    # months served from Parquet snapshots when they are enabled
+    outlier_since = (pd.Timestamp.now().replace(day=1) - pd.DateOffset(months=OUTLIER_HISTORY_MONTHS)).to_pydatetime()
+    transactions = await transaction_snapshots.load(db, user_ids, since=outlier_since)
+    outliers = detect_transaction_outliers(transactions.astype({'category': object}))
+    outliers_by_user = dict(tuple(outliers.groupby('user_id')))
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def advise(user_id: int, rollup: pd.DataFrame) -> Optional[Dict]:
+        try:
+            spending_summary, anomalies = analyze_rollup(
+                rollup.drop(columns='user_id'), shifts_by_user.get(user_id, shifts.iloc[0:0])
+            )
+            spending_summary['unusual_transactions'] = _unusual_transactions(
+                outliers_by_user.get(user_id), rollup['month'].max()
+            )
+            async with slots:
+                advice = await generate_advice(spending_summary, anomalies)
+        except Exception as e:
+            # One bad user must not stall the shard on every resume
+            logger.error(f"Skipping advice for user {user_id}: {str(e)}")
+            return None
+        return {
+            'user_id': int(user_id),
+            'advice': advice,
+            'summary': _jsonable(spending_summary),
+            'anomalies': _jsonable(anomalies)
+        }
+
+    results = await asyncio.gather(*[advise(user_id, rollup) for user_id, rollup in rollups.groupby('user_id')])
+    return [result for result in results if result is not None]
+
+async def _load_checkpoint(db: AsyncSession, run_id: str, shard: int, num_shards: int) -> AdviceJobShard:
+    checkpoint = await db.get(AdviceJobShard, (run_id, shard))
+    if checkpoint is None:
+        checkpoint = AdviceJobShard(run_id=run_id, shard=shard, num_shards=num_shards,
+                                    last_user_id=0, users_done=0, status='running', elapsed_seconds=0.0)
+        db.add(checkpoint)
+        await db.commit()
+    elif checkpoint.num_shards != num_shards:
+        raise ValueError(f"Run {run_id} was started with {checkpoint.num_shards} shards, not {num_shards}")
+    return checkpoint
+
+async def run_shard(
+    run_id: str,
+    shard: int,
+    num_shards: int,
+    batch_size: int = 200,
+    concurrency: int = 8
+) -> Dict:
+    """
+    Generate and store advice for every user in one shard, resuming from its checkpoint.
+    
+    Users are assigned to shards by ``id % num_shards`` and walked in id
+    order. After each batch the snapshots and the shard's checkpoint are
+    committed together, so a crashed run restarted with the same run_id
+    continues after the last committed batch.
+    
+    Args:
+        run_id: Identifies the run; reuse it to resume
+        shard: Shard number in [0, num_shards)
+        num_shards: Total number of shards in the run
+        batch_size: Users analyzed and committed together
+        concurrency: LLM requests in flight for this shard
+        
+    Returns:
+        dict: Shard progress and throughput
+    """
+    async with AsyncSessionLocal() as db:
+        checkpoint = await _load_checkpoint(db, run_id, shard, num_shards)
+        processed = 0
+        started = time.perf_counter()
+        while checkpoint.status != 'done':
+            user_ids = await _next_users(db, shard, num_shards, checkpoint.last_user_id, batch_size)
+            if not user_ids:
+                checkpoint.status = 'done'
+            else:
+                snapshots = await _advise_batch(db, user_ids, concurrency)
+                if snapshots:
+                    now = datetime.utcnow()
+                    stmt = pg_insert(AdviceSnapshot.__table__)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['user_id'],
+                        set_={column: stmt.excluded[column]
+                              for column in ['advice', 'summary', 'anomalies', 'run_id', 'generated_at']}
+                    )
+                    await db.execute(stmt, [{**snapshot, 'run_id': run_id, 'generated_at': now}
+                                            for snapshot in snapshots])
+                checkpoint.last_user_id = user_ids[-1]
+                checkpoint.users_done += len(user_ids)
+                processed += len(user_ids)
+
+            checkpoint.elapsed_seconds += time.perf_counter() - started
+            started = time.perf_counter()
+            await db.commit()
+
+        stats = {
+            'run_id': run_id,
+            'shard': shard,
+            'users_done': checkpoint.users_done,
+            'processed_this_session': processed,
+            'elapsed_seconds': round(checkpoint.elapsed_seconds, 2),
+            'users_per_second': round(checkpoint.users_done / checkpoint.elapsed_seconds, 2)
+            if checkpoint.elapsed_seconds else 0.0,
+            'transaction_snapshots': transaction_snapshots.stats()
+        }
+    logger.info(f"Advice shard {shard}/{num_shards} of run {run_id} done: {stats}")
+    return stats
+
+async def run_advice_batch(
+    run_id: str,
+    num_shards: int,
+    shards: Optional[Iterable[int]] = None,
+    batch_size: int = 200,
+    concurrency: int = 8
+) -> List[Dict]:
+    """
+    Run the given shards of a batch advice run one after another.
+    
+    Separate processes can split a run by passing disjoint ``shards``;
+    finished shards are skipped, so rerunning a run only does what is left.
+    """
+    results = []
+    for shard in (shards if shards is not None else range(num_shards)):
+        results.append(await run_shard(run_id, shard, num_shards, batch_size, concurrency))
+    return results
+
+async def load_advice_snapshot(db: AsyncSession, user_id: int) -> Optional[Dict]:
+    """Return a user's precomputed advice, or None if no run has produced it yet."""
+    snapshot = await db.get(AdviceSnapshot, user_id)
+    if snapshot is None:
+        return None
+    return {
+        'user_id': snapshot.user_id,
+        'advice': snapshot.advice,
+        'summary': snapshot.summary,
+        'anomalies': snapshot.anomalies,
+        'run_id': snapshot.run_id,
+        'generated_at': snapshot.generated_at
+    }
@@ -0,0 +1,204 @@
+import logging
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+# Scales a median absolute deviation to a normal standard deviation
+MAD_TO_SIGMA = 1.4826
+
+# Years of same-calendar-month history used for the seasonal baseline
+SEASONAL_YEARS = 3
+
+SHIFT_COLUMNS = [
+    'user_id', 'month', 'category', 'total', 'history', 'baseline', 'mad', 'z_score',
+    'seasonal_baseline', 'change', 'direction', 'is_anomaly'
+]
+
+def _nanmedian(values: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Median ignoring NaN; NaN where every value is NaN.
+    
+    np.nanmedian falls back to masked arrays for short axes, which is very
+    slow for millions of 6-month windows. Sorting pushes NaN to the end, so
+    the median is read at the middle of each slice's valid prefix.
+    """
+    ordered = np.sort(np.moveaxis(values, axis, -1), axis=-1)
+    valid = np.sum(~np.isnan(ordered), axis=-1)
+    low = np.take_along_axis(ordered, np.maximum((valid - 1) // 2, 0)[..., None], axis=-1)[..., 0]
+    high = np.take_along_axis(ordered, np.maximum(valid // 2, 0)[..., None], axis=-1)[..., 0]
+    # With an even count, valid // 2 may point at a NaN only when valid is 0
+    return np.where(valid > 0, (low + high) / 2, np.nan)
+
+def _spend_matrix(rollup: pd.DataFrame):
+    """
+    Lay monthly totals out as a dense (user, category) x month matrix.
+    
+    Cells between a user's first and last active month with no spend in a
+    category are 0; cells outside that range are NaN.
+    """
+    months = pd.PeriodIndex(pd.to_datetime(rollup['month']), freq='M')
+    month_pos = months.asi8 - months.asi8.min()
+    n_months = int(month_pos.max()) + 1
+
+    # Factorizing the two keys separately and combining the integer codes is
+    # much cheaper than factorizing (user, category) tuples
+    user_codes, users = pd.factorize(rollup['user_id'])
+    category_codes, categories = pd.factorize(rollup['category'])
+    group_codes, pairs = pd.factorize(user_codes * len(categories) + category_codes)
+    group_user = pairs // len(categories)
+    groups = (users[group_user], categories[pairs % len(categories)])
+
+    values = np.zeros((len(pairs), n_months))
+    np.add.at(values, (group_codes, month_pos), rollup['total'].to_numpy(dtype=float))
+
+    # Active range of each user, broadcast to their category rows
+    first = np.full(len(users), n_months)
+    last = np.full(len(users), -1)
+    np.minimum.at(first, user_codes, month_pos)
+    np.maximum.at(last, user_codes, month_pos)
+
+    columns = np.arange(n_months)
+    active = (columns >= first[group_user][:, None]) & (columns <= last[group_user][:, None])
+    values[~active] = np.nan
+
+    month_starts = pd.period_range(months.min(), periods=n_months, freq='M').to_timestamp()
+    return values, active, groups, month_starts
+
+def detect_monthly_shifts(
+    rollup: pd.DataFrame,
+    window: int = 6,
+    z_threshold: float = 3.5,
+    min_relative_change: float = 0.25,
+    min_history: int = 3
+) -> pd.DataFrame:
+    """
+    Score every (user, category, month) total against its own history.
+    
+    All series are scored in one vectorized pass over a dense
+    (user, category) x month matrix. The baseline is the median of the
+    previous ``window`` months and the spread is their median absolute
+    deviation (MAD), giving a robust z-score that single outlier months do
+    not distort. A month is anomalous when it differs from the baseline by
+    at least ``min_relative_change`` and, once ``min_history`` months are
+    available, its |z| is at least ``z_threshold``. With less history the
+    relative change alone decides, which for one prior month is the
+    classic month-over-month comparison. Shifts that match the same
+    calendar month in earlier years (the seasonal baseline) are not
+    flagged, so e.g. December shopping is compared with past Decembers.
+    
+    Statements store spending as negative amounts, so each series is
+    scored by magnitude: series whose totals sum below zero are flipped
+    before scoring. Going from -100 to -300 is then a +200% increase, as
+    from +100 to +300; z_score and change are in that oriented direction,
+    while total and the baselines keep the sign of the input.
+    
+    Args:
+        rollup: Monthly rollups with columns [month, category, total] and
+            optionally user_id; not modified
+        window: Prior months in the rolling baseline
+        z_threshold: Minimum robust |z| to flag a month
+        min_relative_change: Minimum |total / baseline - 1| to flag a month
+        min_history: Prior months needed before the z-score is applied
+        
+    Returns:
+        DataFrame with one row per active (user, category, month) and columns
+        SHIFT_COLUMNS; change is in percent
+    """
+    if rollup.empty:
+        return pd.DataFrame(columns=SHIFT_COLUMNS)
+    if 'user_id' not in rollup.columns:
+        rollup = rollup.assign(user_id=0)
+
+    values, active, groups, month_starts = _spend_matrix(rollup)
+    n_groups, n_months = values.shape
+    # Debit series (negative totals) are flipped so growing spend scores as an increase
+    orientation = np.where(np.nansum(values, axis=1) < 0, -1.0, 1.0)[:, None]
+    values = values * orientation
+
+    # windows[g, t] holds the `window` months before t
+    padded = np.concatenate([np.full((n_groups, window), np.nan), values], axis=1)
+    windows = sliding_window_view(padded, window, axis=1)[:, :n_months]
+    history = np.sum(~np.isnan(windows), axis=2)
+    baseline = _nanmedian(windows, axis=2)
+    mad = _nanmedian(np.abs(windows - baseline[:, :, None]), axis=2)
+
+    scale = MAD_TO_SIGMA * mad
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_score = np.where(scale > 0, (values - baseline) / scale, np.nan)
+        relative = np.where(baseline > 0, values / baseline - 1, np.nan)
+
+    # Median of the same calendar month in previous years
+    lagged = np.full((SEASONAL_YEARS, n_groups, n_months), np.nan)
+    for year in range(1, SEASONAL_YEARS + 1):
+        if 12 * year < n_months:
+            lagged[year - 1, :, 12 * year:] = values[:, :-12 * year]
+    seasonal = _nanmedian(lagged, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        seasonal_relative = np.where(seasonal > 0, values / seasonal - 1, np.nan)
+
+    # NaN comparisons are False, so months without a positive baseline never flag
+    large_change = np.abs(relative) >= min_relative_change
+    # A flat history (MAD of 0) makes any large change unusual
+    unusual = (history < min_history) | np.isnan(z_score) | (np.abs(z_score) >= z_threshold)
+    unseasonal = np.isnan(seasonal_relative) | (np.abs(seasonal_relative) >= min_relative_change)
+    is_anomaly = active & large_change & unusual & unseasonal
+
+    group_idx, month_idx = np.nonzero(active)
+    shifts = pd.DataFrame({
+        'user_id': groups[0][group_idx],
+        'month': month_starts[month_idx],
+        'category': groups[1][group_idx],
+        'total': (values * orientation)[group_idx, month_idx],
+        'history': history[group_idx, month_idx],
+        'baseline': (baseline * orientation)[group_idx, month_idx],
+        'mad': mad[group_idx, month_idx],
+        'z_score': z_score[group_idx, month_idx],
+        'seasonal_baseline': (seasonal * orientation)[group_idx, month_idx],
+        'change': relative[group_idx, month_idx] * 100,
+        'is_anomaly': is_anomaly[group_idx, month_idx]
+    })
+    shifts.insert(
+        len(SHIFT_COLUMNS) - 2, 'direction',
+        np.select([shifts['change'] > 0, shifts['change'] < 0], ['increase', 'decrease'], default=None)
+    )
+    return shifts
+
+def detect_transaction_outliers(
+    df: pd.DataFrame,
+    z_threshold: float = 3.5,
+    min_count: int = 5
+) -> pd.DataFrame:
+    """
+    Flag individual transactions far from their (user, category) norm.
+    
+    Uses the median and MAD of each group's amounts, computed with grouped
+    transforms over the whole frame at once.
+    
+    Args:
+        df: Transactions with columns [amount, category] and optionally
+            user_id; not modified
+        z_threshold: Minimum robust |z| to flag a transaction
+        min_count: Groups with fewer transactions are not scored
+        
+    Returns:
+        The flagged rows of df with added median, z_score columns
+    """
+    if df.empty:
+        return df.assign(median=pd.Series(dtype=float), z_score=pd.Series(dtype=float))
+
+    keys = [
+        df['user_id'] if 'user_id' in df.columns else pd.Series(0, index=df.index),
+        df['category'].fillna('Uncategorized')
+    ]
+    amount = df['amount'].astype(float)
+    grouped = amount.groupby(keys)
+    median = grouped.transform('median')
+    count = grouped.transform('count')
+    mad = (amount - median).abs().groupby(keys).transform('median')
+
+    scale = MAD_TO_SIGMA * mad
+    z_score = (amount - median) / scale.where(scale > 0)
+    flagged = (count >= min_count) & (z_score.abs() >= z_threshold)
+    return df.loc[flagged].assign(median=median[flagged], z_score=z_score[flagged])
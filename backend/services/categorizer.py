@@ -1,11 +1,11 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional
-import joblib
-import os
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
+from typing import Dict, List, Pattern, Tuple
+import re
+import hashlib
+import json
 import logging
+from .model_registry import model_registry
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -54,13 +54,39 @@ CATEGORY_KEYWORDS = {
     ]
 }
 
+# Changes whenever the keyword rules change; used to key caches of classified output
+RULES_VERSION = hashlib.sha256(json.dumps(CATEGORY_KEYWORDS).encode()).hexdigest()[:12]
+
+# Fallback cluster mapping for artifacts trained without labelled rows
+DEFAULT_CLUSTER_TO_CATEGORY = dict(enumerate(CATEGORY_KEYWORDS))
+
+def _compile_keyword_patterns(category_keywords: Dict[str, List[str]]) -> List[Tuple[str, Pattern]]:
+    """
+    Compile one alternation regex per category, preserving category order.
+
+    Keywords are escaped so the patterns keep the plain substring semantics of
+    the original ``keyword in description`` check.
+    """
+    return [
+        (category, re.compile('|'.join(re.escape(keyword) for keyword in keywords)))
+        for category, keywords in category_keywords.items()
+    ]
+
+# Compiled once at import; order matters because the first matching category wins
+CATEGORY_PATTERNS = _compile_keyword_patterns(CATEGORY_KEYWORDS)
+
 def classify_transactions(df: pd.DataFrame) -> pd.DataFrame:
     """
     Classify transactions using rule-based keywords and ML fallback.
     
+    Both passes only see each distinct description once: descriptions are
+    factorized, the unique values classified and the categories broadcast
+    back to the rows by code. Rows without a description are
+    "Uncategorized".
+    
     Args:
         df: DataFrame with columns [date, description, amount]
-        
+    
     Returns:
         DataFrame with added 'category' column
     """
@@ -70,43 +96,60 @@ def classify_transactions(df: pd.DataFrame) -> pd.DataFrame:
     # Create a copy to avoid modifying the original
     df = df.copy()
     
-    # Initialize category column
-    df['category'] = None
+    codes, uniques = pd.factorize(df['description'])
+    descriptions = pd.Series(uniques, dtype=object)
     
     # First pass: Rule-based classification
-    df['category'] = df['description'].apply(
-        lambda x: _rule_based_classify(x.lower()) if pd.notnull(x) else None
-    )
+    categories = _rule_based_classify_series(descriptions).to_numpy(dtype=object)
     
-    # Second pass: ML classification for unclassified transactions
-    unclassified_mask = df['category'].isna()
+    # Second pass: ML classification for unclassified descriptions
+    unclassified_mask = pd.isna(categories)
     if unclassified_mask.any():
         try:
-            ml_categories = _ml_classify(df.loc[unclassified_mask, 'description'])
-            df.loc[unclassified_mask, 'category'] = ml_categories
+            categories[unclassified_mask] = _ml_classify(descriptions[unclassified_mask])
         except Exception as e:
             logger.warning(f"ML classification failed: {str(e)}")
             # If ML fails, mark remaining as "Uncategorized"
-            df.loc[unclassified_mask, 'category'] = "Uncategorized"
+            categories[unclassified_mask] = "Uncategorized"
+    
+    # Code -1 marks a missing description
+    df['category'] = np.append(categories, "Uncategorized")[codes]
     
     return df
 
-def _rule_based_classify(description: str) -> Optional[str]:
-    """Classify transaction using keyword rules."""
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        if any(keyword in description.lower() for keyword in keywords):
-            return category
-    return None
+def _rule_based_classify_series(descriptions: pd.Series) -> pd.Series:
+    """
+    Classify a Series of descriptions using the compiled keyword patterns.
+
+    Each category pattern is evaluated with a vectorized ``str.contains`` over
+    the rows that are still unmatched, so earlier categories keep priority.
+
+    Args:
+        descriptions: Series of raw transaction descriptions
+
+    Returns:
+        Series of categories aligned with ``descriptions`` (None when no rule matches)
+    """
+    lowered = descriptions.astype(object).str.lower()
+    categories = np.full(len(lowered), None, dtype=object)
+    remaining = lowered.notna().to_numpy()
+
+    for category, pattern in CATEGORY_PATTERNS:
+        if not remaining.any():
+            break
+        positions = np.flatnonzero(remaining)
+        hits = lowered.iloc[positions].str.contains(pattern, na=False).to_numpy(dtype=bool)
+        matched = positions[hits]
+        categories[matched] = category
+        remaining[matched] = False
+
+    return pd.Series(categories, index=descriptions.index, dtype=object)
 
 def _ml_classify(descriptions: pd.Series) -> List[str]:
-    """Classify transactions using pre-trained KMeans model."""
-    model_path = os.path.join('models', 'transaction_classifier.joblib')
-    vectorizer_path = os.path.join('models', 'transaction_vectorizer.joblib')
-    
+    """Classify transactions using the offline-trained clustering model."""
     try:
-        # Load pre-trained model and vectorizer
-        model = joblib.load(model_path)
-        vectorizer = joblib.load(vectorizer_path)
+        # Get the cached pre-trained model and vectorizer
+        model, vectorizer, manifest = model_registry.get()
         
         # Transform descriptions
         X = vectorizer.transform(descriptions)
@@ -114,54 +157,19 @@ def _ml_classify(descriptions: pd.Series) -> List[str]:
         # Get predictions
         predictions = model.predict(X)
         
-        # Map cluster numbers to categories
-        cluster_to_category = {
-            0: 'Food & Dining',
-            1: 'Transportation',
-            2: 'Shopping',
-            3: 'Entertainment',
-            4: 'Bills & Utilities',
-            5: 'Health & Fitness',
-            6: 'Travel',
-            7: 'Education',
-            8: 'Personal Care',
-            9: 'Income'
-        }
+        # Map cluster numbers to categories learned at training time
+        cluster_to_category = DEFAULT_CLUSTER_TO_CATEGORY.copy()
+        cluster_to_category.update({
+            int(cluster): category
+            for cluster, category in manifest.get('cluster_to_category', {}).items()
+        })
         
         return [cluster_to_category[pred] for pred in predictions]
         
     except FileNotFoundError:
-        logger.warning("ML model files not found. Training new model...")
-        return _train_and_classify(descriptions)
+        # Training never happens on the request path
+        logger.warning("ML model files not found. Run `python -m scripts.train_classifier` to build them.")
+        raise
     except Exception as e:
         logger.error(f"Error in ML classification: {str(e)}")
-        raise
-
-def _train_and_classify(descriptions: pd.Series) -> List[str]:
-    """Train new model and classify transactions."""
-    # Initialize vectorizer
-    vectorizer = TfidfVectorizer(
-        max_features=1000,
-        stop_words='english',
-        ngram_range=(1, 2)
-    )
-    
-    # Transform descriptions
-    X = vectorizer.fit_transform(descriptions)
-    
-    # Train KMeans model
-    n_clusters = len(CATEGORY_KEYWORDS)
-    model = KMeans(n_clusters=n_clusters, random_state=42)
-    predictions = model.fit_predict(X)
-    
-    # Save model and vectorizer
-    os.makedirs('models', exist_ok=True)
-    joblib.dump(model, os.path.join('models', 'transaction_classifier.joblib'))
-    joblib.dump(vectorizer, os.path.join('models', 'transaction_vectorizer.joblib'))
-    
-    # Map clusters to categories (this is a simple mapping, could be improved)
-    cluster_to_category = {
-        i: category for i, category in enumerate(CATEGORY_KEYWORDS.keys())
-    }
-    
-    return [cluster_to_category[pred] for pred in predictions]
\ No newline at end of file
+        raise
\ No newline at end of file
@@ -0,0 +1,217 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+import logging
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models import ChatHistory
+
+logger = logging.getLogger(__name__)
+
+# Longest question or answer carried into the prompt, in characters
+MAX_TURN_CHARS = 500
+
+class ChatMemoryStore:
+    """
+    Per-user conversation memory backed by the ``chat_history`` table.
+
+    Only the last ``window`` exchanges of each user are kept and rendered
+    into the prompt, so prompt size is bounded regardless of how long a user
+    has been chatting. Windows are cached in an LRU of at most ``max_users``
+    users; users idle for ``idle_seconds`` are evicted and reloaded from the
+    database on their next question. New exchanges are queued and written in
+    batches by a background task instead of one INSERT per answer; a batch
+    whose write fails goes back on the queue and is retried.
+    """
+
+    def __init__(
+        self,
+        window: int = 6,
+        max_users: int = 1000,
+        idle_seconds: float = 1800.0,
+        flush_interval: float = 1.0,
+        flush_batch: int = 200,
+        max_pending: int = 10_000
+    ):
+        """
+        Args:
+            window: Exchanges per user kept in memory and sent to the model
+            max_users: Users whose windows are cached in process
+            idle_seconds: Cached windows unused for this long are evicted
+            flush_interval: Seconds to collect exchanges before writing them
+            flush_batch: Queued exchanges that trigger an immediate write
+            max_pending: Queued exchanges kept while writes keep failing;
+                the oldest are dropped beyond this
+        """
+        self.window = window
+        self.max_users = max_users
+        self.idle_seconds = idle_seconds
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_pending = max_pending
+
+        self._windows: OrderedDict[int, Tuple[float, Deque[Tuple[str, str]]]] = OrderedDict()
+        self._pending: List[Dict] = []
+        # Batches taken off the queue whose INSERT has not committed yet
+        self._in_flight: List[List[Dict]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.written = 0
+        self.write_failures = 0
+        self.dropped = 0
+
+    async def load(self, user_id: int, db: Optional[AsyncSession] = None) -> List[Tuple[str, str]]:
+        """
+        Return the user's most recent (question, answer) exchanges, oldest first.
+
+        Args:
+            user_id: Owner of the conversation
+            db: Session to read from on a cache miss; a new one is opened if None
+        """
+        entry = self._windows.get(user_id)
+        if entry is not None:
+            self.hits += 1
+            turns = entry[1]
+        else:
+            self.misses += 1
+            stored = await self._read_window(user_id, db)
+            turns = deque(((question, answer) for question, answer, _ in stored), maxlen=self.window)
+            # The database lags by whatever is queued or being written for this
+            # user; a batch that committed while we read is already in ``stored``
+            seen = set(stored)
+            queued = [row for batch in self._in_flight for row in batch] + self._pending
+            turns.extend(
+                (row['question'], row['answer']) for row in queued
+                if row['user_id'] == user_id and (row['question'], row['answer'], row['created_at']) not in seen
+            )
+
+        self._touch(user_id, turns)
+        return list(turns)
+
+    async def _read_window(self, user_id: int, db: Optional[AsyncSession]) -> List[Tuple[str, str, datetime]]:
+        stmt = (
+            select(ChatHistory.question, ChatHistory.answer, ChatHistory.created_at)
+            .where(ChatHistory.user_id == user_id)
+            .order_by(ChatHistory.id.desc())
+            .limit(self.window)
+        )
+        if db is not None:
+            rows = (await db.execute(stmt)).all()
+        else:
+            async with AsyncSessionLocal() as session:
+                rows = (await session.execute(stmt)).all()
+        return [(row.question, row.answer, row.created_at) for row in reversed(rows)]
+
+    async def append(self, user_id: int, question: str, answer: str) -> None:
+        """Record an exchange in the cached window and queue it for writing."""
+        entry = self._windows.get(user_id)
+        if entry is not None:
+            entry[1].append((question, answer))
+            self._touch(user_id, entry[1])
+
+        self._pending.append({
+            'user_id': user_id,
+            'question': question,
+            'answer': answer,
+            'created_at': datetime.utcnow()
+        })
+        if len(self._pending) >= self.flush_batch:
+            await self.flush()
+        else:
+            self._schedule_flush()
+
+    def render(self, turns: List[Tuple[str, str]]) -> str:
+        """Format exchanges for the prompt's chat_history slot."""
+        return "\n".join(
+            f"Human: {question[:MAX_TURN_CHARS]}\nAssistant: {answer[:MAX_TURN_CHARS]}"
+            for question, answer in turns
+        )
+
+    def _touch(self, user_id: int, turns: Deque[Tuple[str, str]]) -> None:
+        """Mark a user's window as most recently used and evict stale ones."""
+        now = time.monotonic()
+        self._windows[user_id] = (now, turns)
+        self._windows.move_to_end(user_id)
+
+        while len(self._windows) > self.max_users:
+            self._windows.popitem(last=False)
+            self.evictions += 1
+        # Entries are in recency order, so idle ones are all at the front
+        while self._windows:
+            oldest_id, (last_used, _) = next(iter(self._windows.items()))
+            if now - last_used < self.idle_seconds:
+                break
+            del self._windows[oldest_id]
+            self.evictions += 1
+
+    def _schedule_flush(self) -> None:
+        # A retry scheduled from inside the running flush task needs a new task
+        task = self._flush_task
+        if task is None or task.done() or task is asyncio.current_task():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write all queued exchanges in one INSERT; requeue them if it fails."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._in_flight.append(batch)
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(ChatHistory), batch)
+                await session.commit()
+            self.written += len(batch)
+        except Exception as e:
+            self.write_failures += len(batch)
+            logger.error(f"Failed to write {len(batch)} chat history rows, will retry: {str(e)}")
+            # The batch is older than anything queued since it was taken
+            self._pending = batch + self._pending
+            if len(self._pending) > self.max_pending:
+                excess = len(self._pending) - self.max_pending
+                del self._pending[:excess]
+                self.dropped += excess
+                logger.error(f"Dropped {excess} chat history rows after repeated write failures")
+            self._schedule_flush()
+        finally:
+            self._in_flight.remove(batch)
+
+    async def close(self) -> None:
+        """Flush pending exchanges; called on application shutdown."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        # No retries once the application is shutting down
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+
+    def stats(self) -> Dict:
+        """Return cache and write-behind counters for monitoring."""
+        return {
+            'users_cached': len(self._windows),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'pending_writes': len(self._pending),
+            'written': self.written,
+            'write_failures': self.write_failures,
+            'dropped': self.dropped
+        }
+
+# Create a singleton instance
+chat_memory = ChatMemoryStore(
+    window=settings.CHAT_MEMORY_WINDOW,
+    max_users=settings.CHAT_MEMORY_MAX_USERS,
+    idle_seconds=settings.CHAT_MEMORY_IDLE_SECONDS,
+    flush_interval=settings.CHAT_MEMORY_FLUSH_SECONDS
+)
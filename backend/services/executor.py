@@ -0,0 +1,175 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class ExecutorSaturated(Exception):
+    """Raised when the executor queue is full and a job cannot be admitted."""
+
+class StageMetrics:
+    """Queue-wait and run-time counters for one pipeline stage."""
+
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+    def record(self, queue_wait: float, run_time: float) -> None:
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.run_total += run_time
+        self.run_max = max(self.run_max, run_time)
+
+    def to_dict(self) -> Dict:
+        finished = self.completed + self.failed
+        return {
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'queue_wait_avg': round(self.queue_wait_total / finished, 4) if finished else 0.0,
+            'queue_wait_max': round(self.queue_wait_max, 4),
+            'run_time_avg': round(self.run_total / finished, 4) if finished else 0.0,
+            'run_time_max': round(self.run_max, 4)
+        }
+
+def _timed_call(fn: Callable, args: Tuple, kwargs: Dict) -> Tuple[float, float, Any, Optional[Exception]]:
+    """
+    Run fn in the worker, returning wall-clock start/end alongside the result.
+
+    An exception raised by fn is returned rather than raised, so a failed
+    job still reports when it started running.
+    """
+    started = time.time()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        return started, time.time(), None, e
+    return started, time.time(), result, None
+
+class CPUExecutor:
+    """
+    Bounded executor for CPU-bound request stages.
+
+    Jobs run on a thread or process pool so they never block the event loop.
+    At most ``max_workers + max_queue`` jobs are admitted at once; further
+    callers wait up to ``acquire_timeout`` seconds for a slot and are then
+    rejected with ExecutorSaturated.
+    """
+
+    def __init__(
+        self,
+        kind: str = 'thread',
+        max_workers: int = 4,
+        max_queue: int = 32,
+        acquire_timeout: float = 0.0
+    ):
+        """
+        Args:
+            kind: 'thread' or 'process'
+            max_workers: Number of pool workers
+            max_queue: Jobs allowed to wait for a worker beyond those running
+            acquire_timeout: Seconds to wait for a free slot before rejecting
+        """
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unsupported executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.acquire_timeout = acquire_timeout
+
+        self._pool: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._stages: Dict[str, StageMetrics] = {}
+
+    def _get_pool(self) -> Executor:
+        # Created lazily so importing the module never forks workers
+        if self._pool is None:
+            if self.kind == 'process':
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='cpu-stage')
+        return self._pool
+
+    async def _acquire_slot(self, metrics: StageMetrics) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.capacity)
+
+        if self._slots.locked() and self.acquire_timeout <= 0:
+            metrics.rejected += 1
+            raise ExecutorSaturated("Server is busy processing other statements. Please retry shortly.")
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout or None)
+        except asyncio.TimeoutError:
+            metrics.rejected += 1
+            raise ExecutorSaturated("Server is busy processing other statements. Please retry shortly.")
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) on the pool and await its result.
+
+        Args:
+            stage: Name used to group metrics (e.g. 'parse', 'classify')
+            fn: Callable to run; must be picklable for the process pool
+
+        Raises:
+            ExecutorSaturated: If no slot became free within acquire_timeout
+        """
+        metrics = self._stages.setdefault(stage, StageMetrics())
+        submitted = time.time()
+        await self._acquire_slot(metrics)
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            started, finished, result, error = await loop.run_in_executor(
+                self._get_pool(), _timed_call, fn, args, kwargs
+            )
+        except Exception:
+            # The job never ran (e.g. a broken process pool); it only waited
+            metrics.failed += 1
+            metrics.record(time.time() - submitted, 0.0)
+            raise
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+        metrics.record(max(started - submitted, 0.0), finished - started)
+        if error is not None:
+            metrics.failed += 1
+            raise error
+        metrics.completed += 1
+        return result
+
+    def shutdown(self) -> None:
+        """Stop the pool, waiting for running jobs to finish."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def stats(self) -> Dict:
+        """Return per-stage metrics and current queue depth."""
+        return {
+            'kind': self.kind,
+            'max_workers': self.max_workers,
+            'capacity': self.capacity,
+            'in_flight': self._in_flight,
+            'queued': max(self._in_flight - self.max_workers, 0),
+            'stages': {stage: metrics.to_dict() for stage, metrics in self._stages.items()}
+        }
+
+# Create a singleton instance
+cpu_executor = CPUExecutor(
+    kind=settings.EXECUTOR_KIND,
+    max_workers=settings.EXECUTOR_MAX_WORKERS,
+    max_queue=settings.EXECUTOR_MAX_QUEUE,
+    acquire_timeout=settings.EXECUTOR_ACQUIRE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,68 @@
+from collections import Counter
+from typing import BinaryIO, Dict
+import logging
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from .merchant_memo import merchant_memo
+from .ocr_parser import iter_csv_chunks
+from .transaction_store import bulk_insert_transactions
+
+logger = logging.getLogger(__name__)
+
+async def ingest_csv_stream(
+    file_obj: BinaryIO,
+    user_id: int,
+    db: AsyncSession,
+    chunk_rows: int = 50_000
+) -> Dict:
+    """
+    Parse, classify and persist a CSV statement one chunk at a time.
+    
+    Reading runs in the threadpool and classification on the CPU executor, so
+    peak memory is bounded by ``chunk_rows`` regardless of file size. Each
+    chunk is committed as soon as it is inserted.
+    
+    Args:
+        file_obj: Seekable binary file object (e.g. ``UploadFile.file``)
+        user_id: Owner of the transactions
+        db: Async database session
+        chunk_rows: Number of CSV rows per chunk
+        
+    Returns:
+        Dict with row, chunk and per-category counts, and merchant memo
+        counters summed over the chunks
+    """
+    chunks = iter_csv_chunks(file_obj, chunk_rows)
+    rows = 0
+    n_chunks = 0
+    categories = Counter()
+    categorization = Counter()
+    
+    while True:
+        chunk = await run_in_threadpool(next, chunks, None)
+        if chunk is None:
+            break
+        
+        categorized = await merchant_memo.classify(chunk)
+        rows += await bulk_insert_transactions(db, user_id, categorized)
+        await db.commit()
+        
+        n_chunks += 1
+        categories.update(categorized['category'].fillna('Uncategorized').value_counts().to_dict())
+        categorization.update({
+            name: count for name, count in categorized.attrs.get('categorization', {}).items() if name != 'hit_rate'
+        })
+    
+    logger.info(f"Streamed {rows} transactions in {n_chunks} chunks for user {user_id}")
+    
+    return {
+        'rows': rows,
+        'chunks': n_chunks,
+        'categories': dict(categories),
+        'categorization': {
+            **categorization,
+            'hit_rate': round(
+                (categorization['memory_hits'] + categorization['stored_hits']) / categorization['merchants'], 4
+            ) if categorization['merchants'] else 0.0
+        }
+    }
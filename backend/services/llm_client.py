@@ -0,0 +1,279 @@
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+import logging
+import openai
+from openai import AsyncOpenAI
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Failures worth another attempt; anything else (bad request, auth) is raised at once
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError
+)
+
+class LLMUnavailable(Exception):
+    """Raised when a completion could not be obtained within its deadline."""
+
+class CircuitBreaker:
+    """
+    Stops calling the API after repeated failures.
+    
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    calls are rejected for ``reset_timeout`` seconds. The first call after
+    that is let through as a probe; success closes the breaker, and any
+    failure of the probe, retryable or not, opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == 'half_open':
+            # Let one probe through; it re-opens the breaker if it fails
+            self.opened_at = time.monotonic()
+            self.probing = True
+            return True
+        return state == 'closed'
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.probing = False
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+
+class LLMClient:
+    """
+    Shared async gateway to the OpenAI API.
+    
+    Every call waits for one of ``max_concurrency`` slots, must finish
+    within ``timeout`` seconds including retries, and is retried with
+    jittered exponential backoff on transient errors. Streams hold their
+    slot until they are closed and must finish within ``stream_timeout``.
+    A circuit breaker fails calls fast while the API is down. Callers catch
+    LLMUnavailable and fall back to a non-LLM answer.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 8,
+        timeout: float = 20.0,
+        stream_timeout: float = 120.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4.0,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        Args:
+            api_key: OpenAI API key
+            base_url: Alternative API endpoint (e.g. a local stub server)
+            max_concurrency: Calls in flight across the process
+            timeout: Deadline in seconds for a call, including queueing and retries
+            stream_timeout: Deadline in seconds for a whole stream, from queueing to its last chunk
+            max_retries: Retries after the first attempt
+            backoff_base: Initial backoff in seconds, doubled per retry
+            backoff_max: Upper bound on a single backoff
+            breaker: Circuit breaker shared by all calls
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self._client: Optional[AsyncOpenAI] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # Retries are handled here, so the SDK's own retry loop is disabled
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._client
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def call(
+        self,
+        fn: Callable[[float], Awaitable[T]],
+        timeout: Optional[float] = None,
+        hold_slot: bool = False
+    ) -> T:
+        """
+        Run an API call under the concurrency limit, deadline, retries and breaker.
+        
+        Args:
+            fn: Called with the seconds left before the deadline; returns the awaitable to run
+            timeout: Overrides the default deadline
+            hold_slot: Keep the concurrency slot after a successful call; the
+                caller must release it with ``_release``
+            
+        Raises:
+            LLMUnavailable: If the breaker is open or the deadline passed without a result
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise LLMUnavailable("LLM circuit breaker is open")
+
+        self.calls += 1
+        deadline = time.monotonic() + (timeout or self.timeout)
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            self.in_flight += 1
+            keep_slot = False
+            try:
+                remaining = deadline - time.monotonic()
+                result = await asyncio.wait_for(fn(remaining), timeout=remaining)
+                self.breaker.record_success()
+                keep_slot = hold_slot
+                return result
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                logger.warning(f"LLM call attempt {attempt + 1} failed: {type(e).__name__}: {str(e)}")
+            except Exception:
+                # A failed probe must re-open the breaker whatever the error,
+                # or it would stay half-open with the probe unaccounted for
+                if self.breaker.probing:
+                    self.breaker.record_failure()
+                raise
+            finally:
+                if not keep_slot:
+                    self._release()
+
+            if attempt < self.max_retries and self.breaker.state == 'closed':
+                # Full jitter keeps retrying callers from synchronizing
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if time.monotonic() + backoff >= deadline:
+                    break
+                self.retries += 1
+                await asyncio.sleep(backoff)
+            else:
+                break
+
+        self.failures += 1
+        raise LLMUnavailable("LLM call did not complete before its deadline")
+
+    async def complete(self, messages: List[Dict], model: Optional[str] = None, **kwargs):
+        """Create a chat completion through ``call``."""
+        return await self.call(lambda remaining: self.client.chat.completions.create(
+            model=model or settings.OPENAI_MODEL,
+            messages=messages,
+            timeout=remaining,
+            **kwargs
+        ))
+
+    async def stream(self, messages: List[Dict], model: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Stream a chat completion's content as it is generated.
+        
+        Opening the stream goes through ``call``, so it is limited, retried
+        and guarded like any other call, and the concurrency slot is held
+        until the stream ends or the iterator is closed. The whole stream
+        must finish within ``stream_timeout``; gaps between chunks longer
+        than the call timeout also count as failures. Once tokens have been
+        yielded a failure cannot be retried and is raised as LLMUnavailable.
+        """
+        deadline = time.monotonic() + self.stream_timeout
+        stream = await self.call(lambda remaining: self.client.chat.completions.create(
+            model=model or settings.OPENAI_MODEL,
+            messages=messages,
+            stream=True,
+            timeout=remaining,
+            **kwargs
+        ), timeout=min(self.timeout, self.stream_timeout), hold_slot=True)
+        try:
+            chunks = stream.__aiter__()
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError("stream deadline exceeded")
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=min(self.timeout, remaining))
+                except StopAsyncIteration:
+                    return
+                except RETRYABLE_ERRORS as e:
+                    self.breaker.record_failure()
+                    self.failures += 1
+                    raise LLMUnavailable(f"LLM stream interrupted: {type(e).__name__}") from e
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            self._release()
+            # Drop the HTTP response of an abandoned or failed stream
+            await stream.close()
+
+    def stats(self) -> Dict:
+        """Return call counters and breaker state for monitoring."""
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+            'max_concurrency': self.max_concurrency,
+            'breaker': self.breaker.state,
+            'breaker_trips': self.breaker.trips
+        }
+
+# Create a singleton instance
+llm_client = LLMClient(
+    api_key=settings.OPENAI_API_KEY.get_secret_value(),
+    base_url=settings.OPENAI_BASE_URL,
+    max_concurrency=settings.OPENAI_MAX_CONCURRENCY,
+    timeout=settings.OPENAI_TIMEOUT_SECONDS,
+    stream_timeout=settings.OPENAI_STREAM_TIMEOUT_SECONDS,
+    max_retries=settings.OPENAI_MAX_RETRIES,
+    breaker=CircuitBreaker(settings.OPENAI_BREAKER_THRESHOLD, settings.OPENAI_BREAKER_RESET_SECONDS)
+)
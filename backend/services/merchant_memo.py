@@ -0,0 +1,285 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models import MerchantCategory
+from .categorizer import RULES_VERSION, classify_transactions
+from .executor import cpu_executor
+from .model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+# Byte translation applied to lowercased UTF-8 descriptions: ASCII punctuation
+# becomes a space and digits become NUL, so tokens containing a digit (store
+# numbers, dates, terminal and reference ids) are recognizable after split()
+_KEEP = set(b'abcdefghijklmnopqrstuvwxyz&\'')
+NORMALIZE_TABLE = bytes(
+    0 if chr(b).isdigit() else b if b in _KEEP or b >= 128 else ord(' ')
+    for b in range(256)
+)
+# Card-network and payment-processor prefixes in front of the merchant name
+PREFIX_TOKENS = {
+    'pos', 'debit', 'credit', 'card', 'purchase', 'checkcard', 'recurring', 'ach',
+    'withdrawal', 'sq', 'tst', 'sp', 'pp', 'paypal'
+}
+PREFIX_PAIRS = {('check', 'card'), ('payment', 'to')}
+# A trailing US state code, the usual end of "CITY ST" location suffixes
+STATE_CODES = set(
+    'al ak az ar ca co ct de fl ga hi id il in ia ks ky la me md ma mi mn ms mo mt ne nv nh nj '
+    'nm ny nc nd oh ok or pa ri sc sd tn tx ut vt va wa wv wi wy dc'.split()
+)
+
+# Merchant keys per lookup or upsert statement, well under the bind parameter limit
+STORE_BATCH_SIZE = 5000
+
+# Categories that are never memoized: no match, or the ML pass failed
+UNMEMOIZED_CATEGORIES = {None, 'Uncategorized'}
+
+def _merchant_key(description: str) -> Optional[str]:
+    tokens = [
+        token for token in description.lower().encode().translate(NORMALIZE_TABLE).decode().split()
+        if '\x00' not in token
+    ]
+    start = 0
+    while start < len(tokens):
+        if tokens[start] in PREFIX_TOKENS:
+            start += 1
+        elif tuple(tokens[start:start + 2]) in PREFIX_PAIRS:
+            start += 2
+        else:
+            break
+    if len(tokens) - start > 1 and tokens[-1] in STATE_CODES:
+        tokens.pop()
+    return ' '.join(tokens[start:]) or None
+
+def normalize_merchants(descriptions: pd.Series) -> pd.Series:
+    """
+    Reduce raw bank descriptions to canonical merchant keys.
+
+    Lowercases and strips punctuation, tokens containing digits (store
+    numbers, dates, ids), card and processor prefixes and a trailing state
+    code, so "POS DEBIT 12/03 STARBUCKS STORE #1458 SEATTLE WA" becomes
+    "starbucks store seattle". Each distinct description is normalized
+    once, with a byte-level translate instead of regular expressions.
+
+    Args:
+        descriptions: Series of raw transaction descriptions
+
+    Returns:
+        Series of merchant keys aligned with ``descriptions`` (None when
+        nothing is left of a description)
+    """
+    codes, uniques = pd.factorize(descriptions)
+    # Code -1 marks a missing description
+    lookup = np.array([_merchant_key(str(value)) for value in uniques] + [None], dtype=object)
+    return pd.Series(lookup[codes], index=descriptions.index, dtype=object)
+
+class MerchantMemo:
+    """
+    Memo of merchant key -> category in front of the categorizer.
+
+    Descriptions are normalized to merchant keys; keys found in the
+    in-process LRU or in the ``merchant_categories`` table take their
+    category from there, and only one row per unseen key goes through the
+    keyword and ML passes. Entries are tagged with the rules and model
+    versions that produced them, so a new model or rule set starts a fresh
+    memo. The table is an optimization only: if it cannot be read or
+    written, classification carries on without it.
+    """
+
+    def __init__(self, max_entries: int = 100_000, persist: bool = True):
+        """
+        Args:
+            max_entries: Merchant keys kept in the in-process LRU
+            persist: Share the memo across processes through the database
+        """
+        self.max_entries = max_entries
+        self.persist = persist
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._version: Optional[str] = None
+
+        self.merchants = 0
+        self.memory_hits = 0
+        self.stored_hits = 0
+        self.classified = 0
+        self.store_errors = 0
+
+    @staticmethod
+    def current_version() -> str:
+        """Version of the rules and model a memo entry must match."""
+        return f"{RULES_VERSION}:{model_registry.current_version()}"
+
+    def _remember(self, mapping: Dict[str, str]) -> None:
+        for key, category in mapping.items():
+            self._entries[key] = category
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _recall(self, keys: Iterable[str]) -> Dict[str, str]:
+        found = {}
+        for key in keys:
+            category = self._entries.get(key)
+            if category is not None:
+                self._entries.move_to_end(key)
+                found[key] = category
+        return found
+
+    async def _load_stored(self, keys: List[str], version: str) -> Dict[str, str]:
+        found = {}
+        try:
+            async with AsyncSessionLocal() as db:
+                for start in range(0, len(keys), STORE_BATCH_SIZE):
+                    result = await db.execute(
+                        select(MerchantCategory.merchant_key, MerchantCategory.category)
+                        .where(MerchantCategory.merchant_key.in_(keys[start:start + STORE_BATCH_SIZE]))
+                        .where(MerchantCategory.classifier_version == version)
+                    )
+                    found.update(result.all())
+            return found
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning(f"Merchant memo lookup failed: {str(e)}")
+            return {}
+
+    async def _store(self, mapping: Dict[str, str], version: str) -> None:
+        # Sorted keys keep concurrent upserts from deadlocking on each other
+        rows = [
+            {'merchant_key': key, 'category': mapping[key], 'classifier_version': version, 'updated_at': datetime.utcnow()}
+            for key in sorted(mapping)
+        ]
+        try:
+            async with AsyncSessionLocal() as db:
+                for start in range(0, len(rows), STORE_BATCH_SIZE):
+                    stmt = pg_insert(MerchantCategory).values(rows[start:start + STORE_BATCH_SIZE])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['merchant_key'],
+                        set_={
+                            'category': stmt.excluded.category,
+                            'classifier_version': stmt.excluded.classifier_version,
+                            'updated_at': stmt.excluded.updated_at
+                        }
+                    )
+                    await db.execute(stmt)
+                await db.commit()
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning(f"Merchant memo write failed: {str(e)}")
+
+    async def classify(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Categorize transactions, skipping the categorizer for known merchants.
+
+        Normalization and the categorizer run on the CPU executor. Rows
+        without a merchant key are classified individually; every other row
+        takes the category of its key, which is classified from the first
+        row that has it when it is not memoized yet.
+
+        Args:
+            df: DataFrame with columns [date, description, amount]
+
+        Returns:
+            DataFrame with added 'category' column and per-call counters in
+            ``attrs['categorization']``: rows, merchants, memory_hits,
+            stored_hits, classified (rows sent to the categorizer) and
+            hit_rate (share of merchants answered by the memo)
+
+        Raises:
+            ExecutorSaturated: If normalization or classification could not be scheduled
+        """
+        if 'description' not in df.columns or df.empty:
+            return await cpu_executor.run("classify", classify_transactions, df)
+
+        version = self.current_version()
+        if version != self._version:
+            # A new rule set or model invalidates everything the LRU holds
+            self._entries.clear()
+            self._version = version
+
+        keys = await cpu_executor.run("classify", normalize_merchants, df['description'])
+        codes, merchants = pd.factorize(keys)
+        merchants = list(merchants)
+
+        known = self._recall(merchants)
+        memory_hits = len(known)
+        stored = {}
+        if self.persist and len(known) < len(merchants):
+            stored = await self._load_stored([key for key in merchants if key not in known], version)
+            self._remember(stored)
+            known.update(stored)
+
+        # One representative row per unknown merchant, plus every row without a key
+        unknown_codes = np.array([code for code, key in enumerate(merchants) if key not in known], dtype=np.int64)
+        unique_codes, first_rows = np.unique(codes, return_index=True)
+        unknown_rows = first_rows[np.isin(unique_codes, unknown_codes)]
+        keyless_rows = np.flatnonzero(codes == -1)
+        rows = np.sort(np.concatenate([unknown_rows, keyless_rows]))
+
+        categories = np.full(len(df), None, dtype=object)
+        learned = {}
+        if len(rows):
+            classified = await cpu_executor.run("classify", classify_transactions, df.iloc[rows])
+            classified_categories = classified['category'].to_numpy(dtype=object)
+            categories[rows] = classified_categories
+            for row, category in zip(rows, classified_categories):
+                if codes[row] != -1:
+                    known[merchants[codes[row]]] = category
+                    if category not in UNMEMOIZED_CATEGORIES:
+                        learned[merchants[codes[row]]] = category
+
+        keyed = codes != -1
+        lookup = np.array([known[key] for key in merchants] + [None], dtype=object)
+        categories[keyed] = lookup[codes[keyed]]
+
+        if learned:
+            self._remember(learned)
+            if self.persist:
+                await self._store(learned, version)
+
+        self.merchants += len(merchants)
+        self.memory_hits += memory_hits
+        self.stored_hits += len(stored)
+        self.classified += len(rows)
+        stats = {
+            'rows': len(df),
+            'merchants': len(merchants),
+            'memory_hits': memory_hits,
+            'stored_hits': len(stored),
+            'classified': int(len(rows)),
+            'hit_rate': round((memory_hits + len(stored)) / len(merchants), 4) if merchants else 0.0
+        }
+        logger.info(
+            f"Merchant memo answered {memory_hits + len(stored)} of {len(merchants)} merchants "
+            f"({stats['hit_rate']:.0%}); classified {len(rows)} of {len(df)} rows"
+        )
+
+        result = df.copy()
+        result['category'] = categories
+        result.attrs['categorization'] = stats
+        return result
+
+    def stats(self) -> Dict:
+        """Return cumulative memo counters for monitoring."""
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'persist': self.persist,
+            'merchants': self.merchants,
+            'memory_hits': self.memory_hits,
+            'stored_hits': self.stored_hits,
+            'classified': self.classified,
+            'hit_rate': round((self.memory_hits + self.stored_hits) / self.merchants, 4) if self.merchants else 0.0,
+            'store_errors': self.store_errors
+        }
+
+# Create a singleton instance
+merchant_memo = MerchantMemo(
+    max_entries=settings.MERCHANT_MEMO_MAX_ENTRIES,
+    persist=settings.MERCHANT_MEMO_PERSIST
+)
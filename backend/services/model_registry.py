@@ -0,0 +1,183 @@
+import joblib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Artifact layout written by services.model_training
+LATEST_POINTER = 'LATEST'
+VERSIONS_DIR = 'versions'
+CLASSIFIER_FILE = 'transaction_classifier.joblib'
+VECTORIZER_FILE = 'transaction_vectorizer.joblib'
+MANIFEST_FILE = 'manifest.json'
+
+class ModelArtifacts(NamedTuple):
+    model: Any
+    vectorizer: Any
+    manifest: Dict
+
+class ModelRegistry:
+    """
+    Process-wide cache for the ML fallback classifier artifacts.
+
+    The classifier and vectorizer are loaded once per worker and reused across
+    requests. Every lookup compares the artifacts' mtimes against the loaded
+    copy and reloads when either file changed on disk. Loading is serialized
+    behind a lock so concurrent requests never unpickle at the same time.
+
+    Versioned artifacts are resolved through the ``LATEST`` pointer file in
+    ``model_dir``; when no pointer exists the flat legacy files are used.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = 'models',
+        classifier_file: str = CLASSIFIER_FILE,
+        vectorizer_file: str = VECTORIZER_FILE,
+        mmap_mode: Optional[str] = None
+    ):
+        """
+        Args:
+            model_dir: Directory holding the model artifacts
+            classifier_file: File name of the fitted clustering model
+            vectorizer_file: File name of the fitted text vectorizer
+            mmap_mode: Passed to joblib.load to memory-map numpy arrays (e.g. 'r')
+        """
+        self.model_dir = model_dir
+        self.classifier_file = classifier_file
+        self.vectorizer_file = vectorizer_file
+        self.mmap_mode = mmap_mode
+
+        self._lock = threading.Lock()
+        self._artifacts: Optional[ModelArtifacts] = None
+        self._key: Optional[Tuple] = None
+        self._pointer: Optional[Tuple[float, str]] = None
+
+        self.hits = 0
+        self.loads = 0
+        self.last_load_seconds = 0.0
+        self.total_load_seconds = 0.0
+
+    @property
+    def version(self) -> Optional[str]:
+        """Version of the currently loaded artifacts, if any."""
+        if self._artifacts is None:
+            return None
+        return self._artifacts.manifest.get('version')
+
+    def current_version(self) -> str:
+        """
+        Version of the artifacts on disk, without loading them.
+
+        Used to key caches of classified output, so it must change whenever a
+        new model is published.
+        """
+        version = self._latest_version()
+        if version is not None:
+            return version
+        try:
+            return f"legacy-{int(os.stat(os.path.join(self.model_dir, self.classifier_file)).st_mtime)}"
+        except FileNotFoundError:
+            return 'none'
+
+    def _latest_version(self) -> Optional[str]:
+        """Version named by the LATEST pointer, or None for the legacy layout."""
+        pointer_path = os.path.join(self.model_dir, LATEST_POINTER)
+        try:
+            pointer_mtime = os.stat(pointer_path).st_mtime
+        except FileNotFoundError:
+            return None
+
+        # Runs outside the lock: read the cached (mtime, version) pair once
+        # and replace it whole, so a concurrent refresh is never half seen
+        pointer = self._pointer
+        if pointer is None or pointer[0] != pointer_mtime:
+            # Only re-read the pointer when it has been replaced
+            with open(pointer_path) as f:
+                pointer = (pointer_mtime, f.read().strip())
+            self._pointer = pointer
+        return pointer[1]
+
+    def _artifact_dir(self) -> str:
+        """Resolve the directory of the current artifacts via the LATEST pointer."""
+        version = self._latest_version()
+        if version is None:
+            return self.model_dir
+        return os.path.join(self.model_dir, VERSIONS_DIR, version)
+
+    def _current_key(self) -> Tuple[str, float, float]:
+        """Return the artifact directory and mtimes, raising FileNotFoundError if missing."""
+        artifact_dir = self._artifact_dir()
+        return (
+            artifact_dir,
+            os.stat(os.path.join(artifact_dir, self.classifier_file)).st_mtime,
+            os.stat(os.path.join(artifact_dir, self.vectorizer_file)).st_mtime
+        )
+
+    def get(self) -> ModelArtifacts:
+        """
+        Return the cached model artifacts, loading them if needed.
+
+        Raises:
+            FileNotFoundError: If the model artifacts do not exist
+        """
+        key = self._current_key()
+        if self._artifacts is not None and self._key == key:
+            self.hits += 1
+            return self._artifacts
+
+        with self._lock:
+            # Another request may have finished loading while we waited
+            key = self._current_key()
+            if self._artifacts is not None and self._key == key:
+                self.hits += 1
+                return self._artifacts
+
+            artifact_dir = key[0]
+            start = time.perf_counter()
+            model = joblib.load(os.path.join(artifact_dir, self.classifier_file), mmap_mode=self.mmap_mode)
+            vectorizer = joblib.load(os.path.join(artifact_dir, self.vectorizer_file), mmap_mode=self.mmap_mode)
+            manifest = _load_manifest(os.path.join(artifact_dir, MANIFEST_FILE))
+            elapsed = time.perf_counter() - start
+
+            self._artifacts = ModelArtifacts(model, vectorizer, manifest)
+            self._key = key
+            self.loads += 1
+            self.last_load_seconds = elapsed
+            self.total_load_seconds += elapsed
+            logger.info(f"Loaded classifier artifacts {manifest.get('version', 'unversioned')} in {elapsed:.3f}s")
+
+            return self._artifacts
+
+    def clear(self) -> None:
+        """Drop the cached artifacts so the next lookup reloads them."""
+        with self._lock:
+            self._artifacts = None
+            self._key = None
+            self._pointer = None
+
+    def stats(self) -> Dict:
+        """Return cache counters for monitoring."""
+        return {
+            'loaded': self._artifacts is not None,
+            'version': self.version,
+            'hits': self.hits,
+            'loads': self.loads,
+            'last_load_seconds': round(self.last_load_seconds, 4),
+            'total_load_seconds': round(self.total_load_seconds, 4)
+        }
+
+def _load_manifest(path: str) -> Dict:
+    """Load an artifact manifest, returning an empty one for legacy artifacts."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+# Create a singleton instance
+model_registry = ModelRegistry(mmap_mode=os.getenv('MODEL_MMAP_MODE') or None)
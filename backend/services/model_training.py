@@ -0,0 +1,161 @@
+import json
+import os
+import secrets
+import shutil
+import tempfile
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import joblib
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import Transaction
+from .categorizer import CATEGORY_KEYWORDS, DEFAULT_CLUSTER_TO_CATEGORY
+from .model_registry import (
+    CLASSIFIER_FILE,
+    LATEST_POINTER,
+    MANIFEST_FILE,
+    VECTORIZER_FILE,
+    VERSIONS_DIR
+)
+
+logger = logging.getLogger(__name__)
+
+def iter_transaction_batches(
+    session: Session,
+    batch_size: int = 5000
+) -> Iterator[List[Tuple[str, Optional[str]]]]:
+    """
+    Stream stored (description, category) pairs in primary-key order.
+
+    Uses keyset pagination on ``Transaction.id`` so each batch is an index
+    range scan regardless of how far into the table we are.
+
+    Args:
+        session: Synchronous database session
+        batch_size: Number of rows per batch
+
+    Yields:
+        Lists of (description, category) tuples
+    """
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(Transaction.id, Transaction.description, Transaction.category)
+            .where(Transaction.id > last_id, Transaction.description.isnot(None))
+            .order_by(Transaction.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [(row.description, row.category) for row in rows]
+
+def train_classifier(
+    session_factory: Callable[[], Session],
+    model_dir: str = 'models',
+    batch_size: int = 5000
+) -> str:
+    """
+    Fit the fallback classifier on stored transactions and publish it.
+
+    The vectorizer is a stateless HashingVectorizer so the clustering model
+    can be fit incrementally with MiniBatchKMeans.partial_fit, one batch at a
+    time. A second pass maps each cluster to the most common stored category
+    of its members. Artifacts are written to a new version directory and
+    published by atomically replacing the ``LATEST`` pointer.
+
+    Args:
+        session_factory: Callable returning a synchronous database session
+        model_dir: Directory the model registry reads from
+        batch_size: Number of transactions per training batch
+
+    Returns:
+        str: The published artifact version
+    """
+    n_clusters = len(CATEGORY_KEYWORDS)
+    vectorizer = HashingVectorizer(
+        stop_words='english',
+        ngram_range=(1, 2),
+        alternate_sign=False,
+        norm='l2'
+    )
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3, batch_size=1024)
+
+    n_rows = 0
+    pending: List[str] = []
+    with session_factory() as session:
+        # First pass: incremental fit. partial_fit needs at least n_clusters
+        # samples, so small batches are carried over into the next one.
+        for batch in iter_transaction_batches(session, batch_size):
+            pending.extend(description for description, _ in batch)
+            if len(pending) < n_clusters:
+                continue
+            model.partial_fit(vectorizer.transform(pending))
+            n_rows += len(pending)
+            pending = []
+
+        if n_rows == 0:
+            raise ValueError(f"Need at least {n_clusters} stored transactions to train the classifier")
+        if pending:
+            model.partial_fit(vectorizer.transform(pending))
+            n_rows += len(pending)
+
+        # Second pass: label clusters by majority stored category
+        votes: Dict[int, Counter] = defaultdict(Counter)
+        for batch in iter_transaction_batches(session, batch_size):
+            clusters = model.predict(vectorizer.transform([description for description, _ in batch]))
+            for cluster, (_, category) in zip(clusters, batch):
+                if category and category != 'Uncategorized':
+                    votes[int(cluster)][category] += 1
+
+    cluster_to_category = DEFAULT_CLUSTER_TO_CATEGORY.copy()
+    cluster_to_category.update({
+        cluster: counter.most_common(1)[0][0] for cluster, counter in votes.items()
+    })
+
+    # Random suffix: two trainings within the same second must not share a directory
+    version = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(4)}"
+    manifest = {
+        'version': version,
+        'trained_at': datetime.utcnow().isoformat(),
+        'n_rows': n_rows,
+        'n_clusters': n_clusters,
+        'cluster_to_category': cluster_to_category
+    }
+    publish_artifacts(model, vectorizer, manifest, model_dir)
+    logger.info(f"Published classifier version {version} trained on {n_rows} transactions")
+
+    return version
+
+def publish_artifacts(model, vectorizer, manifest: Dict, model_dir: str = 'models') -> None:
+    """
+    Write a versioned artifact directory and atomically point LATEST at it.
+
+    Files are staged in a temporary directory on the same filesystem and
+    moved into place with ``os.replace``, so readers either see the previous
+    version or the complete new one, never a partial write.
+    """
+    versions_dir = os.path.join(model_dir, VERSIONS_DIR)
+    os.makedirs(versions_dir, exist_ok=True)
+
+    staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=versions_dir)
+    try:
+        joblib.dump(model, os.path.join(staging_dir, CLASSIFIER_FILE))
+        joblib.dump(vectorizer, os.path.join(staging_dir, VECTORIZER_FILE))
+        with open(os.path.join(staging_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(staging_dir, os.path.join(versions_dir, manifest['version']))
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    fd, pointer_tmp = tempfile.mkstemp(prefix='.latest-', dir=model_dir)
+    with os.fdopen(fd, 'w') as f:
+        f.write(manifest['version'])
+    os.replace(pointer_tmp, os.path.join(model_dir, LATEST_POINTER))
@@ -1,19 +1,57 @@
 import pandas as pd
 import pdfplumber
 import re
+import codecs
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
 from io import BytesIO
-from typing import Union, List, Dict
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple, Union, List, Dict
 import logging
 
 logger = logging.getLogger(__name__)
 
-def parse_statement(file_bytes: bytes, filename: str) -> pd.DataFrame:
+# Bump whenever parsing output changes so cached results are invalidated
+PARSER_VERSION = '2'
+
+# Bytes read from the start of a CSV to detect its encoding
+SNIFF_BYTES = 64 * 1024
+
+# Common patterns for transaction lines, compiled once
+TRANSACTION_PATTERNS = [
+    # Pattern: Date Description Amount
+    re.compile(r'(?P<date>\d{1,2}[-/]\d{1,2}[-/]\d{2,4})\s+(?P<description>.*?)\s+(?P<amount>[-+]?\$?\d{1,3}(?:,\d{3})*\.\d{2})', re.MULTILINE),
+    # Pattern: Date Amount Description
+    re.compile(r'(?P<date>\d{1,2}[-/]\d{1,2}[-/]\d{2,4})\s+(?P<amount>[-+]?\$?\d{1,3}(?:,\d{3})*\.\d{2})\s+(?P<description>.*?)$', re.MULTILINE),
+]
+
+# PDFs with fewer pages are parsed in-process
+PARALLEL_MIN_PAGES = 8
+
+# Seconds past the time budget to collect partially extracted page ranges
+DEADLINE_GRACE_SECONDS = 0.25
+
+# Shared process pool for page extraction, created on first use
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+def parse_statement(
+    file_bytes: bytes,
+    filename: str,
+    max_pages: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    pdf_workers: Optional[int] = None
+) -> pd.DataFrame:
     """
     Parse bank statement files (CSV, XLSX, PDF) and extract transaction data.
     
     Args:
         file_bytes: Raw bytes of the uploaded file
         filename: Original filename with extension
+        max_pages: PDF only; maximum number of pages to parse
+        time_budget: PDF only; seconds allowed for page extraction
+        pdf_workers: PDF only; size of the page extraction pool
         
     Returns:
         DataFrame with columns [date, description, amount]
@@ -24,7 +62,7 @@ def parse_statement(file_bytes: bytes, filename: str) -> pd.DataFrame:
         if file_ext in ['csv', 'xlsx', 'xls']:
             return _parse_structured_file(file_bytes, file_ext)
         elif file_ext == 'pdf':
-            return _parse_pdf(file_bytes)
+            return _parse_pdf(file_bytes, max_pages, time_budget, pdf_workers)
         else:
             raise ValueError(f"Unsupported file format: {file_ext}")
     except Exception as e:
@@ -36,14 +74,55 @@ def _parse_structured_file(file_bytes: bytes, file_ext: str) -> pd.DataFrame:
     file_obj = BytesIO(file_bytes)
     
     if file_ext == 'csv':
-        # Try different encodings and separators
-        try:
-            df = pd.read_csv(file_obj, encoding='utf-8')
-        except UnicodeDecodeError:
-            df = pd.read_csv(file_obj, encoding='latin1')
+        # Pick the encoding from a sniffed prefix instead of reparsing on failure
+        encoding = sniff_encoding(file_bytes[:SNIFF_BYTES])
+        df = pd.read_csv(file_obj, encoding=encoding, encoding_errors='replace')
     else:  # xlsx or xls
         df = pd.read_excel(file_obj)
     
+    return _standardize_columns(df)
+
+def iter_csv_chunks(file_obj: BinaryIO, chunk_rows: int = 50_000) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV statement from a binary file object in standardized chunks.
+    
+    The encoding is detected from a sniffed prefix; undecodable bytes further
+    into the file are replaced rather than aborting a partially ingested upload.
+    Only one chunk is held in memory at a time.
+    
+    Args:
+        file_obj: Seekable binary file object positioned at the start of the CSV
+        chunk_rows: Number of rows per yielded chunk
+        
+    Yields:
+        DataFrames with columns [date, description, amount]
+    """
+    encoding = sniff_encoding(file_obj.read(SNIFF_BYTES))
+    file_obj.seek(0)
+    
+    reader = pd.read_csv(
+        file_obj,
+        encoding=encoding,
+        encoding_errors='replace',
+        chunksize=chunk_rows
+    )
+    with reader:
+        for chunk in reader:
+            yield _standardize_columns(chunk)
+
+def sniff_encoding(prefix: bytes) -> str:
+    """Detect whether a CSV prefix is UTF-8 (with or without BOM), else latin1."""
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # Incremental decode so a multi-byte character cut at the end is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+def _standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Map bank-specific column names to [date, description, amount] and clean values."""
     # Standardize column names
     df.columns = [col.lower().strip() for col in df.columns]
     
@@ -78,41 +157,143 @@ def _parse_structured_file(file_bytes: bytes, file_ext: str) -> pd.DataFrame:
     
     return df[required_cols]
 
-def _parse_pdf(file_bytes: bytes) -> pd.DataFrame:
-    """Parse PDF statements using pdfplumber and regex patterns."""
-    transactions = []
+def _parse_pdf(
+    file_bytes: bytes,
+    max_pages: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    max_workers: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Parse PDF statements using pdfplumber and regex patterns.
+    
+    Large statements are split into page ranges that are extracted in parallel
+    on a process pool; results are merged back in page order.
     
+    Args:
+        file_bytes: Raw bytes of the PDF
+        max_pages: Only parse the first ``max_pages`` pages
+        time_budget: Seconds to wait for page extraction before returning what
+            has been parsed so far (the result is marked truncated)
+        max_workers: Size of the page extraction pool (defaults to CPU count)
+        
+    Returns:
+        DataFrame with columns [date, description, amount]; ``df.attrs['truncated']``
+        is True when pages were skipped because the time budget ran out
+    """
     with pdfplumber.open(BytesIO(file_bytes)) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-                
-            # Common patterns for transaction lines
-            patterns = [
-                # Pattern: Date Description Amount
-                r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})\s+(.*?)\s+([-+]?\$?\d{1,3}(?:,\d{3})*\.\d{2})',
-                # Pattern: Date Amount Description
-                r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})\s+([-+]?\$?\d{1,3}(?:,\d{3})*\.\d{2})\s+(.*?)$',
-            ]
-            
-            for pattern in patterns:
-                matches = re.finditer(pattern, text, re.MULTILINE)
-                for match in matches:
-                    if len(match.groups()) == 3:
-                        date_str, desc, amount = match.groups()
-                        # Clean and standardize the data
-                        date = pd.to_datetime(date_str)
-                        desc = desc.strip()
-                        amount = float(amount.replace('$', '').replace(',', ''))
-                        
-                        transactions.append({
-                            'date': date,
-                            'description': desc,
-                            'amount': amount
-                        })
-    
-    if not transactions:
+        n_pages = len(pdf.pages)
+        if max_pages is not None:
+            n_pages = min(n_pages, max_pages)
+        
+        # Small statements are not worth the cost of shipping bytes to workers
+        if n_pages < PARALLEL_MIN_PAGES or max_workers == 1:
+            deadline = time.monotonic() + time_budget if time_budget is not None else None
+            matches, pages_done = _extract_pages_from(pdf, 0, n_pages, deadline)
+            truncated = pages_done < n_pages
+        else:
+            matches, truncated = _extract_pages_parallel(file_bytes, n_pages, time_budget, max_workers)
+    
+    if truncated:
+        logger.warning(f"PDF parse stopped early after exceeding its {time_budget}s time budget")
+    
+    if not matches:
         raise ValueError("No transactions found in PDF")
     
-    return pd.DataFrame(transactions)
\ No newline at end of file
+    dates, descriptions, amounts = zip(*matches)
+    df = pd.DataFrame({
+        'date': pd.to_datetime(pd.Series(dates), format='mixed'),
+        'description': [desc.strip() for desc in descriptions],
+        'amount': pd.Series(amounts).str.replace(r'[$,]', '', regex=True).astype(float)
+    })
+    df.attrs['truncated'] = truncated
+    return df
+
+def _extract_pages_parallel(
+    file_bytes: bytes,
+    n_pages: int,
+    time_budget: Optional[float],
+    max_workers: Optional[int]
+) -> Tuple[List[Tuple[str, str, str]], bool]:
+    """
+    Extract page ranges on the process pool, merging results in page order.
+    
+    Cancelling a future cannot stop a range that a worker already started, so
+    workers are also handed the wall-clock deadline and stop between pages
+    once it passes; ranges they pick up after it return immediately. Work left
+    over from a timed-out request is therefore at most one page per worker
+    rather than the rest of the statement, and ranges in progress at the
+    deadline still contribute the pages they finished.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    pool = _get_page_pool(workers)
+    # A few ranges per worker keeps the pool busy when pages vary in cost
+    n_ranges = min(n_pages, workers * 4)
+    bounds = [round(i * n_pages / n_ranges) for i in range(n_ranges + 1)]
+    # Wall clock rather than monotonic time, since it is compared in other processes
+    deadline = time.time() + time_budget if time_budget is not None else None
+    futures = [
+        pool.submit(_extract_pages, file_bytes, start, end, deadline)
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+    
+    # Ranges in progress return what they extracted within a page of the deadline
+    timeout = time_budget + DEADLINE_GRACE_SECONDS if time_budget is not None else None
+    done, not_done = wait(futures, timeout=timeout)
+    for future in not_done:
+        future.cancel()
+    
+    matches = []
+    truncated = bool(not_done)
+    for future, start, end in zip(futures, bounds[:-1], bounds[1:]):
+        if future in done:
+            range_matches, pages_done = future.result()
+            matches.extend(range_matches)
+            truncated = truncated or pages_done < end - start
+    return matches, truncated
+
+def _get_page_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Return the shared page extraction pool, creating it on first use."""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(max_workers=max_workers)
+        return _page_pool
+
+def _extract_pages(
+    file_bytes: bytes,
+    start: int,
+    end: int,
+    deadline: Optional[float] = None
+) -> Tuple[List[Tuple[str, str, str]], int]:
+    """
+    Worker entry point: open the PDF and extract matches from pages [start, end).
+    
+    ``deadline`` is a ``time.time()`` value; extraction stops between pages
+    once it has passed. Returns the matches and the number of pages extracted.
+    """
+    if deadline is not None and time.time() > deadline:
+        return [], 0
+    with pdfplumber.open(BytesIO(file_bytes)) as pdf:
+        return _extract_pages_from(pdf, start, end, deadline, clock=time.time)
+
+def _extract_pages_from(
+    pdf,
+    start: int,
+    end: int,
+    deadline: Optional[float] = None,
+    clock: Callable[[], float] = time.monotonic
+) -> Tuple[List[Tuple[str, str, str]], int]:
+    """Extract (date, description, amount) strings from pages [start, end) of an open PDF."""
+    matches = []
+    for page_number in range(start, end):
+        if deadline is not None and clock() > deadline:
+            return matches, page_number - start
+        
+        text = pdf.pages[page_number].extract_text()
+        if not text:
+            continue
+        
+        for pattern in TRANSACTION_PATTERNS:
+            for match in pattern.finditer(text):
+                matches.append(match.group('date', 'description', 'amount'))
+    return matches, end - start
@@ -0,0 +1,207 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import logging
+import pandas as pd
+import pyarrow as pa
+from ..config import settings
+from .categorizer import RULES_VERSION
+from .ocr_parser import PARSER_VERSION
+
+logger = logging.getLogger(__name__)
+
+def encode_frame(df: pd.DataFrame) -> bytes:
+    """
+    Serialize a categorized DataFrame into an Arrow IPC stream.
+    
+    Text columns are dictionary-encoded, which is much smaller than row dicts
+    for repetitive descriptions and categories. Arrow IPC is a data-only
+    format, so a blob planted in the shared Redis tier cannot run code when
+    it is decoded.
+    """
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_numeric_dtype(series):
+            columns[name] = pa.array(series.to_numpy())
+        else:
+            columns[name] = pa.array(series.to_numpy(dtype=object), type=pa.string()).dictionary_encode()
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def decode_frame(blob: bytes) -> pd.DataFrame:
+    """Rebuild a DataFrame produced by ``encode_frame``."""
+    with pa.ipc.open_stream(blob) as reader:
+        table = reader.read_all()
+    data = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_dictionary(column.type):
+            # Decoded to plain objects, with None for missing values
+            data[name] = column.cast(column.type.value_type).to_numpy(zero_copy_only=False)
+        else:
+            data[name] = column.to_numpy()
+    return pd.DataFrame(data)
+
+class MemoryTier:
+    """In-process LRU of encoded frames bounded by total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self.size = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        blob = self._entries.get(key)
+        if blob is not None:
+            self._entries.move_to_end(key)
+        return blob
+
+    def set(self, key: str, blob: bytes) -> None:
+        if len(blob) > self.max_bytes:
+            return
+        if key in self._entries:
+            self.size -= len(self._entries.pop(key))
+        self._entries[key] = blob
+        self.size += len(blob)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+class RedisTier:
+    """
+    Shared Redis tier bounded by total size in bytes.
+    
+    Entry sizes are tracked in a hash and recency in a sorted set, so the
+    least recently written entries are deleted once the tier exceeds
+    ``max_bytes``. Entries also expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, url: str, max_bytes: int, ttl: int, namespace: str = 'parse_cache'):
+        import redis.asyncio as redis
+
+        self.client = redis.Redis.from_url(url)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.namespace = namespace
+        self._sizes_key = f"{namespace}:sizes"
+        self._recency_key = f"{namespace}:recency"
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self._entry_key(key))
+
+    async def set(self, key: str, blob: bytes) -> None:
+        if len(blob) > self.max_bytes:
+            return
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._entry_key(key), blob, ex=self.ttl)
+            pipe.hset(self._sizes_key, key, len(blob))
+            pipe.zadd(self._recency_key, {key: time.time()})
+            await pipe.execute()
+        await self._evict()
+
+    async def _evict(self) -> None:
+        sizes = {k.decode(): int(v) for k, v in (await self.client.hgetall(self._sizes_key)).items()}
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        victims = []
+        for raw_key in await self.client.zrange(self._recency_key, 0, -1):
+            if total <= self.max_bytes:
+                break
+            key = raw_key.decode()
+            total -= sizes.get(key, 0)
+            victims.append(key)
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(*[self._entry_key(key) for key in victims])
+            pipe.hdel(self._sizes_key, *victims)
+            pipe.zrem(self._recency_key, *victims)
+            await pipe.execute()
+
+class ParseCache:
+    """
+    Two-tier cache of categorized statements keyed by file content.
+    
+    Lookups try the in-process LRU first and then the optional Redis tier;
+    Redis hits are promoted into the LRU.
+    """
+
+    def __init__(self, memory_max_bytes: int, redis_url: Optional[str] = None,
+                 redis_max_bytes: int = 0, ttl: int = 86400):
+        self.memory = MemoryTier(memory_max_bytes)
+        self.redis: Optional[RedisTier] = None
+        if redis_url:
+            try:
+                self.redis = RedisTier(redis_url, redis_max_bytes, ttl)
+            except ImportError:
+                logger.warning("REDIS_URL is set but the redis package is not installed; using memory tier only")
+
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(file_bytes: bytes, filename: str, model_version: str, max_pages: Optional[int] = None) -> str:
+        """
+        Build a cache key from the file content, parser version, classifier
+        versions and the parse settings that change the output.
+        """
+        digest = hashlib.sha256(file_bytes).hexdigest()
+        file_ext = filename.lower().split('.')[-1]
+        return f"{PARSER_VERSION}:{RULES_VERSION}:{model_version}:{file_ext}:{max_pages}:{digest}"
+
+    async def get(self, key: str) -> Optional[pd.DataFrame]:
+        blob = self.memory.get(key)
+        if blob is not None:
+            self.memory_hits += 1
+            return decode_frame(blob)
+
+        if self.redis is not None:
+            try:
+                blob = await self.redis.get(key)
+            except Exception as e:
+                logger.warning(f"Parse cache Redis lookup failed: {str(e)}")
+                blob = None
+            if blob is not None:
+                self.redis_hits += 1
+                self.memory.set(key, blob)
+                return decode_frame(blob)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, df: pd.DataFrame) -> None:
+        blob = encode_frame(df)
+        self.memory.set(key, blob)
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, blob)
+            except Exception as e:
+                logger.warning(f"Parse cache Redis write failed: {str(e)}")
+
+    def stats(self) -> Dict:
+        """Return hit counters and memory tier usage."""
+        return {
+            'memory_hits': self.memory_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'memory_entries': len(self.memory._entries),
+            'memory_bytes': self.memory.size,
+            'redis_enabled': self.redis is not None
+        }
+
+# Create a singleton instance
+parse_cache = ParseCache(
+    memory_max_bytes=settings.PARSE_CACHE_MAX_BYTES,
+    redis_url=settings.REDIS_URL,
+    redis_max_bytes=settings.PARSE_CACHE_REDIS_MAX_BYTES,
+    ttl=settings.PARSE_CACHE_TTL_SECONDS
+)
@@ -1,20 +1,167 @@
-from plaid import Client as PlaidClient
-from plaid.exceptions import PlaidError
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import asyncio
+import time
+from typing import AsyncIterator, Dict, Optional
 import logging
+import httpx
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# Error code asking the client to restart a /transactions/sync pagination loop
+SYNC_MUTATION_ERROR = 'TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION'
+
+PLAID_HOSTS = {
+    'sandbox': 'https://sandbox.plaid.com',
+    'development': 'https://development.plaid.com',
+    'production': 'https://production.plaid.com',
+}
+
+class PlaidError(Exception):
+    """Error returned by the Plaid API, or a failed request to it."""
+
+    def __init__(self, message: str, code: Optional[str] = None, error_type: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+        self.error_type = error_type
+
+class ItemRateLimiter:
+    """
+    Token bucket per item.
+    
+    Plaid rate-limits most endpoints per item, so each access token gets a
+    bucket of ``burst`` calls refilled at ``rate_per_minute``. Callers over
+    the limit wait instead of being rejected with RATE_LIMIT_EXCEEDED.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_items: int = 10_000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_items = max_items
+        self._buckets: Dict[str, list] = {}
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    async def acquire(self, key: str) -> None:
+        while True:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = [tokens - 1, now]
+                self._prune()
+                return
+            self._buckets[key] = [tokens, now]
+            delay = (1 - tokens) / self.rate
+            self.waits += 1
+            self.wait_seconds += delay
+            await asyncio.sleep(delay)
+
+    def _prune(self) -> None:
+        # Buckets that refilled completely carry no state worth keeping
+        if len(self._buckets) > self.max_items:
+            now = time.monotonic()
+            full_after = self.burst / self.rate
+            self._buckets = {
+                key: bucket for key, bucket in self._buckets.items()
+                if now - bucket[1] < full_after
+            }
+
 class PlaidService:
-    def __init__(self):
-        """Initialize Plaid client with sandbox credentials."""
-        self.client = PlaidClient(
-            client_id=settings.PLAID_CLIENT_ID.get_secret_value(),
-            secret=settings.PLAID_SECRET.get_secret_value(),
-            environment=settings.PLAID_ENV
-        )
+    """
+    Async client for the Plaid API.
+    
+    Requests go through one pooled httpx.AsyncClient, so connections are
+    reused and the event loop is never blocked on a round trip. At most
+    ``max_concurrency`` requests are in flight, and calls for the same item
+    are spaced by a per-item rate limiter.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        secret: str,
+        environment: str = 'sandbox',
+        base_url: Optional[str] = None,
+        max_concurrency: int = 8,
+        timeout: float = 30.0,
+        limiter: Optional[ItemRateLimiter] = None
+    ):
+        """
+        Args:
+            client_id: Plaid client id
+            secret: Plaid secret for the environment
+            environment: 'sandbox', 'development' or 'production'
+            base_url: Alternative API endpoint (e.g. a local stub server)
+            max_concurrency: Requests in flight across the process
+            timeout: Seconds allowed for a single request
+            limiter: Per-item rate limiter shared by all calls
+        """
+        self.client_id = client_id
+        self.secret = secret
+        self.base_url = base_url or PLAID_HOSTS[environment]
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.limiter = limiter or ItemRateLimiter(rate_per_minute=50, burst=10)
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.calls = 0
+        self.failures = 0
+        self.in_flight = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the connection pool belongs to the running loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={'PLAID-CLIENT-ID': self.client_id, 'PLAID-SECRET': self.secret},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+        return self._client
+
+    async def _post(self, path: str, body: Dict, access_token: Optional[str] = None) -> Dict:
+        """
+        POST a request to the Plaid API and return the decoded response.
+        
+        Raises:
+            PlaidError: On an error response or a failed request
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if access_token is not None:
+            await self.limiter.acquire(access_token)
+            body = {**body, 'access_token': access_token}
+
+        self.calls += 1
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                response = await self.client.post(path, json=body)
+            except httpx.HTTPError as e:
+                self.failures += 1
+                raise PlaidError(f"Plaid request to {path} failed: {type(e).__name__}") from e
+            finally:
+                self.in_flight -= 1
+
+        try:
+            payload = response.json()
+        except ValueError:
+            # Gateways in front of Plaid can answer with HTML error pages
+            payload = {}
+        if response.status_code != 200:
+            self.failures += 1
+            raise PlaidError(
+                payload.get('error_message', f"Plaid returned HTTP {response.status_code}"),
+                code=payload.get('error_code'),
+                error_type=payload.get('error_type')
+            )
+        return payload
     
     async def create_link_token(self, user_id: str) -> Dict:
         """
@@ -28,7 +175,7 @@ class PlaidService:
         """
         try:
             # Create a link token with sandbox configuration
-            response = self.client.link_token_create({
+            request = {
                 'user': {
                     'client_user_id': user_id,
                 },
@@ -36,8 +183,11 @@ class PlaidService:
                 'products': ['transactions'],
                 'country_codes': ['US'],
                 'language': 'en',
-                'webhook': 'https://your-webhook-url.com/plaid/webhook',  # Replace with your webhook URL
-            })
+            }
+            if settings.PLAID_WEBHOOK_URL:
+                # Plaid notifies /plaid/webhook when new transactions are ready
+                request['webhook'] = settings.PLAID_WEBHOOK_URL
+            response = await self._post('/link/token/create', request)
             
             return {
                 'link_token': response['link_token'],
@@ -60,7 +210,7 @@ class PlaidService:
         """
         try:
             # Exchange the public token for an access token
-            response = self.client.item_public_token_exchange(public_token)
+            response = await self._post('/item/public_token/exchange', {'public_token': public_token})
             
             return {
                 'access_token': response['access_token'],
@@ -71,59 +221,96 @@ class PlaidService:
             logger.error(f"Error exchanging public token: {str(e)}")
             raise
     
-    async def fetch_transactions(
-        self,
-        access_token: str,
-        start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None
-    ) -> List[Dict]:
+    async def get_webhook_verification_key(self, key_id: str) -> Dict:
         """
-        Fetch transactions for a given date range.
+        Fetch the public key Plaid signs webhooks with.
         
         Args:
-            access_token: The access token for the item
-            start_date: Start date for transaction fetch (defaults to 30 days ago)
-            end_date: End date for transaction fetch (defaults to today)
+            key_id: The ``kid`` from the header of a Plaid-Verification JWT
             
         Returns:
-            List of transaction dictionaries
+            The key as a JWK dict; ``expired_at`` is set once Plaid rotated it out
         """
         try:
-            # Set default date range if not provided
-            if not end_date:
-                end_date = datetime.now()
-            if not start_date:
-                start_date = end_date - timedelta(days=30)
-            
-            # Format dates for Plaid API
-            start_date_str = start_date.strftime('%Y-%m-%d')
-            end_date_str = end_date.strftime('%Y-%m-%d')
-            
-            # Fetch transactions
-            response = self.client.transactions_get(
-                access_token,
-                start_date_str,
-                end_date_str
-            )
-            
-            # Process and return transactions
-            transactions = response['transactions']
+            response = await self._post('/webhook_verification_key/get', {'key_id': key_id})
+            return response['key']
+        except PlaidError as e:
+            logger.error(f"Error fetching webhook verification key: {str(e)}")
+            raise
+    
+    async def sync_transactions(
+        self,
+        access_token: str,
+        cursor: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield pages of transaction updates since the given cursor.
+        
+        Each page holds the ``added``, ``modified`` and ``removed``
+        transactions of one /transactions/sync call plus its ``next_cursor``,
+        so callers can apply and checkpoint pages one at a time instead of
+        holding the whole history in memory.
+        
+        Args:
+            access_token: The access token for the item
+            cursor: Cursor of the last applied page; None for the full history
             
-            # Handle pagination if there are more transactions
-            while response['has_more']:
-                response = self.client.transactions_get(
-                    access_token,
-                    start_date_str,
-                    end_date_str,
-                    offset=len(transactions)
-                )
-                transactions.extend(response['transactions'])
+        Yields:
+            Dict with added, modified, removed, next_cursor and has_more
+        """
+        start_cursor = cursor
+        has_more = True
+        while has_more:
+            request = {'count': settings.PLAID_SYNC_PAGE_SIZE}
+            if cursor:
+                request['cursor'] = cursor
             
-            return transactions
+            try:
+                response = await self._post('/transactions/sync', request, access_token=access_token)
+            except PlaidError as e:
+                if e.code == SYNC_MUTATION_ERROR:
+                    # Plaid asks for the whole pagination loop to restart;
+                    # pages already yielded are safe to apply again
+                    logger.warning("Transactions changed during sync pagination, restarting")
+                    cursor = start_cursor
+                    continue
+                logger.error(f"Error syncing transactions: {str(e)}")
+                raise
             
-        except PlaidError as e:
-            logger.error(f"Error fetching transactions: {str(e)}")
-            raise
+            cursor = response['next_cursor']
+            has_more = response['has_more']
+            yield {
+                'added': response['added'],
+                'modified': response['modified'],
+                'removed': response['removed'],
+                'next_cursor': cursor,
+                'has_more': has_more
+            }
+
+    async def close(self) -> None:
+        """Close pooled connections; a later call opens a new pool."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict:
+        """Return request counters and rate limiter waits for monitoring."""
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'in_flight': self.in_flight,
+            'max_concurrency': self.max_concurrency,
+            'rate_limited_waits': self.limiter.waits,
+            'rate_limited_seconds': round(self.limiter.wait_seconds, 4)
+        }
 
 # Create a singleton instance
-plaid_service = PlaidService() 
\ No newline at end of file
+plaid_service = PlaidService(
+    client_id=settings.PLAID_CLIENT_ID.get_secret_value(),
+    secret=settings.PLAID_SECRET.get_secret_value(),
+    environment=settings.PLAID_ENV,
+    base_url=settings.PLAID_BASE_URL,
+    max_concurrency=settings.PLAID_MAX_CONCURRENCY,
+    timeout=settings.PLAID_TIMEOUT_SECONDS,
+    limiter=ItemRateLimiter(settings.PLAID_ITEM_RATE_PER_MINUTE, settings.PLAID_ITEM_BURST)
+) 
\ No newline at end of file
@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import logging
+import pandas as pd
+from sqlalchemy import case, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models import PlaidItem
+from .merchant_memo import merchant_memo
+from .plaid_service import plaid_service
+from .transaction_store import apply_plaid_changes
+
+logger = logging.getLogger(__name__)
+
+# Plaid transaction fields kept in Transaction.meta
+META_FIELDS = ['account_id', 'merchant_name', 'pending', 'iso_currency_code']
+
+async def register_item(db: AsyncSession, user_id: int, item_id: str, access_token: str) -> None:
+    """
+    Store a linked item for a user, replacing the access token on relink.
+
+    A relinked item keeps its cursor, so syncing resumes where it left off,
+    unless it moved to another user. The caller owns the commit.
+    """
+    stmt = pg_insert(PlaidItem).values(
+        item_id=item_id,
+        user_id=user_id,
+        access_token=access_token,
+        created_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['item_id'],
+        set_={
+            'user_id': stmt.excluded.user_id,
+            'access_token': stmt.excluded.access_token,
+            'cursor': case((PlaidItem.user_id == stmt.excluded.user_id, PlaidItem.cursor), else_=None)
+        }
+    )
+    await db.execute(stmt)
+
+async def load_item(db: AsyncSession, access_token: str) -> Optional[PlaidItem]:
+    """Return the linked item for an access token, if it was registered."""
+    result = await db.execute(select(PlaidItem).where(PlaidItem.access_token == access_token))
+    return result.scalar_one_or_none()
+
+def _sync_frame(transactions: List[Dict]) -> pd.DataFrame:
+    """Convert Plaid transactions into the columns the categorizer and store expect."""
+    return pd.DataFrame({
+        'date': pd.to_datetime([txn['date'] for txn in transactions]),
+        'description': [txn.get('name') for txn in transactions],
+        # Plaid reports money leaving the account as positive; statements use negative
+        'amount': [-float(txn['amount']) for txn in transactions],
+        'plaid_transaction_id': [txn['transaction_id'] for txn in transactions],
+        'meta': [{field: txn.get(field) for field in META_FIELDS} for txn in transactions]
+    })
+
+async def sync_item(db: AsyncSession, item: PlaidItem) -> Dict:
+    """
+    Pull and apply every transaction update since the item's cursor.
+
+    Each page is categorized, applied and committed together with its
+    cursor, so an interrupted sync resumes after the last applied page and
+    memory stays bounded by the page size.
+
+    Args:
+        db: Async database session; committed after every page
+        item: The linked item to sync
+
+    Returns:
+        Dict with counts of added, modified and removed transactions,
+        rows written, statement rows matched and the new cursor
+
+    Raises:
+        ExecutorSaturated: If categorization could not be scheduled
+    """
+    totals = {'added': 0, 'modified': 0, 'removed': 0, 'inserted': 0, 'deleted': 0, 'matched': 0}
+    async for page in plaid_service.sync_transactions(item.access_token, item.cursor):
+        upserts = _sync_frame(page['added'] + page['modified'])
+        if not upserts.empty:
+            upserts = await merchant_memo.classify(upserts)
+        removed_ids = [txn['transaction_id'] for txn in page['removed']]
+
+        written = await apply_plaid_changes(db, item.user_id, upserts, removed_ids)
+        item.cursor = page['next_cursor']
+        item.last_synced_at = datetime.utcnow()
+        await db.commit()
+
+        totals['added'] += len(page['added'])
+        totals['modified'] += len(page['modified'])
+        totals['removed'] += len(page['removed'])
+        totals['inserted'] += written['inserted']
+        totals['deleted'] += written['deleted']
+        totals['matched'] += written['matched']
+
+    logger.info(
+        f"Synced Plaid item {item.item_id} for user {item.user_id}: "
+        f"{totals['added']} added, {totals['modified']} modified, {totals['removed']} removed"
+    )
+    return {**totals, 'cursor': item.cursor}
+
+async def sync_items(access_tokens: Sequence[str], concurrency: Optional[int] = None) -> List[Dict]:
+    """
+    Sync many linked items at once.
+
+    At most ``concurrency`` items sync at a time, each in its own session;
+    the Plaid client's per-item rate limits and request cap still apply
+    underneath. A failing item does not stop the others; its entry carries
+    an ``error`` instead of counts.
+
+    Args:
+        access_tokens: Access tokens of registered items
+        concurrency: Items synced at once (defaults to PLAID_SYNC_CONCURRENCY)
+
+    Returns:
+        List of per-item results in the order of access_tokens
+    """
+    slots = asyncio.Semaphore(concurrency or settings.PLAID_SYNC_CONCURRENCY)
+
+    async def sync_one(access_token: str) -> Dict:
+        async with slots:
+            async with AsyncSessionLocal() as db:
+                item = await load_item(db, access_token)
+                if item is None:
+                    return {'item_id': None, 'error': 'Unknown Plaid item'}
+                try:
+                    return {'item_id': item.item_id, **await sync_item(db, item)}
+                except Exception as e:
+                    # Pages committed before the failure stay applied
+                    logger.error(f"Sync of Plaid item {item.item_id} failed: {str(e)}")
+                    return {'item_id': item.item_id, 'error': str(e)}
+
+    return await asyncio.gather(*(sync_one(access_token) for access_token in access_tokens))
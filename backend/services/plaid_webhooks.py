@@ -0,0 +1,422 @@
+import asyncio
+import hashlib
+import heapq
+import hmac
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+import python_jwt
+from jwcrypto import jwk
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models import PlaidItem
+from .plaid_service import PlaidError, PlaidService, plaid_service
+from .plaid_sync import sync_item
+
+logger = logging.getLogger(__name__)
+
+# Webhook codes after which new transaction data can be pulled with /transactions/sync
+SYNC_WEBHOOK_CODES = {
+    'SYNC_UPDATES_AVAILABLE',
+    'INITIAL_UPDATE',
+    'HISTORICAL_UPDATE',
+    'DEFAULT_UPDATE',
+    'TRANSACTIONS_REMOVED',
+}
+
+# JWK members of a Plaid webhook verification key; the rest is Plaid metadata
+JWK_FIELDS = ('kty', 'crv', 'x', 'y', 'kid', 'alg', 'use')
+
+class WebhookVerificationError(Exception):
+    """A webhook whose Plaid-Verification header is missing or does not vouch for its body."""
+
+class WebhookVerifier:
+    """
+    Checks the Plaid-Verification header Plaid signs every webhook with.
+
+    The header is an ES256 JWT whose claims carry the SHA-256 of the request
+    body and the time it was issued. Its signing key is fetched from Plaid
+    by the token's ``kid`` and cached for ``key_cache_seconds``, so a key
+    Plaid rotates out is noticed. Key ids Plaid refuses are remembered for
+    ``refused_key_seconds``, and lookups of uncached keys are limited to
+    ``key_fetches_per_minute``, so forged tokens cannot turn into a stream
+    of Plaid calls. A webhook is accepted only if the
+    signature verifies, the token is at most ``max_age`` seconds old and
+    the body hash matches the bytes received.
+    """
+
+    def __init__(
+        self,
+        service: PlaidService,
+        max_age: float = 300.0,
+        key_cache_seconds: float = 3600.0,
+        refused_key_seconds: float = 60.0,
+        key_fetches_per_minute: float = 10.0
+    ):
+        """
+        Args:
+            service: Plaid client used to fetch verification keys
+            max_age: Seconds after which a token is rejected as a replay
+            key_cache_seconds: Seconds a fetched key is reused
+            refused_key_seconds: Seconds an unknown or expired key id is
+                rejected without asking Plaid again
+            key_fetches_per_minute: Lookups of uncached keys allowed per
+                minute, in bursts of the same size
+        """
+        self.service = service
+        self.max_age = max_age
+        self.key_cache_seconds = key_cache_seconds
+        self.refused_key_seconds = refused_key_seconds
+        self.key_fetches_per_minute = key_fetches_per_minute
+        self._keys: Dict[str, Tuple[jwk.JWK, float]] = {}
+        self._refused: Dict[str, float] = {}
+        self._fetch_tokens = key_fetches_per_minute
+        self._fetch_updated = time.monotonic()
+
+        self.verified = 0
+        self.rejected = 0
+        self.key_fetches = 0
+        self.throttled = 0
+
+    def _take_fetch(self, now: float) -> bool:
+        # Token bucket shared by all uncached key ids
+        refill = (now - self._fetch_updated) * self.key_fetches_per_minute / 60.0
+        self._fetch_tokens = min(self.key_fetches_per_minute, self._fetch_tokens + refill)
+        self._fetch_updated = now
+        if self._fetch_tokens < 1:
+            return False
+        self._fetch_tokens -= 1
+        return True
+
+    def _refuse(self, key_id: str, now: float) -> None:
+        self._refused = {
+            refused_id: refused_at for refused_id, refused_at in self._refused.items()
+            if now - refused_at < self.refused_key_seconds
+        }
+        self._refused[key_id] = now
+
+    async def _key(self, key_id: str) -> jwk.JWK:
+        now = time.monotonic()
+        cached = self._keys.get(key_id)
+        if cached is not None and now - cached[1] < self.key_cache_seconds:
+            return cached[0]
+        refused_at = self._refused.get(key_id)
+        if refused_at is not None and now - refused_at < self.refused_key_seconds:
+            raise WebhookVerificationError(f"Verification key {key_id} was refused recently")
+        if not self._take_fetch(now):
+            self.throttled += 1
+            raise WebhookVerificationError(f"Too many verification key lookups; not fetching {key_id}")
+
+        self.key_fetches += 1
+        try:
+            key = await self.service.get_webhook_verification_key(key_id)
+        except PlaidError as e:
+            self._refuse(key_id, now)
+            raise WebhookVerificationError(f"No verification key {key_id}: {str(e)}") from e
+        if key.get('expired_at') is not None:
+            self._keys.pop(key_id, None)
+            self._refuse(key_id, now)
+            raise WebhookVerificationError(f"Verification key {key_id} has expired")
+        public_key = jwk.JWK(**{field: key[field] for field in JWK_FIELDS if field in key})
+        self._keys[key_id] = (public_key, time.monotonic())
+        return public_key
+
+    async def verify(self, body: bytes, token: Optional[str]) -> None:
+        """
+        Check that a webhook body was sent by Plaid.
+
+        Args:
+            body: Raw request body
+            token: Value of the Plaid-Verification header
+
+        Raises:
+            WebhookVerificationError: If the webhook cannot be trusted
+        """
+        try:
+            await self._verify(body, token)
+        except WebhookVerificationError as e:
+            self.rejected += 1
+            logger.warning(f"Rejected Plaid webhook: {str(e)}")
+            raise
+        self.verified += 1
+
+    async def _verify(self, body: bytes, token: Optional[str]) -> None:
+        if not token:
+            raise WebhookVerificationError("Missing Plaid-Verification header")
+        try:
+            header, _ = python_jwt.process_jwt(token)
+        except Exception as e:
+            raise WebhookVerificationError(f"Malformed Plaid-Verification token: {str(e)}") from e
+        # Plaid only signs with ES256; anything else (including "none") is forged
+        if header.get('alg') != 'ES256' or not header.get('kid'):
+            raise WebhookVerificationError("Plaid-Verification token is not ES256 with a key id")
+
+        key = await self._key(header['kid'])
+        try:
+            _, claims = python_jwt.verify_jwt(token, key, allowed_algs=['ES256'], checks_optional=True)
+        except Exception as e:
+            raise WebhookVerificationError(f"Invalid Plaid-Verification signature: {str(e)}") from e
+
+        if not isinstance(claims.get('iat'), (int, float)) or time.time() - claims['iat'] > self.max_age:
+            raise WebhookVerificationError("Plaid-Verification token is too old")
+        body_hash = hashlib.sha256(body).hexdigest()
+        if not hmac.compare_digest(body_hash, str(claims.get('request_body_sha256', ''))):
+            raise WebhookVerificationError("Webhook body does not match its Plaid-Verification token")
+
+    def stats(self) -> Dict:
+        """Return verification counters for monitoring."""
+        return {
+            'verified': self.verified,
+            'rejected': self.rejected,
+            'key_fetches': self.key_fetches,
+            'throttled': self.throttled,
+            'cached_keys': len(self._keys)
+        }
+
+class MemoryJobQueue:
+    """
+    In-process queue of item ids keyed by the time their sync is due.
+
+    Scheduling an item that already has a pending job is a no-op, so every
+    webhook within the debounce window is served by a single sync.
+    """
+
+    def __init__(self):
+        self._due: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._changed: Optional[asyncio.Event] = None
+        self._claimed: Set[str] = set()
+
+    @property
+    def changed(self) -> asyncio.Event:
+        # Created lazily so the event belongs to the running loop
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        return self._changed
+
+    async def schedule(self, item_id: str, delay: float) -> bool:
+        if item_id in self._due:
+            return False
+        due = time.time() + delay
+        self._due[item_id] = due
+        heapq.heappush(self._heap, (due, item_id))
+        self.changed.set()
+        return True
+
+    async def pop(self) -> str:
+        """Wait for the next due item and take it off the queue."""
+        while True:
+            self.changed.clear()
+            if self._heap:
+                due, item_id = self._heap[0]
+                wait = due - time.time()
+                if wait <= 0:
+                    heapq.heappop(self._heap)
+                    del self._due[item_id]
+                    return item_id
+            else:
+                wait = None
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def claim(self, item_id: str) -> bool:
+        """Mark an item as being synced; False if a worker already holds it."""
+        if item_id in self._claimed:
+            return False
+        self._claimed.add(item_id)
+        return True
+
+    async def release(self, item_id: str) -> None:
+        self._claimed.discard(item_id)
+
+class RedisJobQueue:
+    """
+    Redis sorted set of item ids scored by due time, shared by all workers.
+
+    ZADD NX gives the same debounce as the in-process queue, and a job is
+    taken by whichever worker removes it from the set first. Item claims
+    are expiring keys, so two processes never sync the same item at once
+    and a crashed worker's claim lapses after ``claim_ttl`` seconds.
+    """
+
+    def __init__(self, url: str, namespace: str = 'plaid_sync', poll_interval: float = 0.5, claim_ttl: int = 900):
+        import redis.asyncio as redis
+
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self.poll_interval = poll_interval
+        self.claim_ttl = claim_ttl
+        self._key = f"{namespace}:due"
+
+    async def schedule(self, item_id: str, delay: float) -> bool:
+        return bool(await self.client.zadd(self._key, {item_id: time.time() + delay}, nx=True))
+
+    async def pop(self) -> str:
+        """Poll for the next due item and take it off the queue."""
+        while True:
+            due = await self.client.zrangebyscore(self._key, '-inf', time.time(), start=0, num=1)
+            if due and await self.client.zrem(self._key, due[0]):
+                return due[0].decode()
+            await asyncio.sleep(self.poll_interval)
+
+    async def claim(self, item_id: str) -> bool:
+        return bool(await self.client.set(f"{self.namespace}:claim:{item_id}", 1, nx=True, ex=self.claim_ttl))
+
+    async def release(self, item_id: str) -> None:
+        await self.client.delete(f"{self.namespace}:claim:{item_id}")
+
+class SyncJobQueue:
+    """
+    Background pipeline that turns Plaid webhooks into incremental syncs.
+
+    The webhook endpoint only schedules a job and returns. Jobs are
+    debounced per item: webhooks that arrive before the item's sync starts
+    are folded into it, because one sync pulls everything since the
+    cursor. ``workers`` tasks run the due jobs through ``sync_item``, so
+    Plaid calls, categorization and persistence all stay off the request
+    path. An item is never synced by two workers at once; failed jobs are
+    retried up to ``max_attempts`` times.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        debounce: float = 5.0,
+        retry_delay: float = 60.0,
+        max_attempts: int = 3,
+        redis_url: Optional[str] = None
+    ):
+        """
+        Args:
+            workers: Concurrent sync jobs in this process
+            debounce: Seconds a job waits for further webhooks of its item
+            retry_delay: Seconds before a failed job runs again
+            max_attempts: Attempts per job before it is dropped
+            redis_url: Share the queue through Redis instead of in-process
+        """
+        self.workers = workers
+        self.debounce = debounce
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+
+        self.queue = MemoryJobQueue()
+        if redis_url:
+            try:
+                self.queue = RedisJobQueue(redis_url)
+            except ImportError:
+                logger.warning("REDIS_URL is set but the redis package is not installed; using in-process queue")
+
+        self._tasks: List[asyncio.Task] = []
+        self._attempts: Dict[str, int] = {}
+
+        self.running = 0
+        self.received = 0
+        self.debounced = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        """Start the worker tasks; called on application startup."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def enqueue(self, item_id: str) -> bool:
+        """
+        Schedule a sync of an item after the debounce window.
+
+        Returns:
+            bool: False when the webhook was folded into a pending job
+        """
+        self.start()
+        self.received += 1
+        scheduled = await self.queue.schedule(item_id, self.debounce)
+        if not scheduled:
+            self.debounced += 1
+        return scheduled
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                await self._run_next()
+            except Exception as e:
+                # Keep the worker alive through queue backend outages; only
+                # cancellation on shutdown ends it
+                logger.error(f"Plaid sync queue unavailable: {str(e)}")
+                await asyncio.sleep(self.debounce)
+
+    async def _run_next(self) -> None:
+        item_id = await self.queue.pop()
+        if not await self.queue.claim(item_id):
+            # Another worker is mid-sync; pick up what it misses afterwards
+            await self.queue.schedule(item_id, self.debounce)
+            return
+        self.running += 1
+        try:
+            await self._sync(item_id)
+        finally:
+            self.running -= 1
+            await self.queue.release(item_id)
+
+    async def _sync(self, item_id: str) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                item = await db.get(PlaidItem, item_id)
+                if item is None:
+                    logger.warning(f"Webhook for unregistered Plaid item {item_id}")
+                    return
+                await sync_item(db, item)
+            self.completed += 1
+            self._attempts.pop(item_id, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            attempts = self._attempts.get(item_id, 0) + 1
+            if attempts >= self.max_attempts:
+                self.dropped += 1
+                self._attempts.pop(item_id, None)
+                logger.error(f"Giving up on sync of Plaid item {item_id} after {attempts} attempts: {str(e)}")
+                return
+            self._attempts[item_id] = attempts
+            logger.warning(f"Sync of Plaid item {item_id} failed, retrying in {self.retry_delay}s: {str(e)}")
+            await self.queue.schedule(item_id, self.retry_delay)
+
+    async def close(self) -> None:
+        """Stop the workers; unfinished jobs are synced on the next webhook or manual sync."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict:
+        """Return webhook and job counters for monitoring."""
+        return {
+            'backend': 'redis' if isinstance(self.queue, RedisJobQueue) else 'memory',
+            'workers': len(self._tasks),
+            'running': self.running,
+            'received': self.received,
+            'debounced': self.debounced,
+            'completed': self.completed,
+            'failed': self.failed,
+            'dropped': self.dropped
+        }
+
+# Create singleton instances
+webhook_verifier = WebhookVerifier(
+    plaid_service,
+    max_age=settings.PLAID_WEBHOOK_MAX_AGE_SECONDS,
+    key_cache_seconds=settings.PLAID_WEBHOOK_KEY_CACHE_SECONDS,
+    refused_key_seconds=settings.PLAID_WEBHOOK_REFUSED_KEY_SECONDS,
+    key_fetches_per_minute=settings.PLAID_WEBHOOK_KEY_FETCHES_PER_MINUTE
+)
+
+sync_jobs = SyncJobQueue(
+    workers=settings.PLAID_WEBHOOK_WORKERS,
+    debounce=settings.PLAID_WEBHOOK_DEBOUNCE_SECONDS,
+    retry_delay=settings.PLAID_WEBHOOK_RETRY_SECONDS,
+    max_attempts=settings.PLAID_WEBHOOK_MAX_ATTEMPTS,
+    redis_url=settings.REDIS_URL
+)
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import logging
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?.!]+$')
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return _TRAILING_PUNCTUATION.sub('', _WHITESPACE.sub(' ', prompt.strip().lower()))
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count (~4 characters per token) when usage is not reported."""
+    return sum(len(text) for text in texts) // 4
+
+class MemoryBackend:
+    """
+    In-process LRU of cache entries with per-entry expiry.
+    
+    Single-worker only: entries and user generations live in this process,
+    so ``bump_generation`` does not reach other workers, which keep serving
+    answers computed before the user's transactions changed. Use
+    SQLiteBackend when running more than one worker.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Tuple[float, Dict]] = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, entry: Dict, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, 0)
+
+    def bump_generation(self, user_id: int) -> int:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            return self._generations[user_id]
+
+class SQLiteBackend:
+    """
+    Cache entries in a local SQLite file, shared by workers on one host.
+    
+    Expired rows are removed lazily on read and when the table grows past
+    ``max_entries``.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, entry TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations (user_id INTEGER PRIMARY KEY, generation INTEGER)"
+        )
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, entry FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] < time.time():
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            return json.loads(row[1])
+
+    def set(self, key: str, entry: Dict, ttl: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, expires_at, entry) VALUES (?, ?, ?)",
+                (key, time.time() + ttl, json.dumps(entry))
+            )
+            count = self._conn.execute("SELECT count(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY expires_at LIMIT max(0, (SELECT count(*) FROM responses) - ?))",
+                    (self.max_entries,)
+                )
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT generation FROM generations WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            return row[0] if row else 0
+
+    def bump_generation(self, user_id: int) -> int:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO generations (user_id, generation) VALUES (?, 1) "
+                "ON CONFLICT(user_id) DO UPDATE SET generation = generation + 1",
+                (user_id,)
+            )
+            return self._conn.execute(
+                "SELECT generation FROM generations WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+
+class ResponseCache:
+    """
+    Cache of LLM responses keyed by a hash of the normalized prompt.
+    
+    Budget advice is looked up by exact prompt only: the prompt already
+    embeds the spending summary, so a changed summary is a different key.
+    Chat answers are keyed by the question together with the conversation
+    history sent with it, so a follow-up such as "and last month?" only
+    matches the same follow-up in the same conversation. They are also
+    scoped to the user and to a per-user generation that is bumped whenever
+    the user's transactions change, which orphans every earlier answer.
+    There is no near-duplicate matching: questions that differ only in an
+    amount, a month or a merchant need different answers.
+    """
+
+    def __init__(self, backend, ttl: int = 3600):
+        """
+        Args:
+            backend: MemoryBackend or SQLiteBackend
+            ttl: Seconds a response stays valid
+        """
+        self.backend = backend
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def key(namespace: str, prompt: str, scope: str = '') -> str:
+        """Build a cache key from the namespace, scope and normalized prompt."""
+        digest = hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+        return f"{namespace}:{scope}:{digest}"
+
+    def _hit(self, entry: Dict) -> str:
+        self.hits += 1
+        self.tokens_saved += entry.get('tokens', 0)
+        return entry['response']
+
+    def get_advice(self, prompt: str) -> Optional[str]:
+        """Return cached advice for an identical prompt."""
+        entry = self.backend.get(self.key('advice', prompt))
+        if entry is None:
+            self.misses += 1
+            return None
+        return self._hit(entry)
+
+    def set_advice(self, prompt: str, response: str, tokens: int) -> None:
+        self.backend.set(self.key('advice', prompt), {'response': response, 'tokens': tokens}, self.ttl)
+
+    def chat_key(self, user_id: int, question: str, history: str) -> str:
+        """
+        Key of the answer to a question asked after a history.
+
+        The key pins the user's current generation. Take it once, before
+        the answer is computed, and use it for both the lookup and the
+        store: an answer built while the transactions changed is then
+        stored under the old generation and never served.
+        """
+        generation = self.backend.generation(user_id)
+        return self.key('chat', f"{history}\nHuman: {question}", f"{user_id}:{generation}")
+
+    def get_chat(self, key: str) -> Optional[str]:
+        """Return a cached answer for a key from ``chat_key``."""
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        return self._hit(entry)
+
+    def set_chat(self, key: str, response: str, tokens: int) -> None:
+        self.backend.set(key, {'response': response, 'tokens': tokens}, self.ttl)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop the user's cached chat answers after their transactions changed."""
+        self.backend.bump_generation(user_id)
+
+    def stats(self) -> Dict:
+        """Return hit rate and tokens saved for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'tokens_saved': self.tokens_saved
+        }
+
+def _create_backend():
+    if settings.RESPONSE_CACHE_BACKEND == 'sqlite':
+        return SQLiteBackend(settings.RESPONSE_CACHE_SQLITE_PATH, settings.RESPONSE_CACHE_MAX_ENTRIES)
+    # Gunicorn and uvicorn read the worker count from WEB_CONCURRENCY
+    if int(os.getenv('WEB_CONCURRENCY', '1')) > 1:
+        logger.warning(
+            "RESPONSE_CACHE_BACKEND=memory with several workers: chat answers are not invalidated "
+            "across workers when transactions change; use RESPONSE_CACHE_BACKEND=sqlite"
+        )
+    return MemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+# Create a singleton instance
+response_cache = ResponseCache(
+    _create_backend(),
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,158 @@
+import importlib.util
+import io
+from typing import Dict, List, Optional, Tuple
+import logging
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import Response
+
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = 'application/json'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Low-cardinality columns sent as integer codes plus a dictionary of values
+DICTIONARY_COLUMNS = ('category',)
+
+# Schema metadata key holding the non-tabular fields of an Arrow response
+ARROW_METADATA_KEY = b'finmate'
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+# Arrow and MessagePack are only offered when their optional packages are installed
+SUPPORTED_MEDIA_TYPES = (
+    [JSON_MEDIA_TYPE]
+    + ([ARROW_MEDIA_TYPE] if _installed('pyarrow') else [])
+    + (list(MSGPACK_MEDIA_TYPES) if _installed('msgpack') else [])
+)
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Pick the response media type for an Accept header.
+
+    Media types are ranked by their q value, then by their order in the
+    header. Types whose encoder is not installed are skipped, and JSON is
+    the fallback when nothing acceptable is supported.
+
+    Args:
+        accept: Value of the request's Accept header
+
+    Returns:
+        The chosen media type
+    """
+    ranked: List[Tuple[float, int, str]] = []
+    for position, part in enumerate((accept or '').split(',')):
+        media_type, *params = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        ranked.append((-quality, position, media_type.lower()))
+
+    for negative_quality, _, media_type in sorted(ranked):
+        if negative_quality < 0 and media_type in SUPPORTED_MEDIA_TYPES:
+            return media_type
+    return JSON_MEDIA_TYPE
+
+def encode_columns(frame: pd.DataFrame) -> Dict:
+    """
+    Convert a DataFrame into a column-oriented payload.
+
+    Each column becomes one array instead of each row becoming one object.
+    Columns in DICTIONARY_COLUMNS are sent as integer codes into a list of
+    values under ``dictionaries``; -1 marks a missing value, so clients can
+    rebuild them with ``pd.Categorical.from_codes``. Numeric and datetime
+    columns stay numpy arrays for orjson to serialize without per-value
+    Python objects.
+
+    Args:
+        frame: Transactions to encode
+
+    Returns:
+        Dict with ``length``, ``columns`` and ``dictionaries``
+    """
+    columns = {}
+    dictionaries = {}
+    for name in frame.columns:
+        values = frame[name]
+        if name in DICTIONARY_COLUMNS:
+            codes, uniques = pd.factorize(values)
+            # Codes index the dictionary, so they fit the smallest integer type
+            columns[name] = codes.astype(np.min_scalar_type(-max(len(uniques), 1)))
+            dictionaries[name] = [str(value) for value in uniques]
+        elif pd.api.types.is_datetime64_dtype(values) and not values.hasnans:
+            columns[name] = values.to_numpy()
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            columns[name] = values.to_numpy()
+        else:
+            columns[name] = values.astype(object).where(values.notna(), None).tolist()
+    return {'length': len(frame), 'columns': columns, 'dictionaries': dictionaries}
+
+def decode_columns(payload: Dict) -> pd.DataFrame:
+    """Rebuild a DataFrame from a payload produced by encode_columns."""
+    frame = pd.DataFrame(payload['columns'])
+    for name, values in payload.get('dictionaries', {}).items():
+        frame[name] = pd.Categorical.from_codes(frame[name], categories=values)
+    return frame
+
+def _to_arrow(frame: pd.DataFrame, fields: Dict) -> bytes:
+    """Write frame as an Arrow IPC stream, with fields as JSON schema metadata."""
+    import pyarrow as pa
+
+    frame = frame.astype({name: 'category' for name in DICTIONARY_COLUMNS if name in frame.columns})
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({ARROW_METADATA_KEY: orjson.dumps(fields, default=str)})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def _to_msgpack(payload: Dict, key: str) -> bytes:
+    import msgpack
+
+    def plain(values):
+        # msgpack has no numpy support; datetimes go out as ISO strings like in JSON
+        if isinstance(values, np.ndarray):
+            if values.dtype.kind == 'M':
+                return np.datetime_as_string(values, unit='s').tolist()
+            return values.tolist()
+        return values
+
+    columns = payload[key]['columns']
+    payload[key] = {**payload[key], 'columns': {name: plain(values) for name, values in columns.items()}}
+    return msgpack.packb(payload, default=str)
+
+def transactions_response(accept: Optional[str], frame: pd.DataFrame, key: str = 'transactions', **fields) -> Response:
+    """
+    Build a response carrying a transactions frame and other fields.
+
+    JSON and MessagePack responses hold the fields plus the column-oriented
+    frame under ``key``. Arrow responses are an IPC stream of the frame
+    with categories dictionary-encoded; the other fields are JSON in the
+    schema metadata under ``finmate``.
+
+    Args:
+        accept: Value of the request's Accept header
+        frame: Transactions to send
+        key: Name of the frame in JSON and MessagePack payloads
+        **fields: Other JSON-serializable fields of the response
+
+    Returns:
+        Response in the negotiated media type
+    """
+    media_type = negotiate(accept)
+    if media_type == ARROW_MEDIA_TYPE:
+        content = _to_arrow(frame, fields)
+    else:
+        payload = {**fields, key: encode_columns(frame)}
+        if media_type in MSGPACK_MEDIA_TYPES:
+            content = _to_msgpack(payload, key)
+        else:
+            content = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY, default=str)
+    return Response(content=content, media_type=media_type, headers={'Vary': 'Accept'})
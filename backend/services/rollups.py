@@ -0,0 +1,200 @@
+from datetime import date, datetime
+from typing import Iterable, List, Optional
+import logging
+import pandas as pd
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import MonthlyCategorySpend
+
+logger = logging.getLogger(__name__)
+
+# Stored in place of a missing category, which cannot be part of the primary key
+UNCATEGORIZED = 'Uncategorized'
+
+ROLLUP_COLUMNS = ['month', 'category', 'total', 'count', 'min_amount', 'max_amount']
+
+# First key of the per-user transaction-level advisory lock that serializes
+# rollup deltas and refreshes; the second key is the user id
+ROLLUP_LOCK_NAMESPACE = 0x526F6C6C  # 'Roll'
+
+async def _lock_user_rollups(db: AsyncSession, user_id: int) -> None:
+    """Hold the user's rollup lock until the caller's transaction ends."""
+    await db.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, :user_id)"),
+        {'namespace': ROLLUP_LOCK_NAMESPACE, 'user_id': user_id}
+    )
+
+def build_monthly_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate transactions into per-month, per-category spend.
+    
+    Args:
+        df: DataFrame with columns [date, amount, category] and optionally
+            user_id, which is then kept as the leading key; not modified
+        
+    Returns:
+        DataFrame with columns [month, category, total, count, min_amount, max_amount],
+        where month is the first day of the month
+    """
+    by_user = 'user_id' in df.columns
+    if df.empty:
+        return pd.DataFrame(columns=(['user_id'] if by_user else []) + ROLLUP_COLUMNS)
+    
+    keys = pd.DataFrame({
+        'month': pd.to_datetime(df['date']).dt.to_period('M').dt.to_timestamp(),
+        'category': df['category'].fillna(UNCATEGORIZED) if 'category' in df.columns else UNCATEGORIZED,
+        'amount': df['amount']
+    })
+    group_keys = ['month', 'category']
+    if by_user:
+        keys.insert(0, 'user_id', df['user_id'])
+        group_keys.insert(0, 'user_id')
+    rollup = keys.groupby(group_keys)['amount'].agg(
+        total='sum', count='count', min_amount='min', max_amount='max'
+    )
+    return rollup.reset_index()
+
+async def apply_rollup_delta(db: AsyncSession, user_id: int, inserted: pd.DataFrame) -> None:
+    """
+    Fold newly inserted transactions into the stored rollups.
+    
+    Uses INSERT ... ON CONFLICT DO UPDATE so totals and counts are added to
+    existing rows and min/max are widened, all inside the caller's transaction.
+    Takes the user's rollup lock, so a concurrent refresh either already
+    counts these transactions or runs after this transaction commits.
+    """
+    delta = build_monthly_rollup(inserted)
+    if delta.empty:
+        return
+    
+    await _lock_user_rollups(db, user_id)
+    table = MonthlyCategorySpend.__table__
+    stmt = pg_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.month, table.c.category],
+        set_={
+            'total': table.c.total + stmt.excluded.total,
+            'count': table.c.count + stmt.excluded.count,
+            'min_amount': func.least(table.c.min_amount, stmt.excluded.min_amount),
+            'max_amount': func.greatest(table.c.max_amount, stmt.excluded.max_amount),
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
+    now = datetime.utcnow()
+    records = [
+        {
+            'user_id': user_id,
+            'month': month.date(),
+            'category': category,
+            'total': float(total),
+            'count': int(count),
+            'min_amount': float(min_amount),
+            'max_amount': float(max_amount),
+            'updated_at': now
+        }
+        for month, category, total, count, min_amount, max_amount in delta.itertuples(index=False, name=None)
+    ]
+    await db.execute(stmt, records)
+
+async def refresh_monthly_rollups(
+    db: AsyncSession,
+    user_id: Optional[int] = None,
+    months: Optional[Iterable[date]] = None
+) -> int:
+    """
+    Recompute rollups from the transactions table.
+    
+    Used to backfill history and to repair months after transactions were
+    modified or removed. The caller owns the commit. A single-user refresh
+    holds the user's rollup lock until then, so it cannot interleave with
+    ``apply_rollup_delta``; rows are upserted either way, so a delta that
+    lands between the delete and the insert of an all-users backfill is
+    overwritten rather than failing the refresh with a duplicate key.
+    
+    Args:
+        db: Async database session
+        user_id: Only refresh this user (all users when None)
+        months: Only refresh these months (first day of month); all when None
+        
+    Returns:
+        int: Number of rollup rows written
+    """
+    rollup_filters, source_filters = [], []
+    params = {}
+    if user_id is not None:
+        rollup_filters.append("user_id = :user_id")
+        source_filters.append("user_id = :user_id")
+        params['user_id'] = user_id
+    if months is not None:
+        rollup_filters.append("month = ANY(:months)")
+        source_filters.append("date_trunc('month', date)::date = ANY(:months)")
+        params['months'] = list(months)
+    
+    def where(filters):
+        return f"WHERE {' AND '.join(filters)}" if filters else ""
+    
+    if user_id is not None:
+        await _lock_user_rollups(db, user_id)
+    await db.execute(text(f"DELETE FROM monthly_category_spend {where(rollup_filters)}"), params)
+    result = await db.execute(text(f"""
+        INSERT INTO monthly_category_spend
+            (user_id, month, category, total, count, min_amount, max_amount, updated_at)
+        SELECT user_id, date_trunc('month', date)::date, coalesce(category, '{UNCATEGORIZED}'),
+               sum(amount), count(*), min(amount), max(amount), now()
+        FROM transactions
+        {where(source_filters)}
+        GROUP BY 1, 2, 3
+        ON CONFLICT (user_id, month, category) DO UPDATE SET
+            total = excluded.total,
+            count = excluded.count,
+            min_amount = excluded.min_amount,
+            max_amount = excluded.max_amount,
+            updated_at = excluded.updated_at
+    """), params)
+    return result.rowcount
+
+async def load_monthly_rollup(
+    db: AsyncSession,
+    user_id: int,
+    since: Optional[date] = None
+) -> pd.DataFrame:
+    """
+    Read a user's stored rollups in the same shape as ``build_monthly_rollup``.
+    
+    Args:
+        db: Async database session
+        user_id: Owner of the rollups
+        since: Only months on or after this date
+    """
+    table = MonthlyCategorySpend.__table__
+    stmt = select(*[table.c[column] for column in ROLLUP_COLUMNS]).where(table.c.user_id == user_id)
+    if since is not None:
+        stmt = stmt.where(table.c.month >= since)
+    
+    rows = (await db.execute(stmt.order_by(table.c.month))).all()
+    rollup = pd.DataFrame(rows, columns=ROLLUP_COLUMNS)
+    rollup['month'] = pd.to_datetime(rollup['month'])
+    return rollup
+
+async def load_monthly_rollups(
+    db: AsyncSession,
+    user_ids: List[int],
+    since: Optional[date] = None
+) -> pd.DataFrame:
+    """
+    Read the stored rollups of several users in one query.
+    
+    Returns the ``load_monthly_rollup`` shape with a leading user_id column.
+    """
+    table = MonthlyCategorySpend.__table__
+    columns = ['user_id'] + ROLLUP_COLUMNS
+    stmt = select(*[table.c[column] for column in columns]).where(table.c.user_id.in_(user_ids))
+    if since is not None:
+        stmt = stmt.where(table.c.month >= since)
+    
+    rows = (await db.execute(stmt.order_by(table.c.user_id, table.c.month))).all()
+    rollup = pd.DataFrame(rows, columns=columns)
+    rollup['month'] = pd.to_datetime(rollup['month'])
+    return rollup
+
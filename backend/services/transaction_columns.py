@@ -0,0 +1,259 @@
+import io
+import os
+import tempfile
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from .rollups import build_monthly_rollup, load_monthly_rollups
+
+logger = logging.getLogger(__name__)
+
+# Columns that can be loaded and the dtypes they are returned with
+COLUMN_TYPES = {
+    'id': 'int64',
+    'user_id': 'int64',
+    'date': 'datetime64[ns]',
+    'description': 'object',
+    'amount': 'float64',
+    'category': 'category',
+}
+
+DEFAULT_COLUMNS = ('user_id', 'date', 'amount', 'category')
+
+# NULL marker in COPY output; the only value read back as missing, so
+# descriptions like "NA" or "null" stay strings
+COPY_NULL = '\\N'
+
+def _empty_frame(columns: Sequence[str]) -> pd.DataFrame:
+    return pd.DataFrame({column: pd.Series(dtype=COLUMN_TYPES[column]) for column in columns})
+
+async def load_transaction_columns(
+    db: AsyncSession,
+    user_ids: Iterable[int],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    columns: Sequence[str] = DEFAULT_COLUMNS,
+    per_user_since: Optional[Dict[int, datetime]] = None
+) -> pd.DataFrame:
+    """
+    Load users' transactions as typed columns without building ORM objects.
+
+    On asyncpg the rows are streamed with ``COPY (SELECT ...) TO STDOUT``
+    and parsed by pandas' C reader, so no Python object is created per row
+    or per value; other drivers fall back to a plain SELECT. Categories
+    come back dictionary-encoded as a pandas Categorical.
+
+    Args:
+        db: Async database session
+        user_ids: Owners of the transactions
+        since: Only transactions on or after this time
+        until: Only transactions before this time
+        columns: Columns to load, from COLUMN_TYPES
+        per_user_since: Overrides ``since`` for individual users
+
+    Returns:
+        DataFrame with the requested columns, in (user_id, date) order
+    """
+    unknown = set(columns) - set(COLUMN_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown transaction columns: {sorted(unknown)}")
+    user_ids = list(user_ids)
+    if not user_ids:
+        return _empty_frame(columns)
+
+    # Each user gets its own lower bound, so one statement serves users
+    # whose history partly comes from a snapshot
+    per_user_since = per_user_since or {}
+    lower_bounds = [per_user_since.get(user_id, since) or datetime.min for user_id in user_ids]
+    filters = ["t.date >= b.since"]
+    args = [user_ids, lower_bounds]
+    if until is not None:
+        args.append(until)
+        filters.append(f"t.date < CAST(${len(args)} AS timestamp)")
+
+    select_list = ', '.join(f"t.{column}" for column in columns)
+    sql = (
+        f"SELECT {select_list} FROM transactions t "
+        f"JOIN unnest(CAST($1 AS integer[]), CAST($2 AS timestamp[])) AS b(user_id, since) ON t.user_id = b.user_id "
+        f"WHERE {' AND '.join(filters)} ORDER BY t.user_id, t.date"
+    )
+
+    conn = await db.connection()
+    if conn.dialect.driver == 'asyncpg':
+        raw = await conn.get_raw_connection()
+        buffer = io.BytesIO()
+        await raw.driver_connection.copy_from_query(
+            sql, *args, output=buffer, format='csv', header=True, null=COPY_NULL
+        )
+        buffer.seek(0)
+        frame = pd.read_csv(
+            buffer,
+            dtype={column: COLUMN_TYPES[column] for column in columns if column != 'date'},
+            keep_default_na=False,
+            na_values=[COPY_NULL]
+        )
+        if 'date' in columns:
+            # Postgres writes ISO timestamps; naming the format skips per-value inference
+            frame['date'] = pd.to_datetime(frame['date'], format='ISO8601')
+    else:
+        # Positional $n parameters become named binds for other drivers;
+        # casts are spelled CAST(... AS ...) since text() would read "::" after a bind
+        named = sql
+        for position in range(len(args), 0, -1):
+            named = named.replace(f"${position}", f":p{position}")
+        result = await db.execute(text(named), {f"p{i + 1}": value for i, value in enumerate(args)})
+        frame = pd.DataFrame(result.all(), columns=list(columns))
+
+    return frame.astype({column: COLUMN_TYPES[column] for column in columns})
+
+class TransactionSnapshots:
+    """
+    Per-user Parquet snapshots of transactions in closed months.
+
+    History before the current month rarely changes, so analytics that read
+    years of transactions take it from a local Parquet file and only query
+    the database for the current month. Snapshots need no invalidation
+    hooks: before use, each one is checked against the monthly rollups,
+    which every write path updates in its own transaction. A snapshot whose
+    per-month, per-category counts or totals disagree with the rollups, or
+    that predates the current month, is rebuilt from the database. Without
+    a directory or without pyarrow installed, every read goes to the
+    database.
+    """
+
+    COLUMNS = ('user_id', 'date', 'description', 'amount', 'category')
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Args:
+            root: Directory holding the snapshot files; disabled when None
+        """
+        self.root = root
+        self.enabled = False
+        if root:
+            try:
+                import pyarrow.parquet  # noqa: F401
+                os.makedirs(root, exist_ok=True)
+                self.enabled = True
+            except ImportError:
+                logger.warning("TRANSACTION_SNAPSHOT_DIR is set but pyarrow is not installed; snapshots disabled")
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.writes = 0
+
+    def _path(self, user_id: int) -> str:
+        return os.path.join(self.root, f"user_{user_id}.parquet")
+
+    def _read(self, user_id: int) -> Optional[Tuple[pd.DataFrame, datetime]]:
+        """Read a user's snapshot and the date it runs through."""
+        import pyarrow.parquet as pq
+
+        try:
+            table = pq.read_table(self._path(user_id))
+        except FileNotFoundError:
+            return None
+        through = datetime.fromisoformat(table.schema.metadata[b'through'].decode())
+        return table.to_pandas(), through
+
+    def _write(self, user_id: int, frame: pd.DataFrame, through: datetime) -> None:
+        """Atomically replace a user's snapshot with frame, covering dates before through."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'through': through.isoformat().encode()})
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, self._path(user_id))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.writes += 1
+
+    async def _disagreeing_users(self, db: AsyncSession, snapshots: Dict[int, pd.DataFrame], through: datetime) -> set:
+        """Users whose snapshot no longer matches their stored rollups."""
+        frozen = pd.concat(snapshots.values(), ignore_index=True).astype({'category': object})
+        expected = build_monthly_rollup(frozen)
+        stored = await load_monthly_rollups(db, list(snapshots))
+        stored = stored[stored['month'] < through]
+
+        merged = expected.merge(
+            stored, on=['user_id', 'month', 'category'], how='outer', suffixes=('_snapshot', '_stored')
+        )
+        disagree = (
+            merged['count_snapshot'].isna() | merged['count_stored'].isna()
+            | (merged['count_snapshot'] != merged['count_stored'])
+            | ~np.isclose(merged['total_snapshot'].astype(float), merged['total_stored'].astype(float))
+        )
+        return set(merged.loc[disagree, 'user_id'].astype(int))
+
+    async def load(self, db: AsyncSession, user_ids: Iterable[int], since: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Load users' transactions since a date, reading closed months from snapshots.
+
+        Users without a valid snapshot have their whole history read in the
+        same query as everyone else's current month, and their closed
+        months are written as a new snapshot.
+
+        Args:
+            db: Async database session
+            user_ids: Owners of the transactions
+            since: Only transactions on or after this time
+
+        Returns:
+            DataFrame with columns [user_id, date, description, amount, category]
+        """
+        user_ids = list(user_ids)
+        if not self.enabled:
+            return await load_transaction_columns(db, user_ids, since=since, columns=self.COLUMNS)
+
+        current_month = datetime.combine(date.today().replace(day=1), datetime.min.time())
+        snapshots: Dict[int, pd.DataFrame] = {}
+        for user_id in user_ids:
+            snapshot = self._read(user_id)
+            if snapshot is not None and snapshot[1] == current_month:
+                snapshots[user_id] = snapshot[0]
+        if snapshots:
+            for user_id in await self._disagreeing_users(db, snapshots, current_month):
+                del snapshots[user_id]
+                self.stale += 1
+        rebuild = [user_id for user_id in user_ids if user_id not in snapshots]
+        self.hits += len(snapshots)
+        self.misses += len(rebuild)
+
+        per_user_since = {user_id: max(current_month, since or current_month) for user_id in snapshots}
+        per_user_since.update({user_id: datetime.min for user_id in rebuild})
+        recent = await load_transaction_columns(
+            db, user_ids, columns=self.COLUMNS, per_user_since=per_user_since
+        )
+        if rebuild:
+            histories = dict(tuple(recent[recent['date'] < current_month].groupby('user_id')))
+            for user_id in rebuild:
+                self._write(user_id, histories.get(user_id, recent.iloc[0:0]), current_month)
+
+        frame = pd.concat(list(snapshots.values()) + [recent], ignore_index=True)
+        if since is not None:
+            frame = frame[frame['date'] >= since]
+        return frame.astype({'category': 'category'}).sort_values(['user_id', 'date'], kind='stable', ignore_index=True)
+
+    def stats(self) -> Dict:
+        """Return snapshot counters for monitoring."""
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'writes': self.writes
+        }
+
+# Create a singleton instance
+transaction_snapshots = TransactionSnapshots(settings.TRANSACTION_SNAPSHOT_DIR)
@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Sequence, Tuple
+import logging
+import pandas as pd
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Fields GET /transactions can return
+QUERY_FIELDS = {
+    'id': Transaction.id,
+    'date': Transaction.date,
+    'description': Transaction.description,
+    'amount': Transaction.amount,
+    'category': Transaction.category,
+    'account_id': Transaction.account_id,
+    'plaid_transaction_id': Transaction.plaid_transaction_id,
+}
+
+DEFAULT_FIELDS = ('id', 'date', 'description', 'amount', 'category')
+
+def encode_cursor(position: Tuple[datetime, int]) -> str:
+    """Encode the (date, id) of the last returned transaction as an opaque token."""
+    payload = json.dumps([position[0].isoformat(), position[1]]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a token produced by encode_cursor.
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        when, transaction_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(when), int(transaction_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+async def query_transactions(
+    db: AsyncSession,
+    user_id: int,
+    fields: Sequence[str] = DEFAULT_FIELDS,
+    category: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    newest_first: bool = True
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Return one page of a user's transactions with keyset pagination.
+
+    Pages are ordered by (date, id) and continue after the position in the
+    cursor, so every page is one range scan of the (user_id, date, id) or
+    (user_id, category, date, id) index however deep it is; no rows are
+    skipped with OFFSET.
+
+    Args:
+        db: Async database session
+        user_id: Owner of the transactions
+        fields: Fields to return, from QUERY_FIELDS
+        category: Only transactions in this category
+        start_date: Only transactions on or after this day
+        end_date: Only transactions on or before this day
+        min_amount: Only transactions with at least this amount
+        max_amount: Only transactions with at most this amount
+        limit: Maximum transactions in the page
+        cursor: Token from the previous page, None for the first page
+        newest_first: Order by descending (date, id) instead of ascending
+
+    Returns:
+        Tuple of the page as a DataFrame with the requested fields and the
+        cursor of the next page (None on the last page)
+
+    Raises:
+        ValueError: On unknown fields or a malformed cursor
+    """
+    fields = list(dict.fromkeys(fields))
+    unknown = set(fields) - set(QUERY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown transaction fields: {sorted(unknown)}")
+
+    # The keyset columns are always read; they are only returned when requested
+    selected = list(dict.fromkeys(['date', 'id'] + fields))
+    stmt = select(*(QUERY_FIELDS[field] for field in selected)).where(Transaction.user_id == user_id)
+
+    if category is not None:
+        stmt = stmt.where(Transaction.category == category)
+    if start_date is not None:
+        stmt = stmt.where(Transaction.date >= datetime.combine(start_date, time.min))
+    if end_date is not None:
+        stmt = stmt.where(Transaction.date < datetime.combine(end_date + timedelta(days=1), time.min))
+    if min_amount is not None:
+        stmt = stmt.where(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        stmt = stmt.where(Transaction.amount <= max_amount)
+
+    keyset = tuple_(Transaction.date, Transaction.id)
+    if cursor is not None:
+        position = tuple_(*decode_cursor(cursor))
+        stmt = stmt.where(keyset < position if newest_first else keyset > position)
+    if newest_first:
+        stmt = stmt.order_by(Transaction.date.desc(), Transaction.id.desc())
+    else:
+        stmt = stmt.order_by(Transaction.date, Transaction.id)
+
+    # One extra row tells whether another page follows
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor((rows[-1].date, rows[-1].id))
+
+    page = pd.DataFrame(rows, columns=selected)
+    return page[fields], next_cursor
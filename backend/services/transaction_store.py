@@ -0,0 +1,311 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+import logging
+import pandas as pd
+from sqlalchemy import DateTime, Float, String, bindparam, delete, event, text
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Transaction
+from .response_cache import response_cache
+from .rollups import apply_rollup_delta, refresh_monthly_rollups
+
+logger = logging.getLogger(__name__)
+
+# Rows handed to each executemany call
+INSERT_BATCH_SIZE = 5000
+
+# Above this many rows, asyncpg connections load through COPY instead of INSERT
+COPY_THRESHOLD = 20_000
+
+# Natural key used to make re-uploads idempotent; it covers statement rows only
+NATURAL_KEY = ['user_id', 'date', 'amount', 'description_hash']
+
+# Key of transactions that come from Plaid sync (date is part of it for partitioning)
+PLAID_KEY = ['user_id', 'plaid_transaction_id', 'date']
+
+COLUMNS = ['user_id', 'date', 'description', 'amount', 'category', 'description_hash', 'created_at']
+
+# Columns of newly inserted rows handed to the rollup maintenance
+RETURNED_COLUMNS = ['date', 'amount', 'category']
+
+# Extra columns stored for transactions that come from Plaid sync
+PLAID_COLUMNS = ['plaid_transaction_id', 'meta']
+
+# Columns a re-delivered Plaid transaction overwrites
+PLAID_UPDATED_COLUMNS = ['description', 'amount', 'category', 'description_hash', 'meta']
+
+def invalidate_on_commit(db: AsyncSession, user_id: int) -> None:
+    """
+    Drop the user's cached chat answers once the session commits.
+
+    Bumping the cache generation before the commit would let a chat request
+    read the new generation with the old data and cache a stale answer
+    under it; a rollback drops the pending bump instead.
+    """
+    pending = db.info.get('invalidate_users')
+    if pending is None:
+        pending = db.info['invalidate_users'] = set()
+
+        def after_commit(session):
+            for pending_user in sorted(pending):
+                response_cache.invalidate_user(pending_user)
+            pending.clear()
+
+        def after_rollback(session):
+            pending.clear()
+
+        event.listen(db.sync_session, 'after_commit', after_commit)
+        event.listen(db.sync_session, 'after_rollback', after_rollback)
+    pending.add(user_id)
+
+def description_hashes(descriptions: pd.Series) -> pd.Series:
+    """
+    SHA-256 hex digests of descriptions, matching the SQL backfill in the
+    natural key migration. Each distinct description is hashed once.
+    """
+    codes, uniques = pd.factorize(descriptions.fillna(''))
+    digests = [hashlib.sha256(str(value).encode('utf-8')).hexdigest() for value in uniques]
+    return pd.Series(pd.Index(digests).take(codes), index=descriptions.index)
+
+def _to_frame(user_id: int, df: pd.DataFrame) -> pd.DataFrame:
+    """Convert a categorized DataFrame into Transaction rows."""
+    # amount and date are NOT NULL; rows that failed to parse are skipped
+    df = df.dropna(subset=['date', 'amount'])
+    rows = pd.DataFrame({
+        'user_id': user_id,
+        'date': pd.to_datetime(df['date']),
+        'description': df['description'],
+        'amount': df['amount'].astype(float),
+        'category': df['category'] if 'category' in df.columns else None,
+        'description_hash': description_hashes(df['description']),
+        'created_at': datetime.utcnow()
+    }, columns=COLUMNS)
+    
+    # Missing text values must reach the driver as NULL rather than NaN
+    text_columns = ['description', 'category']
+    rows[text_columns] = rows[text_columns].astype(object).where(rows[text_columns].notna(), None)
+    return rows
+
+async def bulk_insert_transactions(db: AsyncSession, user_id: int, df: pd.DataFrame) -> int:
+    """
+    Insert categorized transactions for a user, skipping ones already stored.
+
+    Rows are deduplicated on (user_id, date, amount, description_hash), so
+    uploading the same statement twice stores it once, and rows already
+    stored through Plaid sync are skipped the same way. Small loads use
+    batched multi-row INSERT ... ON CONFLICT DO NOTHING; large loads on
+    asyncpg are streamed with COPY into a staging table first. The monthly
+    category rollups are updated in the same transaction.
+
+    Args:
+        db: Async database session; the caller owns the commit
+        user_id: Owner of the transactions
+        df: DataFrame with columns [date, description, amount, category]
+
+    Returns:
+        int: Number of new rows inserted
+    """
+    rows = _to_frame(user_id, df)
+    rows = rows[~await _matches_plaid_rows(db, user_id, rows)]
+    if rows.empty:
+        return 0
+
+    if len(rows) >= COPY_THRESHOLD and db.get_bind().dialect.driver == 'asyncpg':
+        inserted = await _copy_insert(db, rows)
+    else:
+        inserted = await _values_insert(db, rows)
+
+    # Keep the monthly rollups in step with exactly the rows that were new
+    inserted_frame = pd.DataFrame(inserted, columns=RETURNED_COLUMNS)
+    await apply_rollup_delta(db, user_id, inserted_frame)
+    if inserted:
+        # Cached chat answers may quote the old numbers
+        invalidate_on_commit(db, user_id)
+
+    logger.info(f"Stored {len(inserted)} of {len(rows)} transactions for user {user_id}")
+    return len(inserted)
+
+async def _values_insert(db: AsyncSession, rows: pd.DataFrame) -> List[Tuple]:
+    """Insert rows with batched multi-row INSERT ... ON CONFLICT DO NOTHING."""
+    records = rows.to_dict(orient='records')
+    table = Transaction.__table__
+    # executemany with RETURNING is batched by SQLAlchemy into multi-row VALUES
+    # statements, and only rows that were actually inserted come back
+    stmt = (
+        pg_insert(table)
+        .on_conflict_do_nothing(index_elements=NATURAL_KEY, index_where=table.c.plaid_transaction_id.is_(None))
+        .returning(*[table.c[column] for column in RETURNED_COLUMNS])
+    )
+    inserted = []
+    for start in range(0, len(records), INSERT_BATCH_SIZE):
+        result = await db.execute(stmt, records[start:start + INSERT_BATCH_SIZE])
+        inserted.extend(result.all())
+    return inserted
+
+async def _copy_insert(db: AsyncSession, rows: pd.DataFrame) -> List[Tuple]:
+    """COPY rows into a temporary staging table, then merge them in one statement."""
+    # Executed through the session so it runs inside the session's transaction
+    await db.execute(text("""
+        CREATE TEMP TABLE IF NOT EXISTS transactions_staging (
+            user_id integer, date timestamp, description varchar, amount double precision,
+            category varchar, description_hash varchar, created_at timestamp
+        ) ON COMMIT DROP
+    """))
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    driver = raw.driver_connection
+
+    records = [
+        (user_id, date.to_pydatetime(), description, amount, category, digest, created_at.to_pydatetime())
+        for user_id, date, description, amount, category, digest, created_at
+        in rows.itertuples(index=False, name=None)
+    ]
+    await driver.copy_records_to_table('transactions_staging', records=records, columns=COLUMNS)
+
+    column_list = ', '.join(COLUMNS)
+    result = await db.execute(text(f"""
+        INSERT INTO transactions ({column_list})
+        SELECT {column_list} FROM transactions_staging
+        ON CONFLICT ({', '.join(NATURAL_KEY)}) WHERE plaid_transaction_id IS NULL DO NOTHING
+        RETURNING {', '.join(RETURNED_COLUMNS)}
+    """))
+    inserted = result.all()
+    await db.execute(text("TRUNCATE transactions_staging"))
+    return inserted
+
+def _key_arrays(rows: pd.DataFrame) -> Dict[str, list]:
+    """Natural key columns of rows as array parameters for unnest()."""
+    return {
+        'dates': [value.to_pydatetime() for value in rows['date']],
+        'amounts': rows['amount'].tolist(),
+        'hashes': rows['description_hash'].tolist()
+    }
+
+async def _matches_plaid_rows(db: AsyncSession, user_id: int, rows: pd.DataFrame) -> pd.Series:
+    """Mask of statement rows whose natural key a Plaid transaction already has."""
+    if rows.empty:
+        return pd.Series(False, index=rows.index)
+    stmt = text("""
+        SELECT DISTINCT k.position - 1
+        FROM unnest(:dates, :amounts, :hashes) WITH ORDINALITY AS k(date, amount, description_hash, position)
+        JOIN transactions t ON t.user_id = :user_id AND t.plaid_transaction_id IS NOT NULL
+            AND t.date = k.date AND t.amount = k.amount AND t.description_hash = k.description_hash
+    """).bindparams(
+        bindparam('dates', type_=ARRAY(DateTime)),
+        bindparam('amounts', type_=ARRAY(Float)),
+        bindparam('hashes', type_=ARRAY(String))
+    )
+    result = await db.execute(stmt, {'user_id': user_id, **_key_arrays(rows)})
+    matched = pd.Series(False, index=rows.index)
+    matched.iloc[result.scalars().all()] = True
+    return matched
+
+async def _adopt_statement_rows(db: AsyncSession, user_id: int, rows: pd.DataFrame) -> List[str]:
+    """
+    Attach Plaid ids to stored statement rows that match Plaid rows on the natural key.
+
+    The statement row stays (with its category) instead of being stored a
+    second time, and later modified and removed events for the Plaid id
+    apply to it. Each statement row is claimed by one Plaid transaction.
+
+    Returns:
+        Plaid ids that were attached to an existing row
+    """
+    stmt = text("""
+        UPDATE transactions t
+        SET plaid_transaction_id = k.plaid_transaction_id, meta = k.meta::json
+        FROM unnest(:dates, :amounts, :hashes, :plaid_ids, :metas)
+            AS k(date, amount, description_hash, plaid_transaction_id, meta)
+        WHERE t.user_id = :user_id AND t.plaid_transaction_id IS NULL
+            AND t.date = k.date AND t.amount = k.amount AND t.description_hash = k.description_hash
+        RETURNING k.plaid_transaction_id
+    """).bindparams(
+        bindparam('dates', type_=ARRAY(DateTime)),
+        bindparam('amounts', type_=ARRAY(Float)),
+        bindparam('hashes', type_=ARRAY(String)),
+        bindparam('plaid_ids', type_=ARRAY(String)),
+        bindparam('metas', type_=ARRAY(String))
+    )
+    result = await db.execute(stmt, {
+        'user_id': user_id,
+        **_key_arrays(rows),
+        'plaid_ids': rows['plaid_transaction_id'].tolist(),
+        'metas': [json.dumps(meta) for meta in rows['meta']]
+    })
+    return result.scalars().all()
+
+async def apply_plaid_changes(
+    db: AsyncSession,
+    user_id: int,
+    upserts: pd.DataFrame,
+    removed_ids: Sequence[str]
+) -> Dict[str, int]:
+    """
+    Apply one page of Plaid sync deltas to a user's transactions.
+
+    Modified and removed transactions are deleted by Plaid id in one
+    statement, then added and modified ones are inserted in batches. A
+    modified transaction is therefore replaced rather than updated, which
+    keeps replays of a page idempotent. Plaid rows are keyed on their Plaid
+    id, so distinct transactions that share a date, amount and name are all
+    stored; one that matches an uploaded statement row on the natural key
+    takes that row over instead of duplicating it. Rollups are recomputed
+    for every month that lost or gained a row. The caller owns the commit.
+
+    Args:
+        db: Async database session
+        user_id: Owner of the Plaid item
+        upserts: Added and modified transactions with columns
+            [date, description, amount, category, plaid_transaction_id, meta]
+        removed_ids: Plaid ids of removed transactions
+
+    Returns:
+        Dict with the number of rows deleted, inserted and matched to
+        statement rows
+    """
+    # A page lists each transaction once, but guard against replays that
+    # repeat an id or remove one that was also upserted
+    upserts = upserts.drop_duplicates('plaid_transaction_id', keep='last')
+    upserts = upserts[~upserts['plaid_transaction_id'].isin(removed_ids)]
+    rows = _to_frame(user_id, upserts)
+    rows[PLAID_COLUMNS] = upserts.loc[rows.index, PLAID_COLUMNS]
+    replaced_ids = list(removed_ids) + rows['plaid_transaction_id'].tolist()
+
+    table = Transaction.__table__
+    deleted = []
+    if replaced_ids:
+        result = await db.execute(
+            delete(table)
+            .where(table.c.user_id == user_id, table.c.plaid_transaction_id.in_(replaced_ids))
+            .returning(table.c.date)
+        )
+        deleted = result.scalars().all()
+
+    matched = []
+    if not rows.empty:
+        matched = await _adopt_statement_rows(db, user_id, rows)
+        rows = rows[~rows['plaid_transaction_id'].isin(matched)]
+
+    inserted = []
+    if not rows.empty:
+        # This page's ids were deleted above, so a conflict means a concurrent
+        # sync of the item stored the transaction first; the later copy wins
+        stmt = pg_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=PLAID_KEY,
+            index_where=table.c.plaid_transaction_id.isnot(None),
+            set_={column: stmt.excluded[column] for column in PLAID_UPDATED_COLUMNS}
+        ).returning(table.c.date)
+        records = rows.to_dict(orient='records')
+        for start in range(0, len(records), INSERT_BATCH_SIZE):
+            result = await db.execute(stmt, records[start:start + INSERT_BATCH_SIZE])
+            inserted.extend(result.scalars().all())
+
+    months = {value.date().replace(day=1) for value in deleted + inserted}
+    if months:
+        await refresh_monthly_rollups(db, user_id, months=sorted(months))
+        invalidate_on_commit(db, user_id)
+
+    return {'deleted': len(deleted), 'inserted': len(inserted), 'matched': len(matched)}
@@ -1,42 +1,88 @@
+import json
+
 import streamlit as st
 import requests
 import pandas as pd
 
+API_URL = "http://localhost:8001"
+
+def iter_events(response):
+    """Yield (event, data) pairs from a server-sent event stream."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+def decode_transactions(payload):
+    """Rebuild a DataFrame from the API's column-oriented transactions payload."""
+    df = pd.DataFrame(payload["columns"])
+    for name, values in payload.get("dictionaries", {}).items():
+        # Dictionary-encoded columns arrive as integer codes; -1 means missing
+        df[name] = pd.Categorical.from_codes(df[name], categories=values)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    return df
+
+def iter_tokens(events):
+    """Yield advice text from token events until the stream finishes."""
+    for event, data in events:
+        if event == "token":
+            yield data
+        elif event == "error":
+            st.error(f"⚠️ Error: {data.get('detail', 'Unknown issue')}")
+            return
+        elif event == "done":
+            return
+
 st.title("FinMateAI – Upload Bank Statement")
 
 uploaded = st.file_uploader("Choose a PDF or CSV file")
 
 if uploaded:
-    with st.spinner("Analyzing your statement..."):
-        response = requests.post(
-            "http://localhost:8001/analyze/",
-            files={"file": (uploaded.name, uploaded.getvalue())}
-        )
-
     try:
-        response_json = response.json()
+        with st.spinner("Analyzing your statement..."):
+            response = requests.post(
+                f"{API_URL}/analyze/stream",
+                files={"file": (uploaded.name, uploaded.getvalue())},
+                stream=True
+            )
 
-        if "transactions" in response_json:
-            df = pd.DataFrame(response_json["transactions"])
+        if response.status_code != 200:
+            st.error(f"⚠️ Error: {response.json().get('detail', 'Unknown issue')}")
+            st.stop()
 
-            st.success("✅ Statement processed successfully.")
-            st.subheader("📄 Transaction Breakdown")
-            st.dataframe(df)
+        events = iter_events(response)
+        for event, data in events:
+            if event == "transactions":
+                df = decode_transactions(data)
 
-            # Safety check for expected columns
-            if "Category" not in df.columns or "Amount" not in df.columns:
-                st.error("❗ Missing expected 'Category' or 'Amount' column.")
-                st.stop()
+                st.success("✅ Statement processed successfully.")
+                st.subheader("📄 Transaction Breakdown")
+                st.dataframe(df)
 
-            st.subheader("📊 Spending by Category")
-            st.bar_chart(df.groupby("Category")["Amount"].sum().abs())
+                # Safety check for expected columns
+                if "category" not in df.columns or "amount" not in df.columns:
+                    st.error("❗ Missing expected 'category' or 'amount' column.")
+                    st.stop()
 
-            st.subheader("💡 Personalized Budget Advice")
-            st.markdown(response_json["advice"])
+                st.subheader("📊 Spending by Category")
+                st.bar_chart(df.groupby("category", observed=True)["amount"].sum().abs())
 
-        else:
-            st.error(f"⚠️ Error: {response_json.get('error', 'Unknown issue')}")
+            elif event == "summary":
+                # Advice tokens follow the summary; render them as they arrive
+                st.subheader("💡 Personalized Budget Advice")
+                st.write_stream(iter_tokens(events))
+                break
+
+            elif event == "error":
+                st.error(f"⚠️ Error: {data.get('detail', 'Unknown issue')}")
+                break
 
     except Exception as e:
         st.error(f"❌ Something went wrong: {str(e)}")
-
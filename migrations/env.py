@@ -1,3 +1,5 @@
+import os
+import sys
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -14,6 +16,9 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Make migration_helpers importable from the revision scripts
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -0,0 +1,19 @@
+"""Helpers shared by migration scripts.
+
+``env.py`` puts this directory on ``sys.path``, so revisions import it as
+``migration_helpers``. Revision files cannot live next to it in
+``versions/``: Alembic loads every module there as a revision.
+"""
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
+
+
+def transactions_partitioned(bind: Connection) -> bool:
+    """Whether transactions is a partitioned table (0002 with FINMATE_PARTITION_TRANSACTIONS=1).
+
+    Read from the catalog rather than inferred from the leftover
+    ``transactions_unpartitioned`` copy, which operators may drop.
+    """
+    return bool(bind.execute(sa.text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('transactions')"
+    )).scalar())
@@ -0,0 +1,49 @@
+"""transaction natural key and account link
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('transactions', sa.Column('account_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_transactions_account_id', 'transactions', 'accounts', ['account_id'], ['id']
+    )
+
+    op.add_column('transactions', sa.Column('description_hash', sa.String(length=64), nullable=True))
+    # Must match services.transaction_store.description_hashes
+    op.execute(
+        "UPDATE transactions "
+        "SET description_hash = encode(sha256(convert_to(coalesce(description, ''), 'UTF8')), 'hex')"
+    )
+    # Keep the oldest copy of rows stored more than once before enforcing the key
+    op.execute(
+        "DELETE FROM transactions a USING transactions b "
+        "WHERE a.id > b.id AND a.user_id = b.user_id AND a.date = b.date "
+        "AND a.amount = b.amount AND a.description_hash = b.description_hash"
+    )
+    op.create_unique_constraint(
+        'uq_transactions_natural_key', 'transactions',
+        ['user_id', 'date', 'amount', 'description_hash']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_transactions_natural_key', 'transactions', type_='unique')
+    op.drop_column('transactions', 'description_hash')
+    op.drop_constraint('fk_transactions_account_id', 'transactions', type_='foreignkey')
+    op.drop_column('transactions', 'account_id')
@@ -0,0 +1,144 @@
+"""transaction access-path indexes and optional monthly partitioning
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+Set FINMATE_PARTITION_TRANSACTIONS=1 to also convert the transactions table
+into a table range-partitioned by month on ``date``. The original table is
+kept as ``transactions_unpartitioned`` until it is dropped by hand. The
+downgrade copies the partitioned table's rows back into it, recreating it
+if it was dropped.
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migration_helpers import transactions_partitioned
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Monthly partitions created ahead of the current month; later rows land in the default partition
+PARTITION_MONTHS_AHEAD = 24
+
+
+def _create_indexes(concurrently: bool) -> None:
+    # The natural key index already leads with (user_id, date); including the
+    # projected columns here lets date-range reads skip the heap entirely
+    op.create_index(
+        'ix_transactions_user_date', 'transactions', ['user_id', 'date'],
+        postgresql_include=['amount', 'category'],
+        postgresql_concurrently=concurrently
+    )
+    # Covers the per-category sum(amount) queries without touching the heap
+    op.create_index(
+        'ix_transactions_user_category_date', 'transactions', ['user_id', 'category', 'date'],
+        postgresql_include=['amount'],
+        postgresql_concurrently=concurrently
+    )
+
+
+def _partition_by_month() -> None:
+    op.execute(
+        "CREATE TABLE transactions_partitioned "
+        "(LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (date)"
+    )
+    # Unique constraints on a partitioned table must include the partition key
+    op.execute("ALTER TABLE transactions_partitioned ADD PRIMARY KEY (id, date)")
+    op.execute(
+        "ALTER TABLE transactions_partitioned ADD CONSTRAINT uq_transactions_natural_key_p "
+        "UNIQUE (user_id, date, amount, description_hash)"
+    )
+    op.execute("""
+        DO $$
+        DECLARE
+            month date := coalesce(
+                (SELECT date_trunc('month', min(date))::date FROM transactions),
+                date_trunc('month', now())::date
+            );
+            last_month date := (date_trunc('month', now()) + interval '%d months')::date;
+        BEGIN
+            WHILE month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %%I PARTITION OF transactions_partitioned FOR VALUES FROM (%%L) TO (%%L)',
+                    'transactions_' || to_char(month, 'YYYY_MM'), month, month + interval '1 month'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$
+    """ % PARTITION_MONTHS_AHEAD)
+    op.execute("CREATE TABLE transactions_default PARTITION OF transactions_partitioned DEFAULT")
+
+    op.execute("INSERT INTO transactions_partitioned SELECT * FROM transactions")
+
+    op.execute("ALTER TABLE transactions RENAME TO transactions_unpartitioned")
+    op.execute("ALTER TABLE transactions_partitioned RENAME TO transactions")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+    op.execute("ALTER TABLE transactions_unpartitioned RENAME CONSTRAINT uq_transactions_natural_key TO uq_transactions_natural_key_old")
+    op.execute("ALTER TABLE transactions RENAME CONSTRAINT uq_transactions_natural_key_p TO uq_transactions_natural_key")
+    op.create_foreign_key('fk_transactions_user_id', 'transactions', 'users', ['user_id'], ['id'])
+    op.create_foreign_key('fk_transactions_account_id_p', 'transactions', 'accounts', ['account_id'], ['id'])
+
+
+def upgrade() -> None:
+    if os.getenv('FINMATE_PARTITION_TRANSACTIONS') == '1':
+        _partition_by_month()
+        # Indexes on a partitioned parent cascade to every partition
+        _create_indexes(concurrently=False)
+    else:
+        # Build without blocking writes on large existing tables
+        with op.get_context().autocommit_block():
+            _create_indexes(concurrently=True)
+
+
+def _recreate_unpartitioned() -> None:
+    """Rebuild the plain table when the copy kept by the upgrade was dropped."""
+    op.execute(
+        "CREATE TABLE transactions_unpartitioned "
+        "(LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    op.execute("ALTER TABLE transactions_unpartitioned ADD CONSTRAINT transactions_pkey PRIMARY KEY (id)")
+    op.execute(
+        "ALTER TABLE transactions_unpartitioned ADD CONSTRAINT uq_transactions_natural_key_old "
+        "UNIQUE (user_id, date, amount, description_hash)"
+    )
+    op.create_foreign_key('transactions_user_id_fkey', 'transactions_unpartitioned', 'users', ['user_id'], ['id'])
+    op.create_foreign_key('fk_transactions_account_id', 'transactions_unpartitioned', 'accounts', ['account_id'], ['id'])
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    if transactions_partitioned(bind):
+        if not bind.execute(sa.text("SELECT to_regclass('transactions_unpartitioned') IS NOT NULL")).scalar():
+            _recreate_unpartitioned()
+
+        # The partitioned table is the live data: the copy misses every row
+        # written, changed or deleted since the upgrade, so replace its contents
+        columns = ', '.join(
+            f'"{name}"' for name in bind.execute(sa.text(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = 'transactions' "
+                "ORDER BY ordinal_position"
+            )).scalars()
+        )
+        op.execute("TRUNCATE transactions_unpartitioned")
+        op.execute(f"INSERT INTO transactions_unpartitioned ({columns}) SELECT {columns} FROM transactions")
+
+        # Hand the id sequence back before dropping the partitioned table
+        op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions_unpartitioned.id")
+        op.execute("DROP TABLE transactions CASCADE")
+        op.execute("ALTER TABLE transactions_unpartitioned RENAME TO transactions")
+        op.execute("ALTER TABLE transactions RENAME CONSTRAINT uq_transactions_natural_key_old TO uq_transactions_natural_key")
+    else:
+        op.drop_index('ix_transactions_user_category_date', table_name='transactions')
+        op.drop_index('ix_transactions_user_date', table_name='transactions')
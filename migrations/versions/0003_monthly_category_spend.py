@@ -0,0 +1,47 @@
+"""monthly per-category spend rollups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'monthly_category_spend',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('min_amount', sa.Float(), nullable=True),
+        sa.Column('max_amount', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('user_id', 'month', 'category')
+    )
+
+    # Backfill from existing history; must match services.rollups.refresh_monthly_rollups
+    op.execute("""
+        INSERT INTO monthly_category_spend
+            (user_id, month, category, total, count, min_amount, max_amount, updated_at)
+        SELECT user_id, date_trunc('month', date)::date, coalesce(category, 'Uncategorized'),
+               sum(amount), count(*), min(amount), max(amount), now()
+        FROM transactions
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('monthly_category_spend')
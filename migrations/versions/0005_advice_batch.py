@@ -0,0 +1,49 @@
+"""batch advice snapshots and shard checkpoints
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'advice_snapshots',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('advice', sa.Text(), nullable=False),
+        sa.Column('summary', sa.JSON(), nullable=True),
+        sa.Column('anomalies', sa.JSON(), nullable=True),
+        sa.Column('run_id', sa.String(), nullable=False),
+        sa.Column('generated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table(
+        'advice_job_shards',
+        sa.Column('run_id', sa.String(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('num_shards', sa.Integer(), nullable=False),
+        sa.Column('last_user_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('users_done', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('status', sa.String(), nullable=False, server_default='running'),
+        sa.Column('elapsed_seconds', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('run_id', 'shard')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('advice_job_shards')
+    op.drop_table('advice_snapshots')
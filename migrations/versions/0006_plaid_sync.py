@@ -0,0 +1,60 @@
+"""plaid items with sync cursors and plaid transaction ids
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migration_helpers import transactions_partitioned
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_plaid_index(concurrently: bool) -> None:
+    op.create_index(
+        'ix_transactions_user_plaid_id', 'transactions', ['user_id', 'plaid_transaction_id'],
+        postgresql_where=sa.text('plaid_transaction_id IS NOT NULL'),
+        postgresql_concurrently=concurrently
+    )
+
+
+def upgrade() -> None:
+    op.create_table(
+        'plaid_items',
+        sa.Column('item_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('access_token', sa.String(), nullable=False),
+        sa.Column('cursor', sa.Text(), nullable=True),
+        sa.Column('last_synced_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('item_id'),
+        sa.UniqueConstraint('access_token')
+    )
+    op.create_index('ix_plaid_items_user_id', 'plaid_items', ['user_id'])
+
+    # Adding a nullable column without a default is a catalog-only change
+    op.add_column('transactions', sa.Column('plaid_transaction_id', sa.String(), nullable=True))
+
+    if transactions_partitioned(op.get_bind()):
+        # Indexes on a partitioned parent cannot be built concurrently
+        _create_plaid_index(concurrently=False)
+    else:
+        with op.get_context().autocommit_block():
+            _create_plaid_index(concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transactions_user_plaid_id', table_name='transactions')
+    op.drop_column('transactions', 'plaid_transaction_id')
+    op.drop_index('ix_plaid_items_user_id', table_name='plaid_items')
+    op.drop_table('plaid_items')
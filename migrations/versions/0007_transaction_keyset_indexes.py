@@ -0,0 +1,65 @@
+"""add id to the transaction access-path indexes for keyset pagination
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00.000000
+
+GET /transactions pages by (date, id). With id as the last key column the
+row comparison ``(date, id) < (:date, :id)`` becomes an index condition
+and the index returns rows already in page order, so every page is a
+bounded range scan. The new indexes replace the 0002 ones, whose prefix
+they keep, so the QA tool queries still use them.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from migration_helpers import transactions_partitioned
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _replace_indexes(old: dict, new: dict, concurrently: bool) -> None:
+    for name, (columns, include) in new.items():
+        op.create_index(
+            name, 'transactions', columns,
+            postgresql_include=include,
+            postgresql_concurrently=concurrently
+        )
+    for name in old:
+        op.drop_index(name, table_name='transactions', postgresql_concurrently=concurrently)
+
+
+# name -> (key columns, included columns)
+INDEXES_0002 = {
+    'ix_transactions_user_date': (['user_id', 'date'], ['amount', 'category']),
+    'ix_transactions_user_category_date': (['user_id', 'category', 'date'], ['amount']),
+}
+INDEXES_0007 = {
+    'ix_transactions_user_date_id': (['user_id', 'date', 'id'], ['amount', 'category']),
+    'ix_transactions_user_category_date_id': (['user_id', 'category', 'date', 'id'], ['amount']),
+}
+
+
+def _migrate(old: dict, new: dict) -> None:
+    if transactions_partitioned(op.get_bind()):
+        # Indexes on a partitioned parent cannot be built or dropped concurrently
+        _replace_indexes(old, new, concurrently=False)
+    else:
+        # Build the new indexes before dropping the old ones, without blocking writes
+        with op.get_context().autocommit_block():
+            _replace_indexes(old, new, concurrently=True)
+
+
+def upgrade() -> None:
+    _migrate(INDEXES_0002, INDEXES_0007)
+
+
+def downgrade() -> None:
+    _migrate(INDEXES_0007, INDEXES_0002)
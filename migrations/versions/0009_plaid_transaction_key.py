@@ -0,0 +1,87 @@
+"""key plaid transactions on their plaid id instead of the natural key
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:00.000000
+
+Two Plaid transactions with different ids can share a date, amount and
+name (two coffees on one day). Under the natural key the second one was
+dropped, and later modified/removed events for it matched nothing. The
+natural key now only covers statement rows, and Plaid rows are unique on
+their Plaid id instead. Unique indexes on a partitioned table must contain
+the partition key, so date is part of the Plaid key in both layouts.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migration_helpers import transactions_partitioned
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_keys(concurrently: bool) -> None:
+    op.create_index(
+        'uq_transactions_statement_key', 'transactions',
+        ['user_id', 'date', 'amount', 'description_hash'],
+        unique=True,
+        postgresql_where=sa.text('plaid_transaction_id IS NULL'),
+        postgresql_concurrently=concurrently
+    )
+    op.create_index(
+        'uq_transactions_user_plaid_id', 'transactions',
+        ['user_id', 'plaid_transaction_id', 'date'],
+        unique=True,
+        postgresql_where=sa.text('plaid_transaction_id IS NOT NULL'),
+        postgresql_concurrently=concurrently
+    )
+
+
+def _create_plaid_lookup(concurrently: bool) -> None:
+    op.create_index(
+        'ix_transactions_user_plaid_id', 'transactions', ['user_id', 'plaid_transaction_id'],
+        postgresql_where=sa.text('plaid_transaction_id IS NOT NULL'),
+        postgresql_concurrently=concurrently
+    )
+
+
+def upgrade() -> None:
+    if transactions_partitioned(op.get_bind()):
+        # Indexes on a partitioned parent cannot be built or dropped concurrently
+        _create_keys(concurrently=False)
+    else:
+        with op.get_context().autocommit_block():
+            _create_keys(concurrently=True)
+
+    # The Plaid key's (user_id, plaid_transaction_id) prefix serves the lookups
+    op.drop_constraint('uq_transactions_natural_key', 'transactions', type_='unique')
+    op.drop_index('ix_transactions_user_plaid_id', table_name='transactions')
+
+
+def downgrade() -> None:
+    if transactions_partitioned(op.get_bind()):
+        _create_plaid_lookup(concurrently=False)
+    else:
+        with op.get_context().autocommit_block():
+            _create_plaid_lookup(concurrently=True)
+
+    # Plaid transactions that share a natural key no longer fit under it;
+    # keep the oldest copy, as 0001 did (rerun scripts.backfill_rollups after)
+    op.execute(
+        "DELETE FROM transactions a USING transactions b "
+        "WHERE a.id > b.id AND a.user_id = b.user_id AND a.date = b.date "
+        "AND a.amount = b.amount AND a.description_hash = b.description_hash"
+    )
+    op.create_unique_constraint(
+        'uq_transactions_natural_key', 'transactions',
+        ['user_id', 'date', 'amount', 'description_hash']
+    )
+    op.drop_index('uq_transactions_user_plaid_id', table_name='transactions')
+    op.drop_index('uq_transactions_statement_key', table_name='transactions')
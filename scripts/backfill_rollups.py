@@ -0,0 +1,38 @@
+"""
+Recompute the monthly per-category spend rollups from stored transactions.
+
+Run after bulk edits or deletes that bypass the upload path, or to repair
+drift. Without arguments every user's full history is rebuilt.
+
+Usage:
+    python -m scripts.backfill_rollups --user-id 42 --month 2026-09
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from backend.database import AsyncSessionLocal
+from backend.services.rollups import refresh_monthly_rollups
+
+
+async def backfill(user_id, months):
+    async with AsyncSessionLocal() as db:
+        written = await refresh_monthly_rollups(db, user_id=user_id, months=months)
+        await db.commit()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--user-id', type=int, default=None)
+    parser.add_argument('--month', action='append', default=None,
+                        help='YYYY-MM; may be given more than once')
+    args = parser.parse_args()
+
+    months = [datetime.strptime(month, '%Y-%m').date() for month in args.month] if args.month else None
+    written = asyncio.run(backfill(args.user_id, months))
+    print(f"Wrote {written} rollup rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark the batched anomaly engine against per-user month-over-month checks.
+
+Generates synthetic transactions for many users, then times:
+  - the legacy approach: per user, groupby month/category and pct_change
+  - the engine: one rollup over all users plus one detect_monthly_shifts pass
+  - transaction-level outlier detection over every row
+
+Usage:
+    python -m scripts.bench_anomaly_engine --rows 1000000 --users 2000 --months 36
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from backend.services.anomaly_engine import detect_monthly_shifts, detect_transaction_outliers
+from backend.services.categorizer import CATEGORY_KEYWORDS
+from backend.services.rollups import build_monthly_rollup
+
+
+def _make_transactions(rows: int, users: int, months: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    categories = np.array(list(CATEGORY_KEYWORDS))
+    start = pd.Timestamp.now().normalize() - pd.DateOffset(months=months)
+    amounts = rng.lognormal(mean=3.5, sigma=0.8, size=rows).round(2)
+    # A small share of large one-off purchases for the outlier detector to find
+    spikes = rng.random(rows) < 0.001
+    amounts[spikes] *= 50
+    return pd.DataFrame({
+        'user_id': rng.integers(1, users + 1, rows),
+        'date': start + pd.to_timedelta(rng.integers(0, months * 30, rows), unit='D'),
+        # Spending is stored as negative amounts, as in uploaded statements
+        'amount': -amounts,
+        'category': categories[rng.integers(0, len(categories), rows)]
+    })
+
+
+def _legacy_detect(df: pd.DataFrame) -> int:
+    """The pre-engine check run once per user: last month vs the one before, 25% threshold."""
+    flagged = 0
+    for _, user_df in df.groupby('user_id'):
+        user_df = user_df.copy()
+        user_df['month'] = user_df['date'].dt.to_period('M')
+        monthly = user_df.groupby(['month', 'category'])['amount'].sum().unstack()
+        latest = (monthly.pct_change(fill_method=None) * 100).iloc[-1]
+        flagged += int((latest.abs() > 25).sum())
+    return flagged
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--months', type=int, default=36)
+    args = parser.parse_args()
+
+    df = _make_transactions(args.rows, args.users, args.months)
+    print(f"{len(df):,} transactions, {args.users} users, {args.months} months\n")
+
+    legacy_flagged, legacy_seconds = _timed(_legacy_detect, df)
+    rollup, rollup_seconds = _timed(build_monthly_rollup, df)
+    shifts, shift_seconds = _timed(detect_monthly_shifts, rollup)
+    outliers, outlier_seconds = _timed(detect_transaction_outliers, df)
+
+    latest = shifts[shifts['month'] == shifts['month'].max()]
+    print(f"legacy per-user pct_change:   {legacy_seconds:8.2f}s  ({legacy_flagged} latest-month flags)")
+    print(f"engine rollup:                {rollup_seconds:8.2f}s  ({len(rollup):,} rollup rows)")
+    print(f"engine monthly shifts:        {shift_seconds:8.2f}s  "
+          f"({int(shifts['is_anomaly'].sum())} flags across all months, {int(latest['is_anomaly'].sum())} in the latest)")
+    print(f"engine transaction outliers:  {outlier_seconds:8.2f}s  ({len(outliers)} flagged rows)")
+    print(f"\nengine total {rollup_seconds + shift_seconds:.2f}s vs legacy {legacy_seconds:.2f}s "
+          f"({legacy_seconds / (rollup_seconds + shift_seconds):.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark the compiled keyword matcher against the original per-row loop.
+
+Usage:
+    python -m scripts.bench_categorizer --rows 200000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from backend.services.categorizer import CATEGORY_KEYWORDS, _rule_based_classify_series
+
+NOISE_WORDS = ['pos', 'purchase', 'debit', 'card', 'ref', 'online', 'payment', 'ach', 'txn']
+
+
+def _legacy_rule_based_classify(description: str):
+    """The pre-compiled implementation: a Python `in` check per keyword per row."""
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(keyword in description.lower() for keyword in keywords):
+            return category
+    return None
+
+
+def _make_descriptions(rows: int, seed: int = 42) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    keywords = [kw for kws in CATEGORY_KEYWORDS.values() for kw in kws]
+    descriptions = []
+    for i in range(rows):
+        parts = list(rng.choice(NOISE_WORDS, size=2))
+        # Roughly a third of rows match no keyword and fall through every category
+        if rng.random() > 0.33:
+            parts.insert(int(rng.integers(0, 3)), str(rng.choice(keywords)).upper())
+        parts.append(f"#{rng.integers(1000, 9999)}")
+        descriptions.append(' '.join(parts))
+    return pd.Series(descriptions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    descriptions = _make_descriptions(args.rows)
+
+    legacy_times, compiled_times = [], []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        legacy = descriptions.apply(
+            lambda x: _legacy_rule_based_classify(x.lower()) if pd.notnull(x) else None
+        )
+        legacy_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        compiled = _rule_based_classify_series(descriptions)
+        compiled_times.append(time.perf_counter() - start)
+
+    mismatches = int((legacy.fillna('<none>') != compiled.fillna('<none>')).sum())
+    if mismatches:
+        raise SystemExit(f"Compiled matcher disagrees with legacy loop on {mismatches} rows")
+
+    legacy_best, compiled_best = min(legacy_times), min(compiled_times)
+    print(f"rows:     {args.rows}")
+    print(f"legacy:   {legacy_best:.3f}s ({args.rows / legacy_best:,.0f} rows/s)")
+    print(f"compiled: {compiled_best:.3f}s ({args.rows / compiled_best:,.0f} rows/s)")
+    print(f"speedup:  {legacy_best / compiled_best:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
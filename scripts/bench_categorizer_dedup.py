@@ -0,0 +1,96 @@
+"""
+Benchmark classify_transactions, which classifies each distinct
+description once, against the previous row-by-row passes at several
+duplicate ratios (rows per unique description).
+
+A throwaway fallback model is fitted on the generated descriptions so the
+ML pass runs too. Besides time, reports the size of the sparse feature
+matrix the ML pass builds, and checks that both paths agree on every row.
+
+Usage:
+    python -m scripts.bench_categorizer_dedup --rows 200000 --ratios 1,3,10,30
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from backend.services.categorizer import _ml_classify, _rule_based_classify_series, classify_transactions
+from backend.services.model_registry import model_registry
+from scripts.bench_merchant_memo import _make_merchants, _publish_model
+
+
+def _rowwise_classify(df: pd.DataFrame) -> pd.DataFrame:
+    """The previous implementation: both passes over every row."""
+    df = df.copy()
+    df['category'] = _rule_based_classify_series(df['description'])
+    unclassified_mask = df['category'].isna()
+    if unclassified_mask.any():
+        df.loc[unclassified_mask, 'category'] = _ml_classify(df.loc[unclassified_mask, 'description'])
+    return df
+
+
+def _make_statement(rows: int, ratio: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    uniques = max(rows // ratio, 1)
+    merchants = _make_merchants(max(uniques // 20, 1))
+    # Each unique description is a merchant with a store number; rows repeat them
+    pool = np.array([f"{merchants[i % len(merchants)]} #{1000 + i}" for i in range(uniques)], dtype=object)
+    return pd.DataFrame({
+        'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D'),
+        'description': pool[rng.permutation(np.arange(rows) % uniques)],
+        'amount': -rng.lognormal(3.5, 0.8, rows).round(2)
+    })
+
+
+def _feature_bytes(descriptions: pd.Series) -> int:
+    """Size of the sparse matrix the ML pass builds for these descriptions."""
+    _, vectorizer, _ = model_registry.get()
+    unmatched = descriptions[_rule_based_classify_series(descriptions).isna()]
+    X = vectorizer.transform(unmatched)
+    return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+
+
+def _best(fn, df: pd.DataFrame, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(df)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--ratios', default='1,3,10,30')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        _publish_model(_make_statement(20_000, 1)['description'], model_dir)
+        model_registry.model_dir = model_dir
+        model_registry.clear()
+
+        print(f"rows: {args.rows:,} (best of {args.repeat})\n")
+        print(f"  {'rows/unique':>11} {'row-wise':>9} {'deduped':>9} {'speedup':>8} {'ML features':>20}")
+        for ratio in (int(ratio) for ratio in args.ratios.split(',')):
+            df = _make_statement(args.rows, ratio)
+            rowwise, rowwise_seconds = _best(_rowwise_classify, df, args.repeat)
+            deduped, deduped_seconds = _best(classify_transactions, df, args.repeat)
+            if not rowwise['category'].equals(deduped['category']):
+                raise SystemExit(f"Deduplicated classification disagrees with row-wise at ratio {ratio}")
+
+            rowwise_bytes = _feature_bytes(df['description'])
+            deduped_bytes = _feature_bytes(pd.Series(df['description'].unique(), dtype=object))
+            print(
+                f"  {ratio:>11} {rowwise_seconds:>8.3f}s {deduped_seconds:>8.3f}s {rowwise_seconds / deduped_seconds:>7.1f}x "
+                f"{rowwise_bytes / 2**20:>8.1f}MB -> {deduped_bytes / 2**20:.1f}MB"
+            )
+
+
+if __name__ == '__main__':
+    main()
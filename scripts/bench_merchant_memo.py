@@ -0,0 +1,121 @@
+"""
+Benchmark categorization through the merchant memo against classifying
+every row.
+
+Generates statements in which a few hundred merchants repeat with
+different store numbers, dates, card prefixes and locations, fits a
+throwaway fallback model on them, then times:
+  - classify_transactions over every row
+  - the memo on a first statement (cold: every merchant is classified once)
+  - the memo on a second statement of the same merchants (warm LRU)
+
+and reports how often the memo's category agrees with per-row
+classification. The database tier is disabled, so nothing is written.
+
+Usage:
+    python -m scripts.bench_merchant_memo --rows 100000 --merchants 400
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from backend.services.categorizer import CATEGORY_KEYWORDS, DEFAULT_CLUSTER_TO_CATEGORY, classify_transactions
+from backend.services.merchant_memo import MerchantMemo
+from backend.services.model_registry import model_registry
+from backend.services.model_training import publish_artifacts
+
+PREFIXES = ['', '', 'POS DEBIT ', 'CHECKCARD ', 'SQ *', 'PAYPAL *', 'ACH ']
+LOCATIONS = ['', 'SEATTLE WA', 'AUSTIN TX', 'NEW YORK NY', 'CHICAGO IL', 'DENVER CO']
+UNKNOWN_WORDS = ['ZEPHYR', 'NORTHWIND', 'BLUEFIN', 'KESTREL', 'LARKSPUR', 'MERIDIAN', 'OAKMONT', 'QUILL']
+
+
+def _make_merchants(count: int, seed: int = 7) -> list:
+    rng = np.random.default_rng(seed)
+    keywords = [keyword for keywords in CATEGORY_KEYWORDS.values() for keyword in keywords]
+    merchants = []
+    for i in range(count):
+        # About a third of merchants match no keyword and need the ML pass
+        if i % 3 == 0:
+            merchants.append(f"{rng.choice(UNKNOWN_WORDS)} {rng.choice(UNKNOWN_WORDS)} CO")
+        else:
+            merchants.append(f"{str(rng.choice(keywords)).upper()} {rng.choice(UNKNOWN_WORDS)}")
+    return merchants
+
+
+def _make_statement(merchants: list, rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Popular merchants repeat far more often than the long tail
+    weights = 1 / np.arange(1, len(merchants) + 1)
+    picks = rng.choice(len(merchants), size=rows, p=weights / weights.sum())
+    descriptions = [
+        f"{rng.choice(PREFIXES)}{merchants[pick]} #{rng.integers(100, 9999)} "
+        f"{rng.integers(1, 13):02d}/{rng.integers(1, 29):02d} {rng.choice(LOCATIONS)}".strip()
+        for pick in picks
+    ]
+    return pd.DataFrame({
+        'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D'),
+        'description': descriptions,
+        'amount': -rng.lognormal(3.5, 0.8, rows).round(2)
+    })
+
+
+def _publish_model(descriptions: pd.Series, model_dir: str) -> None:
+    vectorizer = HashingVectorizer(stop_words='english', ngram_range=(1, 2), alternate_sign=False, norm='l2')
+    model = MiniBatchKMeans(n_clusters=len(CATEGORY_KEYWORDS), random_state=42, n_init=3, batch_size=1024)
+    model.fit(vectorizer.transform(descriptions))
+    manifest = {'version': 'bench', 'cluster_to_category': DEFAULT_CLUSTER_TO_CATEGORY}
+    publish_artifacts(model, vectorizer, manifest, model_dir)
+
+
+async def run(rows: int, merchants: int, repeat: int):
+    names = _make_merchants(merchants)
+    first = _make_statement(names, rows, seed=1)
+    second = _make_statement(names, rows, seed=2)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        _publish_model(first['description'].sample(min(rows, 20_000), random_state=0), model_dir)
+        model_registry.model_dir = model_dir
+        model_registry.clear()
+        classify_transactions(first.head(100))  # load the model outside the timings
+
+        direct_times, cold_times, warm_times = [], [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            direct = classify_transactions(second)
+            direct_times.append(time.perf_counter() - start)
+
+            memo = MerchantMemo(persist=False)
+            start = time.perf_counter()
+            cold = await memo.classify(first)
+            cold_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            warm = await memo.classify(second)
+            warm_times.append(time.perf_counter() - start)
+
+    agreement = (warm['category'].fillna('<none>') == direct['category'].fillna('<none>')).mean()
+    direct_best = min(direct_times)
+    print(f"rows: {rows:,}, merchants: {merchants} (best of {repeat})\n")
+    print(f"  classify every row:  {direct_best:.3f}s")
+    print(f"  memo, cold:          {min(cold_times):.3f}s ({direct_best / min(cold_times):.1f}x)  {cold.attrs['categorization']}")
+    print(f"  memo, warm:          {min(warm_times):.3f}s ({direct_best / min(warm_times):.1f}x)  {warm.attrs['categorization']}")
+    print(f"  agreement with per-row classification: {agreement:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--merchants', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.merchants, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark sequential vs parallel PDF statement parsing on generated PDFs.
+
+Usage:
+    python -m scripts.bench_pdf_parser --pages 60 --lines-per-page 45
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from backend.services.ocr_parser import _parse_pdf
+
+MERCHANTS = ['STARBUCKS', 'UBER TRIP', 'AMAZON MKTPLACE', 'NETFLIX.COM', 'SHELL OIL', 'WHOLE FOODS', 'PAYROLL DEPOSIT']
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_statement_pdf(pages: int, lines_per_page: int, seed: int = 7) -> bytes:
+    """Build a minimal multi-page PDF with one transaction per text line."""
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+
+    for _ in range(pages):
+        ops = ['BT', '/F1 9 Tf', '12 TL', '40 760 Td']
+        for _ in range(lines_per_page):
+            day = start + timedelta(days=rng.randrange(365))
+            line = f"{day.strftime('%m/%d/%Y')} {rng.choice(MERCHANTS)} #{rng.randrange(1000, 9999)} {rng.uniform(1, 900):,.2f}"
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append('ET')
+        stream = '\n'.join(ops).encode('latin1')
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        content_id = len(objects)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id
+        )
+        page_ids.append(len(objects))
+
+    kids = ' '.join(f'{pid} 0 R' for pid in page_ids).encode()
+    objects[1] = b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % pages
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=60)
+    parser.add_argument('--lines-per-page', type=int, default=45)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    pdf_bytes = make_statement_pdf(args.pages, args.lines_per_page)
+
+    start = time.perf_counter()
+    sequential = _parse_pdf(pdf_bytes, max_workers=1)
+    sequential_time = time.perf_counter() - start
+
+    # Warm the pool so worker start-up is not billed to the first parse
+    _parse_pdf(pdf_bytes, max_pages=8, max_workers=args.workers)
+    start = time.perf_counter()
+    parallel = _parse_pdf(pdf_bytes, max_workers=args.workers)
+    parallel_time = time.perf_counter() - start
+
+    if not sequential.equals(parallel):
+        raise SystemExit("Parallel parse differs from sequential parse")
+
+    print(f"pages:        {args.pages} ({len(sequential)} transactions)")
+    print(f"sequential:   {sequential_time:.3f}s")
+    print(f"parallel:     {parallel_time:.3f}s")
+    print(f"speedup:      {sequential_time / parallel_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
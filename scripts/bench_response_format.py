@@ -0,0 +1,109 @@
+"""
+Benchmark encoding an /upload response: row records through FastAPI's
+generic encoder against the column-oriented formats of
+services.response_format.
+
+Reports encode time, peak Python memory while encoding and body size, and
+checks that every format decodes back to the same transactions.
+
+Usage:
+    python -m scripts.bench_response_format --rows 200000
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend.services.categorizer import CATEGORY_KEYWORDS
+from backend.services.response_format import (
+    ARROW_MEDIA_TYPE, JSON_MEDIA_TYPE, SUPPORTED_MEDIA_TYPES, decode_columns, transactions_response
+)
+
+
+def _make_transactions(rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    categories = np.array(list(CATEGORY_KEYWORDS) + ['Uncategorized'], dtype=object)
+    return pd.DataFrame({
+        'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D'),
+        'description': [f"POS PURCHASE MERCHANT {i % 2000} #{i % 9973}" for i in range(rows)],
+        'amount': -rng.lognormal(mean=3.5, sigma=0.8, size=rows).round(2),
+        'category': categories[rng.integers(0, len(categories), rows)]
+    })
+
+
+def _records(frame: pd.DataFrame) -> bytes:
+    """The previous response path: one dict per row through jsonable_encoder."""
+    payload = {'message': 'Statement processed successfully', 'transactions': frame.to_dict(orient='records'), 'stored': 0}
+    return JSONResponse(content=jsonable_encoder(payload)).body
+
+
+def _negotiated(media_type: str):
+    def encode(frame: pd.DataFrame) -> bytes:
+        return transactions_response(media_type, frame, message='Statement processed successfully', stored=0).body
+    return encode
+
+
+def _decode(media_type: str, body: bytes) -> pd.DataFrame:
+    if media_type == 'records':
+        frame = pd.DataFrame(orjson.loads(body)['transactions'])
+    elif media_type == ARROW_MEDIA_TYPE:
+        import pyarrow as pa
+
+        frame = pa.ipc.open_stream(io.BytesIO(body)).read_all().to_pandas()
+    elif media_type == JSON_MEDIA_TYPE:
+        frame = decode_columns(orjson.loads(body)['transactions'])
+    else:
+        import msgpack
+
+        frame = decode_columns(msgpack.unpackb(body)['transactions'])
+    frame['date'] = pd.to_datetime(frame['date'])
+    return frame.astype({'category': object})
+
+
+def _measure(encode, frame: pd.DataFrame, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode(frame)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    encode(frame)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return body, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    frame = _make_transactions(args.rows)
+    encoders = [('records', _records)] + [
+        (media_type, _negotiated(media_type)) for media_type in SUPPORTED_MEDIA_TYPES
+        if media_type != 'application/x-msgpack'
+    ]
+
+    print(f"rows: {args.rows:,} (best of {args.repeat})\n")
+    print(f"  {'format':<38} {'encode':>8} {'peak memory':>12} {'body':>10}")
+    baseline = None
+    for name, encode in encoders:
+        body, seconds, peak = _measure(encode, frame, args.repeat)
+        pd.testing.assert_frame_equal(_decode(name, body), frame, check_dtype=False)
+        baseline = baseline or seconds
+        print(
+            f"  {name:<38} {seconds:>7.3f}s {peak / 2**20:>10.1f}MB {len(body) / 2**20:>8.1f}MB"
+            f"  ({baseline / seconds:.1f}x)"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Compare ways of loading users' transactions into a DataFrame: ORM objects,
+a row-wise SELECT, the columnar COPY path of services.transaction_columns,
+and that path with Parquet snapshots of closed months.
+
+Seeds throwaway users with generated transactions (and their rollups),
+loads them with each method, checks that all methods return the same
+rows, and deletes the seeded data afterwards.
+
+Usage:
+    DATABASE_URL=postgresql+asyncpg://... python -m scripts.bench_transaction_columns --users 50 --rows-per-user 4000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import select, text
+
+from backend.database import AsyncSessionLocal
+from backend.models import Transaction
+from backend.services.rollups import refresh_monthly_rollups
+from backend.services.transaction_columns import TransactionSnapshots, load_transaction_columns
+
+COLUMNS = ['user_id', 'date', 'description', 'amount', 'category']
+
+
+async def _orm(db, user_ids):
+    result = await db.execute(select(Transaction).where(Transaction.user_id.in_(user_ids)))
+    return pd.DataFrame([
+        {column: getattr(txn, column) for column in COLUMNS} for txn in result.scalars()
+    ], columns=COLUMNS)
+
+
+async def _rows(db, user_ids):
+    result = await db.execute(
+        text(f"SELECT {', '.join(COLUMNS)} FROM transactions WHERE user_id = ANY(:ids)"), {'ids': user_ids}
+    )
+    return pd.DataFrame(result.all(), columns=COLUMNS)
+
+
+async def _columns(db, user_ids):
+    return await load_transaction_columns(db, user_ids, columns=COLUMNS)
+
+
+async def _timed(fn, *args):
+    best, frame = None, None
+    for _ in range(3):
+        async with AsyncSessionLocal() as db:
+            start = time.perf_counter()
+            frame = await fn(db, *args)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return frame, best
+
+
+def _normalized(frame):
+    frame = frame.astype({'category': object, 'amount': float})
+    frame['date'] = pd.to_datetime(frame['date'])
+    return frame.sort_values(COLUMNS[:4], ignore_index=True)
+
+
+async def run(users: int, rows_per_user: int):
+    async with AsyncSessionLocal() as db:
+        user_ids = [row[0] for row in (await db.execute(text("""
+            INSERT INTO users (email, password_hash)
+            SELECT 'bench-columns-' || g || '-' || extract(epoch from now()) || '@finmate.invalid', 'x'
+            FROM generate_series(1, :users) g
+            RETURNING id
+        """), {'users': users})).all()]
+        await db.execute(text("""
+            INSERT INTO transactions (user_id, date, description, amount, category, description_hash, created_at)
+            SELECT u, date_trunc('day', now() - random() * interval '3 years'), 'BENCH MERCHANT ' || (g % 500),
+                   round((random() * -500)::numeric, 2),
+                   (ARRAY['Food & Dining', 'Shopping', 'Travel', 'Utilities', NULL])[1 + g % 5],
+                   md5(u || '-' || g), now()
+            FROM unnest(CAST(:user_ids AS integer[])) u, generate_series(1, :rows) g
+        """), {'user_ids': user_ids, 'rows': rows_per_user})
+        for user_id in user_ids:
+            await refresh_monthly_rollups(db, user_id)
+        await db.commit()
+
+    try:
+        orm, orm_seconds = await _timed(_orm, user_ids)
+        rows, rows_seconds = await _timed(_rows, user_ids)
+        columns, columns_seconds = await _timed(_columns, user_ids)
+
+        with tempfile.TemporaryDirectory() as root:
+            snapshots = TransactionSnapshots(root)
+            if snapshots.enabled:
+                async with AsyncSessionLocal() as db:
+                    start = time.perf_counter()
+                    await snapshots.load(db, user_ids)
+                    build_seconds = time.perf_counter() - start
+                snapshot, snapshot_seconds = await _timed(snapshots.load, user_ids)
+
+        expected = _normalized(orm)
+        for name, frame in [('rows', rows), ('columns', columns)] + ([('snapshot', snapshot)] if snapshots.enabled else []):
+            pd.testing.assert_frame_equal(_normalized(frame), expected, check_dtype=False)
+
+        print(f"{len(expected):,} transactions across {users} users (best of 3)\n")
+        print(f"  ORM objects:        {orm_seconds:.3f}s")
+        print(f"  row SELECT:         {rows_seconds:.3f}s")
+        print(f"  columnar COPY:      {columns_seconds:.3f}s")
+        if snapshots.enabled:
+            print(f"  snapshot build:     {build_seconds:.3f}s")
+            print(f"  snapshot + current: {snapshot_seconds:.3f}s")
+        else:
+            print("  snapshots skipped: pyarrow is not installed")
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("DELETE FROM monthly_category_spend WHERE user_id = ANY(:ids)"), {'ids': user_ids})
+            await db.execute(text("DELETE FROM transactions WHERE user_id = ANY(:ids)"), {'ids': user_ids})
+            await db.execute(text("DELETE FROM users WHERE id = ANY(:ids)"), {'ids': user_ids})
+            await db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rows-per-user', type=int, default=4000)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.rows_per_user))
+
+
+if __name__ == '__main__':
+    main()
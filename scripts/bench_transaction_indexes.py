@@ -0,0 +1,128 @@
+"""
+Show the query plans of the QA agent's transaction queries at each stage of
+the transactions schema: primary key only, with the natural key from
+migration 0001, and with the access-path indexes from migrations 0002/0007.
+A deep page of GET /transactions is shown both as a keyset query and as
+the OFFSET query it replaces.
+
+Seeds throwaway users with generated transactions and runs EXPLAIN ANALYZE
+for each query. Indexes are dropped inside a transaction that is rolled
+back afterwards, and the seeded rows are deleted.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m scripts.bench_transaction_indexes --users 200 --rows-per-user 2000
+"""
+import argparse
+import json
+
+from sqlalchemy import text
+
+from backend.database import sync_engine
+
+INDEXES = ['ix_transactions_user_date_id', 'ix_transactions_user_category_date_id']
+
+# Rows before the page read by the deep pagination queries
+PAGE_DEPTH = 1500
+
+QUERIES = {
+    'spend_summary (user_id, date >=)': """
+        SELECT date, amount, category FROM transactions
+        WHERE user_id = :user_id AND date >= now() - interval '90 days'
+    """,
+    'affordability (user_id, date >=, category IN)': """
+        SELECT sum(amount) FROM transactions
+        WHERE user_id = :user_id AND date >= date_trunc('month', now())
+        AND category IN ('Mortgage', 'Car Payment', 'Credit Card', 'Loan')
+    """,
+    'transactions page (keyset after (date, id))': """
+        SELECT id, date, description, amount, category FROM transactions
+        WHERE user_id = :user_id AND (date, id) < (:after_date, :after_id)
+        ORDER BY date DESC, id DESC LIMIT 100
+    """,
+    'transactions page (OFFSET)': f"""
+        SELECT id, date, description, amount, category FROM transactions
+        WHERE user_id = :user_id
+        ORDER BY date DESC, id DESC OFFSET {PAGE_DEPTH} LIMIT 100
+    """,
+}
+
+
+def _plan_summary(conn, sql: str, params: dict) -> dict:
+    plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params).scalar()
+    root = plan[0]
+
+    nodes, stack = [], [root['Plan']]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.get('Plans', []))
+
+    scans = [
+        f"{node['Node Type']} on {node.get('Index Name') or node.get('Relation Name')}"
+        for node in nodes if 'Scan' in node['Node Type']
+    ]
+    return {
+        'scans': scans,
+        'shared_buffers': root['Plan'].get('Shared Hit Blocks', 0) + root['Plan'].get('Shared Read Blocks', 0),
+        'execution_ms': round(root['Execution Time'], 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rows-per-user', type=int, default=2000)
+    args = parser.parse_args()
+
+    with sync_engine.begin() as conn:
+        user_ids = [row[0] for row in conn.execute(text("""
+            INSERT INTO users (email, password_hash)
+            SELECT 'bench-index-' || g || '-' || extract(epoch from now()) || '@finmate.invalid', 'x'
+            FROM generate_series(1, :users) g
+            RETURNING id
+        """), {'users': args.users})]
+        conn.execute(text("""
+            INSERT INTO transactions (user_id, date, description, amount, category, description_hash, created_at)
+            SELECT u, now() - random() * interval '3 years', 'BENCH ' || g, round((random() * 500)::numeric, 2),
+                   (ARRAY['Food & Dining', 'Shopping', 'Loan', 'Credit Card', 'Travel', 'Income'])[1 + g % 6],
+                   md5(g::text), now()
+            FROM unnest(CAST(:user_ids AS integer[])) u, generate_series(1, :rows) g
+        """), {'user_ids': user_ids, 'rows': args.rows_per_user})
+
+    # VACUUM sets the visibility map so index-only scans can skip the heap
+    with sync_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text("VACUUM ANALYZE transactions"))
+
+    probe_user = user_ids[len(user_ids) // 2]
+    try:
+        with sync_engine.connect() as conn:
+            # The keyset page starts where the OFFSET page does
+            after = conn.execute(text(f"""
+                SELECT date, id FROM transactions WHERE user_id = :user_id
+                ORDER BY date DESC, id DESC OFFSET {PAGE_DEPTH - 1} LIMIT 1
+            """), {'user_id': probe_user}).one()
+            params = {'user_id': probe_user, 'after_date': after.date, 'after_id': after.id}
+
+            plans = {'indexes': {name: _plan_summary(conn, sql, params) for name, sql in QUERIES.items()}}
+
+            # DDL is transactional in Postgres, so rolling back restores the indexes
+            for index in INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+            plans['natural key'] = {name: _plan_summary(conn, sql, params) for name, sql in QUERIES.items()}
+            conn.execute(text("DROP INDEX uq_transactions_statement_key"))
+            plans['primary key'] = {name: _plan_summary(conn, sql, params) for name, sql in QUERIES.items()}
+            conn.rollback()
+
+        print(f"{args.users * args.rows_per_user:,} transactions across {args.users} users\n")
+        for name in QUERIES:
+            print(name)
+            for stage in ['primary key', 'natural key', 'indexes']:
+                print(f"  {stage + ':':<14} {json.dumps(plans[stage][name])}")
+    finally:
+        with sync_engine.begin() as conn:
+            conn.execute(text("DELETE FROM transactions WHERE user_id = ANY(:ids)"), {'ids': user_ids})
+            conn.execute(text("DELETE FROM users WHERE id = ANY(:ids)"), {'ids': user_ids})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark bulk transaction persistence against a real Postgres database.
+
+Inserts N generated rows for a throwaway user through the multi-row INSERT
+path and the COPY path, then re-inserts them to confirm deduplication.
+
+Usage:
+    DATABASE_URL=postgresql+asyncpg://... python -m scripts.bench_transaction_store --rows 100000
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, insert
+
+from backend.database import AsyncSessionLocal
+from backend.models import Transaction, User
+from backend.services import transaction_store
+from backend.services.transaction_store import bulk_insert_transactions
+
+MERCHANTS = ['STARBUCKS', 'UBER TRIP', 'AMAZON MKTPLACE', 'NETFLIX.COM', 'SHELL OIL', 'WHOLE FOODS']
+
+
+def _make_frame(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'date': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 5 * 365 * 24 * 3600, rows), unit='s'),
+        'description': [f"{m} #{n}" for m, n in zip(rng.choice(MERCHANTS, rows), rng.integers(0, 10_000, rows))],
+        'amount': rng.uniform(1, 500, rows).round(2),
+        'category': rng.choice(['Food & Dining', 'Shopping', 'Transportation'], rows)
+    })
+
+
+async def _timed_insert(user_id: int, df: pd.DataFrame, copy_threshold: int):
+    transaction_store.COPY_THRESHOLD = copy_threshold
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        inserted = await bulk_insert_transactions(db, user_id, df)
+        await db.commit()
+        return inserted, time.perf_counter() - start
+
+
+async def main(rows: int):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            insert(User).values(email=f"bench-{time.time()}@finmate.invalid", password_hash='x').returning(User.id)
+        )
+        user_id = result.scalar_one()
+        await db.commit()
+
+    try:
+        for label, threshold, seed in [('insert', rows + 1, 1), ('copy', 0, 2)]:
+            df = _make_frame(rows, seed)
+            inserted, elapsed = await _timed_insert(user_id, df, threshold)
+            print(f"{label:>7}: {inserted} rows in {elapsed:.2f}s ({inserted / elapsed:,.0f} rows/s)")
+
+            inserted, elapsed = await _timed_insert(user_id, df, threshold)
+            print(f"{label:>7} re-upload: {inserted} new rows in {elapsed:.2f}s")
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Transaction).where(Transaction.user_id == user_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows))
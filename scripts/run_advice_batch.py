@@ -0,0 +1,40 @@
+"""
+Precompute budget advice for every user from the stored monthly rollups.
+
+Rerun with the same --run-id to resume after a crash; finished shards and
+committed batches are skipped. Split a run across processes by giving each
+one different --shard values.
+
+Usage:
+    python -m scripts.run_advice_batch --run-id 20261017 --shards 8 --shard 0 --shard 1 --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from backend.services.advice_batch import run_advice_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--run-id', default=datetime.utcnow().strftime('%Y%m%d'))
+    parser.add_argument('--shards', type=int, default=1, help='total shards in the run')
+    parser.add_argument('--shard', type=int, action='append', default=None,
+                        help='shard to process; may be given more than once (default: all)')
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8, help='LLM requests in flight')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = asyncio.run(run_advice_batch(
+        args.run_id, args.shards, shards=args.shard,
+        batch_size=args.batch_size, concurrency=args.concurrency
+    ))
+    for stats in results:
+        print(f"shard {stats['shard']}: {stats['users_done']} users in {stats['elapsed_seconds']}s "
+              f"({stats['users_per_second']} users/s, {stats['processed_this_session']} this session)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:8099/v1 to
+exercise timeouts, retries, the circuit breaker and the template advice
+fallback without network access or API spend.
+
+The tests start it in-process through ``start_stub`` and read the
+request counters on ``StubState``.
+
+Usage:
+    python -m scripts.stub_openai --port 8099 --latency 0.2 --error-rate 0.3
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    """Behaviour of the stub and counters of the requests it served."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, fail_first: int = 0,
+                 chunk_delay: float = 0.0, status: int = 503,
+                 reply: str = 'You are on track this month. Consider setting a dining budget.'):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fail_first = fail_first  # requests answered with ``status`` before any succeeds
+        self.chunk_delay = chunk_delay  # seconds between streamed chunks
+        self.status = status
+        self.reply = reply
+
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def begin(self) -> int:
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            return self.requests
+
+    def end(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+
+def make_handler(state: StubState):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            number = state.begin()
+            try:
+                self._handle(number)
+            finally:
+                state.end()
+
+        def _handle(self, number: int):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            time.sleep(state.latency)
+            reply = state.reply
+
+            if number <= state.fail_first or random.random() < state.error_rate:
+                self._send(state.status, {'error': {'message': 'stub failure', 'type': 'server_error'}})
+                return
+
+            if not self.path.endswith('/chat/completions'):
+                self._send(404, {'error': {'message': f'unknown path {self.path}'}})
+                return
+
+            prompt_tokens = sum(len(m.get('content', '')) for m in body.get('messages', [])) // 4
+            completion_tokens = len(reply) // 4
+            if body.get('stream'):
+                self._stream(body.get('model', 'stub'), reply)
+                return
+            self._send(200, {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'stub'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': reply},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens
+                }
+            })
+
+        def _send(self, status: int, payload: dict):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, model: str, reply: str):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for word in reply.split(' '):
+                    chunk = {
+                        'id': 'chatcmpl-stub',
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': model,
+                        'choices': [{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(state.chunk_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client closed the stream early
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub(state: StubState, port: int = 0) -> ThreadingHTTPServer:
+    """Serve the stub on a background thread; ``server.server_port`` is the bound port."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--fail-first', type=int, default=0, help='requests answered with 503 before any succeeds')
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help='seconds between streamed chunks')
+    parser.add_argument('--reply', default='You are on track this month. Consider setting a dining budget.')
+    args = parser.parse_args()
+
+    state = StubState(args.latency, args.error_rate, args.fail_first, args.chunk_delay, reply=args.reply)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(state))
+    print(f"Stub OpenAI API on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
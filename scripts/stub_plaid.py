@@ -0,0 +1,259 @@
+"""
+Local stand-in for the Plaid endpoints the backend uses: link token
+creation, public token exchange and /transactions/sync.
+
+Point the backend at it with PLAID_BASE_URL=http://127.0.0.1:8098 to
+exercise incremental sync without Plaid credentials or network access.
+
+Every access token gets a generated history of transactions on first use.
+Cursors are positions in a per-item change log, so repeated syncs only
+return what was appended since. POST /stub/advance appends changes:
+
+    {"access_token": "...", "added": 20, "modified": 5, "removed": 3, "duplicated": 2}
+
+``duplicated`` adds transactions that repeat the date, amount and name of
+existing ones under new ids, like buying the same coffee twice in a day.
+
+With --webhook-url, every advance (and /sandbox/item/fire_webhook) posts a
+TRANSACTIONS SYNC_UPDATES_AVAILABLE webhook for the item, the way Plaid
+notifies the backend's /plaid/webhook endpoint. Webhooks carry a
+Plaid-Verification JWT signed with the stub's ES256 key, which
+/webhook_verification_key/get serves.
+
+With --mutation-rate, follow-up pages fail with
+TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION like the real API does when an
+item changes mid-pagination.
+
+Usage:
+    python -m scripts.stub_plaid --port 8098 --transactions 2000 --latency 0.1 --mutation-rate 0.05 \
+        --webhook-url http://127.0.0.1:8001/plaid/webhook
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import python_jwt
+from jwcrypto import jwk
+
+# (name, typical amount); Plaid reports outflows as positive amounts
+MERCHANTS = [
+    ('STARBUCKS STORE 1458', 6.5), ('UBER TRIP', 18.0), ('AMAZON MKTPLACE', 42.0),
+    ('WHOLE FOODS MARKET', 85.0), ('SHELL OIL 5542', 45.0), ('NETFLIX.COM', 15.49),
+    ('CHIPOTLE 2231', 12.75), ('DELTA AIR LINES', 320.0), ('CITY WATER UTILITY', 60.0),
+    ('ACME CORP PAYROLL', -2400.0), ('CHASE CREDIT CRD AUTOPAY', 450.0), ('TARGET T-0231', 55.0),
+]
+
+
+class ItemLog:
+    """Change log of one item: a list of (kind, transaction) events."""
+
+    def __init__(self, item_id: str, transactions: int, rng: random.Random):
+        self.item_id = item_id
+        self.rng = rng
+        self.events = []
+        self.live = {}
+        self.append(added=transactions)
+
+    def _transaction(self, transaction_id: str) -> dict:
+        name, typical = self.rng.choice(MERCHANTS)
+        day = date.today() - timedelta(days=self.rng.randint(0, 730))
+        return {
+            'transaction_id': transaction_id,
+            'account_id': f'{self.item_id}-checking',
+            'date': day.isoformat(),
+            'name': name,
+            'merchant_name': name.split(' ')[0].title(),
+            'amount': round(typical * self.rng.uniform(0.5, 1.5), 2),
+            'iso_currency_code': 'USD',
+            'pending': False,
+        }
+
+    def append(self, added: int = 0, modified: int = 0, removed: int = 0, duplicated: int = 0) -> None:
+        for _ in range(added):
+            txn = self._transaction(uuid.UUID(int=self.rng.getrandbits(128)).hex)
+            self.live[txn['transaction_id']] = txn
+            self.events.append(('added', txn))
+        for transaction_id in self.rng.sample(sorted(self.live), min(duplicated, len(self.live))):
+            txn = dict(self.live[transaction_id], transaction_id=uuid.UUID(int=self.rng.getrandbits(128)).hex)
+            self.live[txn['transaction_id']] = txn
+            self.events.append(('added', txn))
+        for transaction_id in self.rng.sample(sorted(self.live), min(modified, len(self.live))):
+            txn = dict(self.live[transaction_id], amount=round(self.live[transaction_id]['amount'] * 1.1, 2))
+            self.live[transaction_id] = txn
+            self.events.append(('modified', txn))
+        for transaction_id in self.rng.sample(sorted(self.live), min(removed, len(self.live))):
+            del self.live[transaction_id]
+            self.events.append(('removed', {'transaction_id': transaction_id}))
+
+    def page(self, cursor: int, count: int) -> dict:
+        """Collapse the events after cursor into one sync page, as Plaid does."""
+        end = min(cursor + count, len(self.events))
+        changes = {}
+        for kind, txn in self.events[cursor:end]:
+            previous = changes.get(txn['transaction_id'], (None,))[0]
+            if kind == 'removed' and previous == 'added':
+                del changes[txn['transaction_id']]
+            elif kind == 'modified' and previous == 'added':
+                changes[txn['transaction_id']] = ('added', txn)
+            else:
+                changes[txn['transaction_id']] = (kind, txn)
+        return {
+            'added': [txn for kind, txn in changes.values() if kind == 'added'],
+            'modified': [txn for kind, txn in changes.values() if kind == 'modified'],
+            'removed': [txn for kind, txn in changes.values() if kind == 'removed'],
+            'next_cursor': str(end),
+            'has_more': end < len(self.events),
+        }
+
+
+def signing_key() -> jwk.JWK:
+    """A fresh ES256 key for signing webhooks, with a key id."""
+    return jwk.JWK.generate(kty='EC', crv='P-256', kid=uuid.uuid4().hex)
+
+
+def public_key(key: jwk.JWK) -> dict:
+    """The key in the shape /webhook_verification_key/get returns it."""
+    return dict(json.loads(key.export_public()), alg='ES256', use='sig', created_at=int(time.time()), expired_at=None)
+
+
+def verification_header(key: jwk.JWK, body: bytes) -> str:
+    """Plaid-Verification JWT vouching for a webhook body."""
+    claims = {'request_body_sha256': hashlib.sha256(body).hexdigest()}
+    return python_jwt.generate_jwt(claims, key, 'ES256', other_headers={'kid': key.key_id})
+
+
+def fire_webhook(url: str, item_id: str, key: jwk.JWK) -> None:
+    """POST a signed SYNC_UPDATES_AVAILABLE webhook from a background thread."""
+    payload = json.dumps({
+        'webhook_type': 'TRANSACTIONS',
+        'webhook_code': 'SYNC_UPDATES_AVAILABLE',
+        'item_id': item_id,
+        'initial_update_complete': True,
+        'historical_update_complete': True,
+        'environment': 'sandbox',
+    }).encode()
+    headers = {'Content-Type': 'application/json', 'Plaid-Verification': verification_header(key, payload)}
+    request = urllib.request.Request(url, payload, headers)
+
+    def send():
+        try:
+            urllib.request.urlopen(request, timeout=10).read()
+        except OSError as e:
+            print(f"Webhook to {url} failed: {e}")
+
+    threading.Thread(target=send, daemon=True).start()
+
+
+def make_handler(transactions: int, latency: float, mutation_rate: float, seed: int, webhook_url: str = None):
+    items = {}
+    lock = threading.Lock()
+    rng = random.Random(seed)
+    key = signing_key()
+
+    def item_for(access_token: str) -> ItemLog:
+        if access_token not in items:
+            item_id = f"item-{hashlib.sha1(access_token.encode()).hexdigest()[:12]}"
+            items[access_token] = ItemLog(item_id, transactions, random.Random(f'{seed}-{access_token}'))
+        return items[access_token]
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            time.sleep(latency)
+            with lock:
+                if self.path == '/link/token/create':
+                    self._send(200, {'link_token': f'link-sandbox-{uuid.uuid4()}', 'expiration': '2099-01-01T00:00:00Z'})
+                elif self.path == '/item/public_token/exchange':
+                    access_token = f"access-sandbox-{body['public_token']}"
+                    self._send(200, {'access_token': access_token, 'item_id': item_for(access_token).item_id})
+                elif self.path == '/transactions/sync':
+                    self._sync(body)
+                elif self.path == '/stub/advance':
+                    item = item_for(body['access_token'])
+                    item.append(body.get('added', 0), body.get('modified', 0), body.get('removed', 0), body.get('duplicated', 0))
+                    if webhook_url:
+                        fire_webhook(webhook_url, item.item_id, key)
+                    self._send(200, {'events': len(item.events)})
+                elif self.path == '/sandbox/item/fire_webhook':
+                    item = item_for(body['access_token'])
+                    if webhook_url:
+                        fire_webhook(webhook_url, item.item_id, key)
+                    self._send(200, {'webhook_fired': bool(webhook_url), 'request_id': uuid.uuid4().hex})
+                elif self.path == '/webhook_verification_key/get':
+                    if body.get('key_id') == key.key_id:
+                        self._send(200, {'key': public_key(key), 'request_id': uuid.uuid4().hex})
+                    else:
+                        self._error(400, 'INVALID_INPUT', 'INVALID_WEBHOOK_VERIFICATION_KEY_ID', 'unknown key_id')
+                else:
+                    self._error(404, 'API_ERROR', 'NOT_FOUND', f'unknown path {self.path}')
+
+        def _sync(self, body: dict):
+            cursor = body.get('cursor')
+            if cursor and rng.random() < mutation_rate:
+                self._error(
+                    400, 'TRANSACTIONS_ERROR', 'TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION',
+                    'Underlying transaction data changed since last page was fetched.'
+                )
+                return
+            page = item_for(body['access_token']).page(int(cursor or 0), int(body.get('count', 100)))
+            self._send(200, dict(page, request_id=uuid.uuid4().hex))
+
+        def _error(self, status: int, error_type: str, error_code: str, message: str):
+            self._send(status, {
+                'error_type': error_type,
+                'error_code': error_code,
+                'error_message': message,
+                'display_message': None,
+                'request_id': uuid.uuid4().hex,
+            })
+
+        def _send(self, status: int, payload: dict):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    # Lets tests reach an item's change log and the webhook signing key
+    StubHandler.item_for = staticmethod(item_for)
+    StubHandler.signing_key = key
+    return StubHandler
+
+
+def start_stub(transactions: int = 100, latency: float = 0.0, mutation_rate: float = 0.0, seed: int = 0,
+               port: int = 0) -> ThreadingHTTPServer:
+    """Serve the stub on a background thread; ``server.server_port`` is the bound port."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(transactions, latency, mutation_rate, seed))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8098)
+    parser.add_argument('--transactions', type=int, default=2000, help='initial history per item')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--mutation-rate', type=float, default=0.0, help='fraction of follow-up pages that fail')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--webhook-url', help='where to POST transaction webhooks')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.transactions, args.latency, args.mutation_rate, args.seed, args.webhook_url))
+    print(f"Stub Plaid API on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+Train the fallback transaction classifier from stored transactions.
+
+Usage:
+    python -m scripts.train_classifier --model-dir models --batch-size 5000
+"""
+import argparse
+import logging
+
+from backend.database import SyncSessionLocal
+from backend.services.model_training import train_classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    version = train_classifier(SyncSessionLocal, model_dir=args.model_dir, batch_size=args.batch_size)
+    print(f"Published classifier version {version}")
+
+
+if __name__ == "__main__":
+    main()
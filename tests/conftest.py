@@ -0,0 +1,81 @@
+import os
+import uuid
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# Settings are read when backend modules are imported; the services under
+# test only need placeholders for the required ones
+for name, value in {
+    'FRONTEND_ORIGIN': 'http://localhost:3000',
+    'DATABASE_URL': 'postgresql+asyncpg://postgres@127.0.0.1:5432/finmate',
+    'JWT_SECRET': 'test',
+    'OPENAI_API_KEY': 'test',
+    'PLAID_CLIENT_ID': 'test',
+    'PLAID_SECRET': 'test',
+}.items():
+    os.environ.setdefault(name, value)
+
+from backend.config import settings  # noqa: E402
+from scripts import stub_plaid  # noqa: E402
+from scripts.stub_openai import StubState, start_stub  # noqa: E402
+
+
+@pytest.fixture
+def openai_stub():
+    """Start local OpenAI stubs; returns a factory taking StubState options."""
+    servers = []
+
+    def start(**options):
+        state = StubState(**options)
+        server = start_stub(state)
+        servers.append(server)
+        return state, f"http://127.0.0.1:{server.server_port}/v1"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def plaid_stub():
+    """Start local Plaid stubs; returns a factory taking stub_plaid.start_stub options."""
+    servers = []
+
+    def start(**options):
+        server = stub_plaid.start_stub(**options)
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest_asyncio.fixture
+async def db_session():
+    """Session factory on the configured database and a fresh user, removed afterwards."""
+    engine = create_async_engine(str(settings.DATABASE_URL), poolclass=NullPool)
+    try:
+        async with engine.begin() as conn:
+            user_id = (await conn.execute(
+                text("INSERT INTO users (email, password_hash) VALUES (:email, 'x') RETURNING id"),
+                {'email': f'test-{uuid.uuid4().hex}@example.com'}
+            )).scalar()
+    except (OperationalError, OSError) as e:
+        await engine.dispose()
+        pytest.skip(f"database unavailable: {e}")
+
+    yield async_sessionmaker(engine, expire_on_commit=False), user_id
+
+    async with engine.begin() as conn:
+        for table in ['transactions', 'monthly_category_spend', 'plaid_items', 'users']:
+            column = 'id' if table == 'users' else 'user_id'
+            await conn.execute(text(f"DELETE FROM {table} WHERE {column} = :user_id"), {'user_id': user_id})
+    await engine.dispose()
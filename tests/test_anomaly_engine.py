@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from backend.agents.advisor_agent import _build_prompt, _summarize_for_prompt, analyze_budget, template_advice
+from backend.services.advice_batch import _unusual_transactions
+from backend.services.anomaly_engine import detect_monthly_shifts, detect_transaction_outliers
+
+pytestmark = pytest.mark.unit
+
+
+def _statement(rows):
+    return pd.DataFrame(rows, columns=['date', 'description', 'amount', 'category']).assign(
+        date=lambda df: pd.to_datetime(df['date'])
+    )
+
+
+def test_debit_spend_increase_is_flagged_like_a_credit_increase():
+    # Statements store spending as negative amounts
+    df = _statement([
+        ('2024-01-10', 'WHOLE FOODS', -100.0, 'Food & Dining'),
+        ('2024-02-10', 'WHOLE FOODS', -300.0, 'Food & Dining'),
+        ('2024-01-12', 'AMAZON', 100.0, 'Shopping'),
+        ('2024-02-12', 'AMAZON', 300.0, 'Shopping'),
+    ])
+
+    _, anomalies = analyze_budget(df)
+
+    assert sorted(anomalies, key=lambda a: a['category']) == [
+        {'category': 'Food & Dining', 'change': 200.0, 'direction': 'increase'},
+        {'category': 'Shopping', 'change': 200.0, 'direction': 'increase'},
+    ]
+
+
+def test_debit_spend_decrease_is_a_decrease():
+    rollup = pd.DataFrame({
+        'month': pd.to_datetime(['2024-01-01', '2024-02-01']),
+        'category': ['Travel', 'Travel'],
+        'total': [-400.0, -100.0],
+    })
+
+    latest = detect_monthly_shifts(rollup).iloc[-1]
+
+    assert latest['is_anomaly']
+    assert latest['direction'] == 'decrease'
+    assert latest['change'] == pytest.approx(-75.0)
+    # Totals and baselines keep the sign of the input
+    assert latest['total'] == -100.0
+    assert latest['baseline'] == -400.0
+
+
+def test_debit_series_scored_against_rolling_history():
+    months = pd.date_range('2023-01-01', periods=8, freq='MS')
+    totals = [-100.0, -110.0, -95.0, -105.0, -100.0, -98.0, -102.0, -400.0]
+    rollup = pd.DataFrame({'month': months, 'category': 'Food & Dining', 'total': totals})
+
+    shifts = detect_monthly_shifts(rollup)
+
+    assert shifts['is_anomaly'].tolist() == [False] * 7 + [True]
+    assert shifts['z_score'].iloc[-1] > 3.5
+
+
+def test_unusual_transactions_reach_the_prompt_and_the_template():
+    df = _statement(
+        [(f'2024-01-{day:02d}', 'CORNER CAFE', -4.0 - day % 3, 'Food & Dining') for day in range(1, 29)]
+        + [(f'2024-02-{day:02d}', 'CORNER CAFE', -4.0 - day % 3, 'Food & Dining') for day in range(1, 10)]
+        + [('2024-02-14', 'LE BERNARDIN', -310.0, 'Food & Dining')]
+    )
+    spending_summary, anomalies = analyze_budget(df)
+    outliers = detect_transaction_outliers(df)
+    spending_summary['unusual_transactions'] = _unusual_transactions(outliers, pd.Timestamp('2024-02-01'))
+
+    prompt = _build_prompt(_summarize_for_prompt(spending_summary, anomalies))
+    advice = template_advice(spending_summary, anomalies)
+
+    assert '$310.00 at LE BERNARDIN on 2024-02-14' in prompt
+    assert '$310.00 at LE BERNARDIN on 2024-02-14' in advice
+
@@ -0,0 +1,184 @@
+import asyncio
+import random
+import time
+
+import openai
+import pytest
+
+from backend.services.llm_client import CircuitBreaker, LLMClient, LLMUnavailable
+
+pytestmark = [pytest.mark.api, pytest.mark.asyncio]
+
+MESSAGES = [{'role': 'user', 'content': 'How am I doing this month?'}]
+
+
+def make_client(base_url: str, **options) -> LLMClient:
+    options.setdefault('backoff_base', 0.01)
+    return LLMClient(api_key='test', base_url=base_url, **options)
+
+
+async def test_calls_wait_for_a_slot(openai_stub):
+    state, base_url = openai_stub(latency=0.2)
+    client = make_client(base_url, max_concurrency=2)
+
+    responses = await asyncio.gather(*[client.complete(MESSAGES) for _ in range(6)])
+
+    assert len(responses) == 6
+    assert state.requests == 6
+    assert state.max_active == 2
+    assert client.in_flight == 0
+
+
+async def test_stream_holds_its_slot_until_the_last_chunk(openai_stub):
+    state, base_url = openai_stub(chunk_delay=0.05)
+    client = make_client(base_url, max_concurrency=1)
+
+    async def consume():
+        return ''.join([token async for token in client.stream(MESSAGES)])
+
+    answers = await asyncio.gather(consume(), consume())
+
+    assert answers == [state.reply + ' '] * 2
+    assert state.max_active == 1
+    assert client.in_flight == 0
+
+
+async def test_closing_a_stream_releases_its_slot(openai_stub):
+    state, base_url = openai_stub(chunk_delay=0.05)
+    client = make_client(base_url, max_concurrency=1, timeout=1.0)
+
+    stream = client.stream(MESSAGES)
+    assert await stream.__anext__()
+    assert client.in_flight == 1
+    await stream.aclose()
+
+    assert client.in_flight == 0
+    await client.complete(MESSAGES)
+
+
+async def test_transient_errors_are_retried_with_jittered_backoff(openai_stub, monkeypatch):
+    state, base_url = openai_stub(fail_first=2)
+    client = make_client(base_url, max_retries=2, backoff_base=0.01)
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high / 2
+
+    monkeypatch.setattr(random, 'uniform', uniform)
+    response = await client.complete(MESSAGES)
+
+    assert response.choices[0].message.content == state.reply
+    assert state.requests == 3
+    assert client.retries == 2
+    # Full jitter: a random wait up to an exponentially growing cap
+    assert bounds == [(0, 0.01), (0, 0.02)]
+    assert client.breaker.state == 'closed'
+
+
+async def test_retries_stop_after_max_retries(openai_stub):
+    state, base_url = openai_stub(fail_first=10)
+    client = make_client(base_url, max_retries=2)
+
+    with pytest.raises(LLMUnavailable):
+        await client.complete(MESSAGES)
+
+    assert state.requests == 3
+    assert client.failures == 1
+
+
+async def test_call_deadline_includes_retries(openai_stub):
+    state, base_url = openai_stub(latency=1.0)
+    client = make_client(base_url, timeout=0.3, max_retries=5)
+
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        await client.complete(MESSAGES)
+
+    assert time.monotonic() - start < 0.8
+    assert client.in_flight == 0
+
+
+async def test_stream_deadline_covers_the_whole_stream(openai_stub):
+    state, base_url = openai_stub(chunk_delay=0.2)
+    client = make_client(base_url, timeout=5.0, stream_timeout=0.5)
+
+    tokens = []
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        async for token in client.stream(MESSAGES):
+            tokens.append(token)
+
+    # Every chunk arrives well within the per-chunk timeout, but not the whole reply in time
+    assert 0 < len(tokens) < len(state.reply.split(' '))
+    assert time.monotonic() - start < 1.0
+    assert client.in_flight == 0
+
+
+async def test_breaker_opens_rejects_and_closes_after_a_successful_probe(openai_stub):
+    state, base_url = openai_stub(fail_first=2)
+    client = make_client(base_url, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            await client.complete(MESSAGES)
+    assert client.breaker.state == 'open'
+    assert client.breaker.trips == 1
+
+    # Open: rejected without reaching the API
+    with pytest.raises(LLMUnavailable):
+        await client.complete(MESSAGES)
+    assert state.requests == 2
+    assert client.rejected == 1
+
+    await asyncio.sleep(0.25)
+    assert client.breaker.state == 'half_open'
+    await client.complete(MESSAGES)
+    assert client.breaker.state == 'closed'
+    assert state.requests == 3
+
+
+async def test_failed_probe_reopens_the_breaker(openai_stub):
+    state, base_url = openai_stub(fail_first=3)
+    client = make_client(base_url, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            await client.complete(MESSAGES)
+
+    await asyncio.sleep(0.25)
+    with pytest.raises(LLMUnavailable):
+        await client.complete(MESSAGES)
+
+    assert client.breaker.state == 'open'
+    assert client.breaker.trips == 1
+
+
+async def test_non_retryable_probe_failure_reopens_the_breaker(openai_stub):
+    state, base_url = openai_stub(fail_first=2)
+    client = make_client(base_url, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            await client.complete(MESSAGES)
+
+    await asyncio.sleep(0.25)
+    state.fail_first, state.status = 3, 400
+    with pytest.raises(openai.BadRequestError):
+        await client.complete(MESSAGES)
+
+    # Not stuck mid-probe: open again, and probed again after the reset timeout
+    assert client.breaker.state == 'open'
+    assert not client.breaker.probing
+    await asyncio.sleep(0.25)
+    assert client.breaker.state == 'half_open'
+
+
+async def test_non_retryable_errors_do_not_count_while_closed(openai_stub):
+    state, base_url = openai_stub(fail_first=3, status=400)
+    client = make_client(base_url, max_retries=2, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+
+    for _ in range(3):
+        with pytest.raises(openai.BadRequestError):
+            await client.complete(MESSAGES)
+
+    assert state.requests == 3
+    assert client.breaker.state == 'closed'
@@ -0,0 +1,196 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from backend.config import settings
+from backend.services import plaid_sync
+from backend.services.merchant_memo import MerchantMemo
+from backend.services.plaid_service import ItemRateLimiter, PlaidService
+from backend.services.response_cache import response_cache
+from backend.services.plaid_sync import load_item, register_item, sync_item
+from backend.services.transaction_store import bulk_insert_transactions
+
+pytestmark = [pytest.mark.api, pytest.mark.asyncio]
+
+ACCESS_TOKEN = 'access-sandbox-test'
+
+
+@pytest.fixture
+def page_size(monkeypatch):
+    monkeypatch.setattr(settings, 'PLAID_SYNC_PAGE_SIZE', 50)
+    return 50
+
+
+def make_service(base_url: str) -> PlaidService:
+    limiter = ItemRateLimiter(rate_per_minute=60_000, burst=1_000)
+    return PlaidService(client_id='test', secret='test', base_url=base_url, limiter=limiter)
+
+
+def item_log(server, access_token: str = ACCESS_TOKEN):
+    return server.RequestHandlerClass.item_for(access_token)
+
+
+def remove(server, transaction_id: str) -> None:
+    log = item_log(server)
+    del log.live[transaction_id]
+    log.events.append(('removed', {'transaction_id': transaction_id}))
+
+
+async def collect(service: PlaidService, cursor=None):
+    pages = [page async for page in service.sync_transactions(ACCESS_TOKEN, cursor)]
+    await service.close()
+    return pages
+
+
+async def test_sync_pages_through_the_history_by_cursor(plaid_stub, page_size):
+    server, base_url = plaid_stub(transactions=120)
+    service = make_service(base_url)
+
+    pages = await collect(service)
+
+    assert [page['next_cursor'] for page in pages] == ['50', '100', '120']
+    assert [page['has_more'] for page in pages] == [True, True, False]
+    added = [txn['transaction_id'] for page in pages for txn in page['added']]
+    assert sorted(added) == sorted(item_log(server).live)
+
+    # A later sync only returns what changed after the last cursor
+    item_log(server).append(added=3, removed=2)
+    pages = await collect(service, cursor='120')
+    assert len(pages) == 1
+    assert len(pages[0]['added']) == 3
+    assert len(pages[0]['removed']) == 2
+
+
+async def test_mutation_during_pagination_restarts_from_the_start_cursor(plaid_stub, page_size):
+    server, base_url = plaid_stub(transactions=400, mutation_rate=0.3, seed=1)
+    log = item_log(server)
+    service = make_service(base_url)
+
+    pages = await collect(service, cursor='100')
+
+    assert service.failures > 0
+    assert pages[-1]['next_cursor'] == str(len(log.events))
+    assert not pages[-1]['has_more']
+    # Restarts go back to the cursor the sync started from, not the beginning
+    seen = {txn['transaction_id'] for page in pages for txn in page['added']}
+    assert seen == {txn['transaction_id'] for _, txn in log.events[100:]}
+
+
+@pytest.fixture
+def synced(plaid_stub, page_size, monkeypatch, db_session):
+    """Sync the stub's item for the test user; returns (server, sync, stored)."""
+    server, base_url = plaid_stub(transactions=120)
+    sessions, user_id = db_session
+    monkeypatch.setattr(plaid_sync, 'plaid_service', make_service(base_url))
+    monkeypatch.setattr(plaid_sync, 'merchant_memo', MerchantMemo(persist=False))
+
+    async def sync():
+        async with sessions() as db:
+            item = await load_item(db, ACCESS_TOKEN)
+            if item is None:
+                await register_item(db, user_id, 'item-test', ACCESS_TOKEN)
+                await db.commit()
+                item = await load_item(db, ACCESS_TOKEN)
+            return await sync_item(db, item)
+
+    async def stored():
+        async with sessions() as db:
+            result = await db.execute(
+                text("SELECT plaid_transaction_id, amount FROM transactions WHERE user_id = :user_id"),
+                {'user_id': user_id}
+            )
+            return result.all()
+
+    yield server, sync, stored
+
+
+def expected_rows(server):
+    # Plaid amounts are outflows; stored amounts are signed like statements
+    return sorted((transaction_id, -txn['amount']) for transaction_id, txn in item_log(server).live.items())
+
+
+async def test_sync_applies_modified_and_removed_transactions(synced):
+    server, sync, stored = synced
+
+    first = await sync()
+    assert first['inserted'] == 120
+    assert sorted(await stored()) == expected_rows(server)
+
+    item_log(server).append(added=4, modified=6, removed=5)
+    second = await sync()
+
+    assert (second['added'], second['modified'], second['removed']) == (4, 6, 5)
+    assert second['deleted'] == 11
+    assert sorted(await stored()) == expected_rows(server)
+
+
+async def test_transactions_sharing_a_natural_key_are_all_kept(synced):
+    server, sync, stored = synced
+    await sync()
+
+    item_log(server).append(duplicated=3)
+    result = await sync()
+
+    assert result['inserted'] == 3
+    assert sorted(await stored()) == expected_rows(server)
+
+    # Each copy is its own transaction for later changes
+    remove(server, item_log(server).events[-1][1]['transaction_id'])
+    await sync()
+    assert sorted(await stored()) == expected_rows(server)
+
+
+async def test_transaction_matching_an_uploaded_statement_row_takes_it_over(synced, db_session):
+    server, sync, stored = synced
+    sessions, user_id = db_session
+    txn = next(iter(item_log(server).live.values()))
+    statement = pd.DataFrame({
+        'date': [pd.Timestamp(txn['date'])],
+        'description': [txn['name']],
+        'amount': [-txn['amount']],
+        'category': ['Food & Dining'],
+    })
+    async with sessions() as db:
+        assert await bulk_insert_transactions(db, user_id, statement) == 1
+        await db.commit()
+
+    result = await sync()
+
+    assert result['matched'] == 1
+    assert result['inserted'] == 119
+    assert sorted(await stored()) == expected_rows(server)
+
+    # Uploading the statement again does not duplicate the synced transaction
+    async with sessions() as db:
+        assert await bulk_insert_transactions(db, user_id, statement) == 0
+        await db.commit()
+
+    # A removal from Plaid removes the statement row it took over
+    remove(server, txn['transaction_id'])
+    await sync()
+    assert sorted(await stored()) == expected_rows(server)
+
+
+async def test_cached_answers_are_dropped_only_once_the_insert_commits(db_session):
+    sessions, user_id = db_session
+    statement = pd.DataFrame({
+        'date': [pd.Timestamp('2026-03-02'), pd.Timestamp('2026-03-05')],
+        'description': ['COFFEE SHOP', 'GROCERY MART'],
+        'amount': [-4.5, -62.1],
+        'category': ['Food & Dining', 'Groceries'],
+    })
+    def cached():
+        return response_cache.get_chat(response_cache.chat_key(user_id, 'How much on coffee?', ''))
+
+    async with sessions() as db:
+        response_cache.set_chat(response_cache.chat_key(user_id, 'How much on coffee?', ''), 'You spent $12.', tokens=10)
+        assert await bulk_insert_transactions(db, user_id, statement) == 2
+        # A concurrent chat request still reads the old rows until the commit
+        assert cached() == 'You spent $12.'
+        await db.rollback()
+    assert cached() == 'You spent $12.'
+
+    async with sessions() as db:
+        assert await bulk_insert_transactions(db, user_id, statement) == 2
+        await db.commit()
+    assert cached() is None
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import pytest
+from jwcrypto import jwk
+
+from backend.services import plaid_webhooks
+from backend.services.plaid_service import ItemRateLimiter, PlaidService
+from backend.services.plaid_webhooks import MemoryJobQueue, SyncJobQueue, WebhookVerificationError, WebhookVerifier
+from scripts.stub_plaid import signing_key, verification_header
+
+pytestmark = [pytest.mark.api, pytest.mark.asyncio]
+
+BODY = b'{"webhook_type": "TRANSACTIONS", "webhook_code": "SYNC_UPDATES_AVAILABLE", "item_id": "item-1"}'
+
+
+@pytest.fixture
+def verifier(plaid_stub):
+    """A verifier fetching keys from a stub; returns (verifier, stub signing key)."""
+    server, base_url = plaid_stub(transactions=0)
+    limiter = ItemRateLimiter(rate_per_minute=60_000, burst=1_000)
+    service = PlaidService(client_id='test', secret='test', base_url=base_url, limiter=limiter)
+    yield WebhookVerifier(service), server.RequestHandlerClass.signing_key
+
+
+async def test_signed_webhook_is_accepted_and_its_key_cached(verifier):
+    verifier, key = verifier
+
+    await verifier.verify(BODY, verification_header(key, BODY))
+    await verifier.verify(BODY, verification_header(key, BODY))
+
+    assert verifier.verified == 2
+    assert verifier.key_fetches == 1
+
+
+@pytest.mark.parametrize('header', [None, '', 'not-a-jwt'])
+async def test_missing_or_malformed_header_is_rejected(verifier, header):
+    verifier, _ = verifier
+
+    with pytest.raises(WebhookVerificationError):
+        await verifier.verify(BODY, header)
+    assert verifier.rejected == 1
+
+
+async def test_body_must_match_the_signed_hash(verifier):
+    verifier, key = verifier
+    header = verification_header(key, BODY)
+
+    with pytest.raises(WebhookVerificationError, match='body does not match'):
+        await verifier.verify(BODY.replace(b'item-1', b'item-2'), header)
+
+
+async def test_token_signed_by_another_key_is_rejected(verifier):
+    verifier, key = verifier
+    forged = jwk.JWK.generate(kty='EC', crv='P-256', kid=key.key_id)
+
+    with pytest.raises(WebhookVerificationError, match='signature'):
+        await verifier.verify(BODY, verification_header(forged, BODY))
+    # An unknown key id is looked up and refused by Plaid
+    with pytest.raises(WebhookVerificationError, match='No verification key'):
+        await verifier.verify(BODY, verification_header(signing_key(), BODY))
+
+
+async def test_stale_token_is_rejected(verifier, monkeypatch):
+    verifier, key = verifier
+    header = verification_header(key, BODY)
+    later = time.time() + verifier.max_age + 1
+    monkeypatch.setattr(plaid_webhooks.time, 'time', lambda: later)
+
+    with pytest.raises(WebhookVerificationError, match='too old'):
+        await verifier.verify(BODY, header)
+
+
+async def test_refused_and_excess_key_lookups_do_not_reach_plaid(plaid_stub):
+    _, base_url = plaid_stub(transactions=0)
+    limiter = ItemRateLimiter(rate_per_minute=60_000, burst=1_000)
+    service = PlaidService(client_id='test', secret='test', base_url=base_url, limiter=limiter)
+    verifier = WebhookVerifier(service, key_fetches_per_minute=2)
+    forged = [signing_key() for _ in range(3)]
+
+    for key in forged:
+        with pytest.raises(WebhookVerificationError):
+            await verifier.verify(BODY, verification_header(key, BODY))
+    # The same unknown key id is answered from the refusal cache
+    with pytest.raises(WebhookVerificationError, match='refused recently'):
+        await verifier.verify(BODY, verification_header(forged[0], BODY))
+
+    assert verifier.key_fetches == 2
+    assert verifier.throttled == 1
+    assert verifier.rejected == 4
+
+
+class FlakyQueue(MemoryJobQueue):
+    """In-process queue whose schedule and release fail while ``down``."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+
+    async def schedule(self, item_id, delay):
+        if self.down:
+            raise ConnectionError('queue backend unavailable')
+        return await super().schedule(item_id, delay)
+
+    async def release(self, item_id):
+        if self.down:
+            raise ConnectionError('queue backend unavailable')
+        await super().release(item_id)
+
+
+async def test_workers_survive_queue_errors_after_the_claim():
+    jobs = SyncJobQueue(workers=1, debounce=0.01, retry_delay=0.01)
+    jobs.queue = queue = FlakyQueue()
+    synced = []
+
+    async def sync(item_id):
+        synced.append(item_id)
+        # The retry cannot be scheduled and the claim cannot be released
+        queue.down = True
+        await jobs.queue.schedule(item_id, jobs.retry_delay)
+
+    jobs._sync = sync
+    await jobs.enqueue('item-1')
+    await asyncio.sleep(0.1)
+
+    queue.down = False
+    # Redis claims lapse after claim_ttl; the in-process one is dropped by hand
+    await queue.release('item-1')
+    await jobs.enqueue('item-2')
+    await asyncio.sleep(0.1)
+
+    assert synced == ['item-1', 'item-2']
+    assert not any(task.done() for task in jobs._tasks)
+    await jobs.close()
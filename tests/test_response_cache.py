@@ -0,0 +1,30 @@
+import pytest
+
+from backend.services.response_cache import MemoryBackend, ResponseCache
+
+pytestmark = pytest.mark.unit
+
+HISTORY = "Human: How much did I spend on food?\nAI: $420 in March."
+
+
+def test_answer_computed_across_an_invalidation_is_not_served():
+    cache = ResponseCache(MemoryBackend(max_entries=100))
+    key = cache.chat_key(1, 'And in April?', HISTORY)
+    assert cache.get_chat(key) is None
+
+    # New transactions land while the agent is still answering
+    cache.invalidate_user(1)
+    cache.set_chat(key, 'You spent $380 in April.', tokens=50)
+
+    assert cache.get_chat(cache.chat_key(1, 'And in April?', HISTORY)) is None
+
+
+def test_answers_are_keyed_on_user_history_and_question():
+    cache = ResponseCache(MemoryBackend(max_entries=100))
+    cache.set_chat(cache.chat_key(1, 'And in April?', HISTORY), 'You spent $380 in April.', tokens=50)
+
+    assert cache.get_chat(cache.chat_key(1, 'and in april', HISTORY)) == 'You spent $380 in April.'
+    assert cache.get_chat(cache.chat_key(2, 'And in April?', HISTORY)) is None
+    assert cache.get_chat(cache.chat_key(1, 'And in April?', '')) is None
+    assert cache.get_chat(cache.chat_key(1, 'And in May?', HISTORY)) is None
+    assert cache.stats()['tokens_saved'] == 50
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from backend.services.transaction_columns import load_transaction_columns
+
+pytestmark = [pytest.mark.api, pytest.mark.asyncio]
+
+ROWS = [
+    ('2024-01-03', 'NA', -5.0, 'Food & Dining'),
+    ('2024-01-04', 'null', -6.0, None),
+    ('2024-01-05', '', -7.0, 'N/A'),
+    ('2024-01-06', None, -8.0, 'Shopping'),
+    ('2024-02-01', 'AMAZON', -9.0, 'Shopping'),
+]
+
+
+@pytest.fixture(params=['asyncpg', 'fallback'])
+def columns_db(request, db_session, monkeypatch):
+    """The test user's session factory, loading through COPY or the plain SELECT fallback."""
+    sessions, user_id = db_session
+    if request.param == 'fallback':
+        monkeypatch.setattr(sessions.kw['bind'].dialect, 'driver', 'psycopg')
+    return sessions, user_id
+
+
+async def insert_rows(sessions, user_id):
+    async with sessions() as db:
+        await db.execute(
+            text("INSERT INTO transactions (user_id, date, description, amount, category) "
+                 "VALUES (:user_id, :date, :description, :amount, :category)"),
+            [
+                {'user_id': user_id, 'date': datetime.fromisoformat(day), 'description': description,
+                 'amount': amount, 'category': category}
+                for day, description, amount, category in ROWS
+            ]
+        )
+        await db.commit()
+
+
+async def test_only_sql_nulls_load_as_missing(columns_db):
+    sessions, user_id = columns_db
+    await insert_rows(sessions, user_id)
+
+    async with sessions() as db:
+        frame = await load_transaction_columns(
+            db, [user_id], columns=('user_id', 'date', 'description', 'amount', 'category')
+        )
+
+    assert frame['description'].tolist()[:3] == ['NA', 'null', '']
+    assert pd.isna(frame['description'].iloc[3])
+    assert frame['category'].tolist()[:1] + frame['category'].tolist()[2:] == ['Food & Dining', 'N/A', 'Shopping', 'Shopping']
+    assert pd.isna(frame['category'].iloc[1])
+    assert frame['category'].dtype == 'category'
+    assert frame['amount'].tolist() == [row[2] for row in ROWS]
+
+
+async def test_date_bounds_bind_on_every_driver(columns_db):
+    sessions, user_id = columns_db
+    await insert_rows(sessions, user_id)
+
+    async with sessions() as db:
+        frame = await load_transaction_columns(
+            db, [user_id, user_id + 1_000_000],
+            until=datetime(2024, 2, 1),
+            per_user_since={user_id: datetime(2024, 1, 5)}
+        )
+
+    assert frame['date'].tolist() == [pd.Timestamp('2024-01-05'), pd.Timestamp('2024-01-06')]
+    assert frame['user_id'].tolist() == [user_id] * 2